@@ -1,5 +1,7 @@
 from django import forms
-from client.models import Espace, Reservation, Profile
+from django.core.exceptions import ValidationError
+from client.models import Espace, Reservation, Profile, SerieReservation
+from client.disponibilite import est_disponible, STATUTS_LIBERES
 from django.contrib.auth.models import User
 
 
@@ -14,6 +16,20 @@ class EspaceForm(forms.ModelForm):
 
 
 class ReservationForm(forms.ModelForm):
+    repetition = forms.ChoiceField(
+        choices=[('', 'Aucune')] + SerieReservation.FREQUENCE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    intervalle = forms.IntegerField(
+        min_value=1, max_value=12, initial=1, required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1'})
+    )
+    repeter_jusqu_au = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
     class Meta:
         model = Reservation
         fields = ['user', 'espace', 'date', 'heure_debut', 'duree_heures', 'prix_total', 'status', 'notes_admin']
@@ -34,6 +50,26 @@ class ReservationForm(forms.ModelForm):
         self.fields['espace'].queryset = Espace.objects.filter(disponible=True)
         self.fields['prix_total'].required = False
 
+    def clean(self):
+        cleaned_data = super().clean()
+        espace = cleaned_data.get('espace')
+        date = cleaned_data.get('date')
+        heure_debut = cleaned_data.get('heure_debut')
+        duree = cleaned_data.get('duree_heures')
+        status = cleaned_data.get('status')
+
+        if cleaned_data.get('repetition'):
+            # Les conflits d'une série sont signalés occurrence par occurrence
+            if not cleaned_data.get('repeter_jusqu_au'):
+                raise ValidationError("Indiquez jusqu'à quelle date répéter la réservation.")
+            return cleaned_data
+
+        if espace and date and heure_debut and duree and status not in STATUTS_LIBERES:
+            if not est_disponible(espace, date, heure_debut, duree, exclure=self.instance.pk):
+                raise ValidationError("Ce créneau chevauche une réservation existante pour cet espace.")
+
+        return cleaned_data
+
 
 class UserForm(forms.ModelForm):
     class Meta:
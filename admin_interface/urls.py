@@ -27,6 +27,7 @@ urlpatterns = [
     path('reservations/valider/<int:id>/', views.reservation_valider, name='reservation_valider'),
     
     path('reservations/refuser/<int:id>/', views.reservation_refuser, name='reservation_refuser'),
+    path('reservations/moderation/', views.reservation_moderation_groupee, name='reservation_moderation_groupee'),
     path('reservations/supprimer/<int:id>/', views.reservation_delete, name='reservation_delete'),
 
     # --------------------------
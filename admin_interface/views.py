@@ -6,10 +6,15 @@ from django.http import HttpResponseForbidden
 from django.contrib import messages
 
 from client.models import Profile, Espace, Reservation
+from client.reservations import enregistrer_reservation, CreneauIndisponible
+from client.series import reserver_serie, SerieInvalide
+from client.moderation import DECISIONS, moderer, reservations_a_moderer
+from client.statistiques import statistiques_periode
 from .forms import EspaceForm, ReservationForm, UserForm, ProfileForm
 from django.http import JsonResponse
 from django.db.models import Avg, Count, Sum
 from datetime import timedelta
+from django.utils.dateparse import parse_date
 from tech_interface.models import Intervention, Incident
 from django.utils import timezone
 
@@ -162,17 +167,56 @@ def client_delete(request, id):
 @login_required
 @user_passes_test(is_admin, login_url='/forbidden/')
 def reservation_list(request):
+    filtres = filtres_moderation(request.GET)
     reservations = Reservation.objects.select_related('user', 'espace').all()
-    return render(request, 'admin_interface/reservations.html', {'reservations': reservations})
+    if filtres['espace']:
+        reservations = reservations.filter(espace_id=filtres['espace'])
+    if filtres['date_debut']:
+        reservations = reservations.filter(date__gte=filtres['date_debut'])
+    if filtres['date_fin']:
+        reservations = reservations.filter(date__lte=filtres['date_fin'])
+    if request.GET.get('status'):
+        reservations = reservations.filter(status=request.GET['status'])
+
+    return render(request, 'admin_interface/reservations.html', {
+        'reservations': reservations,
+        'espaces': Espace.objects.order_by('nom').values('id', 'nom'),
+        'filtres': request.GET,
+        'nb_a_moderer': reservations_a_moderer(**filtres).count(),
+    })
+
+
+def filtres_moderation(donnees):
+    """Filtres de la liste des réservations (espace, période) lus dans GET ou POST."""
+    filtres = {'espace': None, 'date_debut': None, 'date_fin': None}
+    espace = donnees.get('espace', '')
+    if espace.isdigit():
+        filtres['espace'] = int(espace)
+    for champ in ('date_debut', 'date_fin'):
+        try:
+            filtres[champ] = parse_date(donnees.get(champ, ''))
+        except ValueError:
+            pass
+    return filtres
+
+
+def message_moderation(request, decision, compteurs):
+    action = "validée(s)" if decision == 'valider' else "refusée(s)"
+    if compteurs['modifiees']:
+        messages.success(
+            request,
+            f"{compteurs['modifiees']} réservation(s) {action}, {compteurs['notifiees']} client(s) prévenu(s)."
+        )
+    else:
+        messages.warning(request, "Aucune réservation en attente à traiter.")
 
 
 @login_required
 @user_passes_test(is_admin, login_url='/forbidden/')
 def reservation_valider(request, id):
     reservation = get_object_or_404(Reservation, id=id)
-    reservation.status = "validee"  
-    reservation.save()
-    messages.success(request, "Réservation validée avec succès !")
+    compteurs = moderer(Reservation.objects.filter(pk=reservation.pk), 'valider')
+    message_moderation(request, 'valider', compteurs)
     return redirect('admin_interface:reservation_list')
 
 
@@ -180,8 +224,37 @@ def reservation_valider(request, id):
 @user_passes_test(is_admin, login_url='/forbidden/')
 def reservation_refuser(request, id):
     reservation = get_object_or_404(Reservation, id=id)
-    reservation.status = "refusee"  
-    reservation.save()
+    compteurs = moderer(Reservation.objects.filter(pk=reservation.pk), 'refuser')
+    message_moderation(request, 'refuser', compteurs)
+    return redirect('admin_interface:reservation_list')
+
+
+@login_required
+@user_passes_test(is_admin, login_url='/forbidden/')
+def reservation_moderation_groupee(request):
+    """
+    Valide ou refuse en une fois les réservations cochées, ou toutes celles
+    en attente correspondant aux filtres (tout=1).
+    """
+    if request.method != 'POST':
+        return redirect('admin_interface:reservation_list')
+
+    decision = request.POST.get('decision')
+    if decision not in DECISIONS:
+        messages.error(request, "Action inconnue.")
+        return redirect('admin_interface:reservation_list')
+
+    if request.POST.get('tout'):
+        reservations = reservations_a_moderer(**filtres_moderation(request.POST))
+    else:
+        ids = [int(i) for i in request.POST.getlist('reservations') if i.isdigit()]
+        reservations = Reservation.objects.filter(id__in=ids)
+
+    compteurs = moderer(reservations, decision)
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(compteurs)
+    message_moderation(request, decision, compteurs)
     return redirect('admin_interface:reservation_list')
 
 
@@ -190,16 +263,39 @@ def reservation_refuser(request, id):
 def reservation_create(request):
     if request.method == 'POST':
         form = ReservationForm(request.POST)
-        if form.is_valid():
+        if form.is_valid() and form.cleaned_data['repetition']:
+            data = form.cleaned_data
+            try:
+                serie, creees, conflits = reserver_serie(
+                    data['user'], data['espace'], data['repetition'], data['date'], data['repeter_jusqu_au'],
+                    data['heure_debut'], data['duree_heures'], intervalle=data['intervalle'] or 1,
+                    status=data['status'], notes_admin=data['notes_admin'],
+                )
+            except SerieInvalide as e:
+                form.add_error(None, str(e))
+            else:
+                if creees:
+                    messages.success(request, f"{len(creees)} réservation(s) créée(s).")
+                if conflits:
+                    messages.warning(
+                        request,
+                        "Créneaux déjà pris : " + ", ".join(jour.strftime('%d/%m/%Y') for jour in conflits)
+                    )
+                return redirect('admin_interface:reservation_list')
+        elif form.is_valid():
             reservation = form.save(commit=False)
             
             # Calculer automatiquement le prix total
             if reservation.espace and reservation.duree_heures:
                 reservation.prix_total = reservation.espace.prix_par_heure * reservation.duree_heures
             
-            reservation.save()
-            messages.success(request, "Réservation créée avec succès.")
-            return redirect('admin_interface:reservation_list')
+            try:
+                enregistrer_reservation(reservation)
+            except CreneauIndisponible as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(request, "Réservation créée avec succès.")
+                return redirect('admin_interface:reservation_list')
     else:
         form = ReservationForm()
     
@@ -220,9 +316,13 @@ def reservation_update(request, id):
     if request.method == 'POST':
         form = ReservationForm(request.POST, instance=reservation)
         if form.is_valid():
-            form.save()
-            messages.success(request, "Réservation mise à jour.")
-            return redirect('admin_interface:reservation_list')
+            try:
+                enregistrer_reservation(form.save(commit=False))
+            except CreneauIndisponible as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(request, "Réservation mise à jour.")
+                return redirect('admin_interface:reservation_list')
     else:
         form = ReservationForm(instance=reservation)
     
@@ -388,15 +488,58 @@ def technicien_delete(request, id):
 @login_required
 @user_passes_test(is_admin, login_url='/forbidden/')
 def statistiques(request):
+    debut, fin = periode_statistiques(request.GET)
+    periode = statistiques_periode(debut, fin)
     stats = {
         'nb_salles': Espace.objects.count(),
         'nb_reservations': Reservation.objects.count(),
         'nb_techniciens': Profile.objects.filter(role='technicien').count(),
-        'nb_clients': User.objects.filter(is_staff=False).count()
+        'nb_clients': User.objects.filter(is_staff=False).count(),
+        'debut': debut,
+        'fin': fin,
+        'totaux': periode['totaux'],
+        'occupation': periode['occupation'],
+        # Séries des graphiques, lues dans la table de faits (voir client.statistiques)
+        'graphiques': {
+            'jours': [jour['date'].strftime('%d/%m') for jour in periode['activite']],
+            'chiffre_affaires': [float(jour['chiffre_affaires']) for jour in periode['activite']],
+            'reservations': [jour['reservations'] for jour in periode['activite']],
+            'annulations': [jour['annulations'] for jour in periode['activite']],
+            'espaces': [ligne['espace'] for ligne in periode['occupation']],
+            'occupation': [round(ligne['taux'], 1) for ligne in periode['occupation']],
+        },
     }
     return render(request, 'admin_interface/statistiques.html', stats)
 
 
+# Au-delà, les séries du graphique deviennent démesurées
+PERIODE_STATISTIQUES_MAX = 366
+
+
+def periode_statistiques(donnees):
+    """
+    (debut, fin) lus dans GET, ramenés aux PERIODE_STATISTIQUES_MAX derniers
+    jours ; les 30 derniers jours si les dates sont invalides ou inversées.
+    """
+    bornes = {}
+    for champ in ('debut', 'fin'):
+        try:
+            bornes[champ] = parse_date(donnees.get(champ, ''))
+        except ValueError:
+            bornes[champ] = None
+    fin = bornes['fin'] or timezone.localdate()
+    try:
+        debut = bornes['debut'] or fin - timedelta(days=29)
+    except OverflowError:
+        debut = None
+    if debut is None or debut > fin:
+        fin = timezone.localdate()
+        debut = fin - timedelta(days=29)
+    if (fin - debut).days >= PERIODE_STATISTIQUES_MAX:
+        debut = fin - timedelta(days=PERIODE_STATISTIQUES_MAX - 1)
+    return debut, fin
+
+
 # --------------------
 # LOGOUT ADMIN
 # --------------------
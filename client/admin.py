@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Espace, EspaceImage, Reservation, Profile, PaymentCard, ActiveSession
+from .models import Espace, EspaceImage, Reservation, Profile, PaymentCard, ActiveSession, ListeAttente, Equipement, EmailSortant, EcriturePaiement
 
 # Espace avec configuration personnalisée
 @admin.register(Espace)
@@ -14,3 +14,30 @@ admin.site.register(Reservation)
 admin.site.register(Profile)
 admin.site.register(PaymentCard)
 admin.site.register(ActiveSession)
+admin.site.register(ListeAttente)
+admin.site.register(Equipement)
+
+
+@admin.register(EmailSortant)
+class EmailSortantAdmin(admin.ModelAdmin):
+    list_display = ('sujet', 'destinataires', 'statut', 'tentatives', 'prochain_essai', 'envoye_le')
+    list_filter = ('statut',)
+    search_fields = ('sujet', 'destinataires')
+
+
+@admin.register(EcriturePaiement)
+class EcriturePaiementAdmin(admin.ModelAdmin):
+    """Consultation seule : le journal des paiements n'accepte que des ajouts."""
+    list_display = ('date', 'nature', 'montant', 'reference', 'reservation_id', 'espace_id', 'user_id')
+    list_filter = ('nature', 'date')
+    search_fields = ('reference',)
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
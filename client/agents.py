@@ -0,0 +1,94 @@
+"""
+Classification des user-agents : navigateur, système, versions, mobile.
+
+Les règles sont des expressions régulières essayées dans l'ordre (Edge et
+Opera se déclarent aussi « Chrome », Chrome se déclare aussi « Safari »).
+Le résultat est gardé dans un cache LRU borné indexé par la chaîne brute :
+un même navigateur envoie la même chaîne à chaque requête, si bien que le
+cas courant se réduit à une recherche dans un dictionnaire.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+TAILLE_CACHE = 2048
+LONGUEUR_MAX = 512
+
+ROBOTS = re.compile(r'[\w-]*(?:bot|crawler|spider|slurp)\b|curl|wget|python-requests|headless', re.I)
+NAVIGATEURS = [
+    ('Edge', re.compile(r'Edg(?:e|A|iOS)?/(\d+)')),
+    ('Opera', re.compile(r'(?:OPR|Opera)/(\d+)')),
+    ('Samsung Internet', re.compile(r'SamsungBrowser/(\d+)')),
+    ('Firefox', re.compile(r'(?:Firefox|FxiOS)/(\d+)')),
+    ('Chrome', re.compile(r'(?:Chrome|CriOS)/(\d+)')),
+    ('Safari', re.compile(r'Version/(\d+)(?:\.\d+)*(?: Mobile/\w+)? Safari/')),
+    ('Internet Explorer', re.compile(r'MSIE (\d+)|Trident/.*rv:(\d+)')),
+]
+SYSTEMES = [
+    ('iOS', re.compile(r'(?:iPhone|iPad|iPod).*? OS (\d+)(?:_(\d+))?')),
+    ('Android', re.compile(r'Android (\d+)(?:\.(\d+))?')),
+    ('Windows', re.compile(r'Windows NT (\d+\.\d+)')),
+    ('macOS', re.compile(r'Mac OS X (\d+)(?:[_.](\d+))?')),
+    ('ChromeOS', re.compile(r'CrOS')),
+    ('Linux', re.compile(r'Linux')),
+]
+VERSIONS_WINDOWS = {'10.0': '10/11', '6.3': '8.1', '6.2': '8', '6.1': '7', '6.0': 'Vista'}
+
+
+class Appareil(NamedTuple):
+    navigateur: str
+    version_navigateur: str
+    systeme: str
+    version_systeme: str
+    mobile: bool
+    tablette: bool
+    robot: bool
+
+    @property
+    def libelle(self):
+        """Libellé court, enregistré dans ActiveSession.device_info."""
+        icone = '🤖' if self.robot else '📱' if self.mobile or self.tablette else '💻'
+        navigateur = ' '.join(filter(None, (self.navigateur, self.version_navigateur)))
+        systeme = ' '.join(filter(None, (self.systeme, self.version_systeme)))
+        return f"{icone} {' · '.join(filter(None, (navigateur, systeme))) or 'Navigateur'}"
+
+
+def _version(correspondance):
+    morceaux = [g for g in correspondance.groups() if g] if correspondance.groups() else []
+    return '.'.join(morceaux)
+
+
+@lru_cache(maxsize=TAILLE_CACHE)
+def _classer(user_agent):
+    navigateur = version_navigateur = systeme = version_systeme = ''
+    for nom, motif in NAVIGATEURS:
+        correspondance = motif.search(user_agent)
+        if correspondance:
+            navigateur, version_navigateur = nom, next(g for g in correspondance.groups() if g)
+            break
+    for nom, motif in SYSTEMES:
+        correspondance = motif.search(user_agent)
+        if correspondance:
+            systeme, version_systeme = nom, _version(correspondance)
+            break
+    if systeme == 'Windows':
+        version_systeme = VERSIONS_WINDOWS.get(version_systeme, version_systeme)
+    robot = ROBOTS.search(user_agent)
+    if robot and not navigateur:
+        navigateur = robot.group(0)
+    # Les iPad récents se présentent comme un Mac : seul iPad est reconnu ici
+    tablette = 'iPad' in user_agent or 'Tablet' in user_agent or (systeme == 'Android' and 'Mobile' not in user_agent)
+    mobile = not tablette and ('Mobi' in user_agent or 'iPhone' in user_agent or 'iPod' in user_agent)
+    return Appareil(
+        navigateur, version_navigateur, systeme, version_systeme,
+        mobile, tablette, bool(robot),
+    )
+
+
+def classer(user_agent):
+    """Appareil décrit par un user-agent ; les chaînes trop longues sont tronquées."""
+    return _classer((user_agent or '')[:LONGUEUR_MAX])
+
+
+def statistiques_cache():
+    return _classer.cache_info()
@@ -0,0 +1,157 @@
+"""
+Boîte d'envoi des emails.
+
+Les vues ne parlent plus au serveur SMTP : mettre_en_file() enregistre le
+message dans EmailSortant (un INSERT, dans la transaction de la requête, si
+bien qu'un message n'existe que si la transaction est validée). La commande
+envoyer_emails les expédie ensuite par lots, sur une connexion SMTP ouverte
+une fois par worker et réutilisée d'un message et d'un lot à l'autre.
+
+Un lot est réservé par un UPDATE conditionnel qui repousse prochain_essai de
+DUREE_RESERVATION : plusieurs workers peuvent tourner sans envoyer deux fois
+le même message, et un lot abandonné par un worker arrêté redevient
+disponible à l'échéance. Un envoi en échec est retenté avec une attente
+exponentielle (DELAI_BASE * 2^tentatives, plafonnée à DELAI_MAX) ; après
+TENTATIVES_MAX échecs le message passe en « echec » et n'est plus retenté.
+"""
+import random
+import smtplib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import EmailSortant
+from .reservations import avec_reprise
+
+TAILLE_LOT = 100
+TENTATIVES_MAX = 6
+DELAI_BASE = 30
+DELAI_MAX = 3600
+DUREE_RESERVATION = 300
+
+
+def email_sortant(sujet, message, destinataires, html_message='', expediteur=None):
+    """EmailSortant non enregistré, ou None sans destinataire."""
+    destinataires = [d for d in destinataires if d]
+    if not destinataires:
+        return None
+    return EmailSortant(
+        sujet=sujet[:255],
+        message=message,
+        html_message=html_message or '',
+        expediteur=expediteur or settings.DEFAULT_FROM_EMAIL,
+        destinataires=','.join(destinataires),
+    )
+
+
+def mettre_en_file(sujet, message, destinataires, html_message='', expediteur=None):
+    """Enregistre un email à envoyer ; ne contacte pas le serveur SMTP."""
+    email = email_sortant(sujet, message, destinataires, html_message, expediteur)
+    if email:
+        email.save()
+    return email
+
+
+def mettre_en_file_groupe(emails, taille_lot=TAILLE_LOT):
+    """Enregistre des EmailSortant (voir email_sortant) par INSERT groupés."""
+    return len(EmailSortant.objects.bulk_create([e for e in emails if e], batch_size=taille_lot))
+
+
+def delai_avant_essai(tentatives):
+    """Attente avant la tentative suivante, avec une part aléatoire pour étaler les reprises."""
+    return min(DELAI_MAX, DELAI_BASE * 2 ** tentatives) * random.uniform(0.5, 1.0)
+
+
+def reserver_lot(taille_lot=TAILLE_LOT):
+    """Réserve jusqu'à taille_lot messages échus pour ce worker et les retourne."""
+    maintenant = timezone.now()
+    a_envoyer = EmailSortant.objects.filter(statut='en_attente', prochain_essai__lte=maintenant)
+    ids = list(a_envoyer.order_by('prochain_essai', 'id').values_list('id', flat=True)[:taille_lot])
+    if not ids:
+        return []
+    jeton = uuid.uuid4().hex
+    # Un autre worker a pu réserver certains de ces messages entre-temps : la condition sur
+    # prochain_essai les exclut
+    avec_reprise(lambda: a_envoyer.filter(id__in=ids).update(
+        reserve_par=jeton, prochain_essai=maintenant + timedelta(seconds=DUREE_RESERVATION),
+    ))
+    return list(EmailSortant.objects.filter(id__in=ids, reserve_par=jeton).order_by('id'))
+
+
+def message_de(email):
+    message = EmailMultiAlternatives(email.sujet, email.message, email.expediteur, email.destinataires.split(','))
+    if email.html_message:
+        message.attach_alternative(email.html_message, 'text/html')
+    return message
+
+
+def expedier(connexion, message):
+    """Envoie sur la connexion, rouverte une fois si le serveur l'a fermée entre deux envois."""
+    connexion.open()
+    try:
+        return connexion.send_messages([message])
+    except smtplib.SMTPServerDisconnected:
+        connexion.close()
+        connexion.open()
+        return connexion.send_messages([message])
+
+
+def envoyer_lot(emails, connexion):
+    """Expédie un lot réservé et enregistre les résultats. Retourne (envoyés, échecs)."""
+    envoyes, echecs = [], []
+    for email in emails:
+        try:
+            if not expedier(connexion, message_de(email)):
+                raise smtplib.SMTPException("Aucun destinataire accepté")
+        except (smtplib.SMTPException, OSError) as erreur:
+            # Connexion dans un état inconnu : la suivante sera rouverte
+            if not isinstance(erreur, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                connexion.close()
+            echecs.append((email, erreur))
+        else:
+            envoyes.append(email.id)
+
+    maintenant = timezone.now()
+
+    def enregistrer():
+        EmailSortant.objects.filter(id__in=envoyes).update(
+            statut='envoye', envoye_le=maintenant, reserve_par='', derniere_erreur='',
+        )
+        for email, erreur in echecs:
+            tentatives = email.tentatives + 1
+            EmailSortant.objects.filter(id=email.id).update(
+                statut='echec' if tentatives >= TENTATIVES_MAX else 'en_attente',
+                tentatives=tentatives,
+                prochain_essai=maintenant + timedelta(seconds=delai_avant_essai(tentatives)),
+                reserve_par='',
+                derniere_erreur=str(erreur)[:1000],
+            )
+    avec_reprise(enregistrer)
+    return len(envoyes), len(echecs)
+
+
+def envoyer_en_attente(taille_lot=TAILLE_LOT, connexion=None):
+    """
+    Expédie tous les messages échus, lot par lot, sur une seule connexion
+    (celle fournie, ou une connexion ouverte puis fermée ici).
+    Retourne {'envoyes': n, 'echecs': n}.
+    """
+    proprietaire = connexion is None
+    connexion = connexion or get_connection()
+    compteurs = {'envoyes': 0, 'echecs': 0}
+    try:
+        while True:
+            emails = reserver_lot(taille_lot)
+            if not emails:
+                return compteurs
+            envoyes, echecs = envoyer_lot(emails, connexion)
+            compteurs['envoyes'] += envoyes
+            compteurs['echecs'] += echecs
+            if len(emails) < taille_lot:
+                return compteurs
+    finally:
+        if proprietaire:
+            connexion.close()
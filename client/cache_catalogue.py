@@ -0,0 +1,151 @@
+"""
+Cache de lecture du catalogue public.
+
+Les pages du catalogue (listes, détail d'un espace, facettes) sont lues dans
+un cache dont les clés sont préfixées d'une version : toute modification d'un
+Espace ou d'une EspaceImage incrémente la version (voir client.signals), ce
+qui rend d'un coup toutes les anciennes entrées inaccessibles sans avoir à
+les énumérer ; elles expirent d'elles-mêmes.
+
+Seules les données communes à tous les visiteurs sont mises en cache (espaces
+et leurs équipements préchargés) ; les favoris, le formulaire et le jeton CSRF
+restent calculés à chaque requête.
+
+Une clé absente n'est reconstruite qu'une fois : les requêtes concurrentes du
+même processus attendent sur un verrou, celles des autres processus sur un
+verrou posé dans le cache (cache.add), puis relisent la valeur.
+
+Le cache utilisé est l'alias CATALOGUE_CACHE des réglages CACHES : mémoire
+locale pour un seul processus, fichiers ou base de données pour partager les
+entrées et les compteurs entre plusieurs processus.
+"""
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+CLE_VERSION = 'catalogue:version'
+PREFIXE_COMPTEURS = 'catalogue:compteurs:'
+DUREE_DEFAUT = 300
+# Durée maximale d'une reconstruction avant que le verrou ne soit abandonné
+DELAI_VERROU = 10
+ATTENTE_MAX = 5.0
+PAS_ATTENTE = 0.02
+NB_VERROUS = 64
+# Les compteurs sont publiés dans le cache tous les LOT_COMPTEURS évènements
+LOT_COMPTEURS = 50
+COMPTEURS = ('hit', 'miss', 'attente', 'reconstruction')
+
+_ABSENT = object()
+_verrous = [threading.Lock() for _ in range(NB_VERROUS)]
+_compteurs = Counter()
+_verrou_compteurs = threading.Lock()
+
+
+def antememoire():
+    return caches[getattr(settings, 'CATALOGUE_CACHE', 'default')]
+
+
+def duree():
+    return getattr(settings, 'CATALOGUE_CACHE_DUREE', DUREE_DEFAUT)
+
+
+def version():
+    return antememoire().get_or_set(CLE_VERSION, 1, None)
+
+
+def invalider():
+    try:
+        antememoire().incr(CLE_VERSION)
+    except ValueError:
+        antememoire().set(CLE_VERSION, 1, None)
+
+
+def compter(nom):
+    with _verrou_compteurs:
+        _compteurs[nom] += 1
+        a_publier = sum(_compteurs.values()) >= LOT_COMPTEURS
+    if a_publier:
+        publier_compteurs()
+
+
+def publier_compteurs():
+    """Ajoute les compteurs du processus à ceux partagés dans le cache."""
+    global _compteurs
+    with _verrou_compteurs:
+        locaux, _compteurs = _compteurs, Counter()
+    backend = antememoire()
+    for nom, nb in locaux.items():
+        try:
+            backend.incr(PREFIXE_COMPTEURS + nom, nb)
+        except ValueError:
+            if not backend.add(PREFIXE_COMPTEURS + nom, nb, None):
+                backend.incr(PREFIXE_COMPTEURS + nom, nb)
+
+
+def statistiques():
+    """Compteurs cumulés (publiés et pas encore publiés) et taux de succès."""
+    publier_compteurs()
+    valeurs = antememoire().get_many([PREFIXE_COMPTEURS + nom for nom in COMPTEURS])
+    stats = {nom: valeurs.get(PREFIXE_COMPTEURS + nom, 0) for nom in COMPTEURS}
+    lectures = stats['hit'] + stats['miss']
+    stats['taux'] = stats['hit'] / lectures if lectures else 0.0
+    return stats
+
+
+def remettre_a_zero():
+    global _compteurs
+    with _verrou_compteurs:
+        _compteurs = Counter()
+    antememoire().delete_many([PREFIXE_COMPTEURS + nom for nom in COMPTEURS])
+
+
+def lire(cle, construire, timeout=None):
+    """
+    Valeur de cle pour la version courante du catalogue, calculée par
+    construire() et mise en cache si elle est absente.
+    """
+    backend = antememoire()
+    cle = f"catalogue:{version()}:{cle}"
+    valeur = backend.get(cle, _ABSENT)
+    if valeur is not _ABSENT:
+        compter('hit')
+        return valeur
+    compter('miss')
+
+    with _verrous[zlib.crc32(cle.encode()) % NB_VERROUS]:
+        # Un autre thread a pu la reconstruire pendant l'attente du verrou
+        valeur = backend.get(cle, _ABSENT)
+        if valeur is not _ABSENT:
+            compter('attente')
+            return valeur
+
+        cle_verrou = f"{cle}:verrou"
+        verrou_pris = backend.add(cle_verrou, 1, DELAI_VERROU)
+        if not verrou_pris:
+            valeur = attendre(backend, cle)
+            if valeur is not _ABSENT:
+                compter('attente')
+                return valeur
+        try:
+            compter('reconstruction')
+            valeur = construire()
+            backend.set(cle, valeur, duree() if timeout is None else timeout)
+        finally:
+            if verrou_pris:
+                backend.delete(cle_verrou)
+        return valeur
+
+
+def attendre(backend, cle):
+    """Attend qu'un autre processus ait écrit cle ; _ABSENT passé ATTENTE_MAX."""
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(PAS_ATTENTE)
+        valeur = backend.get(cle, _ABSENT)
+        if valeur is not _ABSENT:
+            return valeur
+    return _ABSENT
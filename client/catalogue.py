@@ -0,0 +1,159 @@
+"""
+Filtres du catalogue public.
+
+Les paramètres GET de recherche sont d'abord normalisés (valeurs invalides
+écartées, listes triées) : le même dictionnaire sert à filtrer le queryset et
+de clé de cache, si bien que deux URL équivalentes partagent leurs résultats.
+"""
+import hashlib
+import json
+from datetime import datetime, time
+
+from django.db.models import Case, CharField, Q, Value, When
+
+from .creneaux import filtrer_libres
+from .equipements import filtrer_equipements
+from .geo import autour, geocoder
+from .models import Espace
+from .recherche import rechercher, replier
+
+# (code, libellé, minimum inclus, maximum exclu)
+TRANCHES_PRIX = [
+    ('moins-20', 'Moins de 20 €', None, 20),
+    ('20-50', '20 à 50 €', 20, 50),
+    ('50-100', '50 à 100 €', 50, 100),
+    ('plus-100', '100 € et plus', 100, None),
+]
+TRANCHES_CAPACITE = [
+    ('1-5', '1 à 5 personnes', None, 6),
+    ('6-15', '6 à 15 personnes', 6, 16),
+    ('16-50', '16 à 50 personnes', 16, 51),
+    ('plus-50', 'Plus de 50 personnes', 51, None),
+]
+CATEGORIES = {
+    'reunion': ['reunion'],
+    'coworking': ['petite_salle', 'moyenne_salle', 'brainstorming', 'espace_detente'],
+    'evenements': ['grande_salle', 'espace_formation', 'studio'],
+}
+NOMS_CATEGORIES = {
+    'reunion': 'Salles de réunion',
+    'coworking': 'Espaces coworking',
+    'evenements': 'Salles d\'événements',
+}
+RAYON_DEFAUT_KM = 10
+RAYON_MAX_KM = 200
+RAYONS_PROPOSES = [2, 5, 10, 25, 50, 100]
+
+
+def condition_tranche(champ, minimum, maximum):
+    condition = Q()
+    if minimum is not None:
+        condition &= Q(**{f'{champ}__gte': minimum})
+    if maximum is not None:
+        condition &= Q(**{f'{champ}__lt': maximum})
+    return condition
+
+
+def tranche(champ, tranches):
+    """Expression SQL donnant le code de tranche d'un champ."""
+    return Case(
+        *(When(condition_tranche(champ, minimum, maximum), then=Value(code))
+          for code, _, minimum, maximum in tranches),
+        output_field=CharField(),
+    )
+
+
+def _heure(valeur):
+    try:
+        return datetime.strptime(valeur or '', "%H:%M").time()
+    except ValueError:
+        return None
+
+
+def _position(params):
+    """Point de recherche : coordonnées du navigateur, sinon ville géocodée."""
+    try:
+        latitude, longitude = float(params.get('lat', '')), float(params.get('lon', ''))
+    except ValueError:
+        position = geocoder(params.get('pres_de', ''))
+    else:
+        position = (latitude, longitude) if -90 <= latitude <= 90 and -180 <= longitude <= 180 else None
+    return (round(position[0], 4), round(position[1], 4)) if position else None
+
+
+def _rayon(valeur):
+    try:
+        return min(RAYON_MAX_KM, max(1, int(valeur)))
+    except (TypeError, ValueError):
+        return RAYON_DEFAUT_KM
+
+
+def normaliser_filtres(params):
+    """Filtres du catalogue lus dans un QueryDict, sous une forme canonique."""
+    filtres = {}
+    q = ' '.join(replier(params.get('q', '')).split())
+    if q:
+        filtres['q'] = q
+    ville = ' '.join(params.get('ville', '').split()).lower()
+    if ville:
+        filtres['ville'] = ville
+    if params.get('type_espace') in dict(Espace.TYPE_CHOICES):
+        filtres['type_espace'] = params['type_espace']
+    if params.get('prix') in {code for code, *_ in TRANCHES_PRIX}:
+        filtres['prix'] = params['prix']
+    if params.get('capacite') in {code for code, *_ in TRANCHES_CAPACITE}:
+        filtres['capacite'] = params['capacite']
+    equipements = sorted({slug for slug in params.getlist('equipements') if slug})
+    if equipements:
+        filtres['equipements'] = equipements
+    position = _position(params)
+    if position:
+        filtres['lat'], filtres['lon'] = position
+        filtres['rayon'] = _rayon(params.get('rayon'))
+    try:
+        filtres['date'] = datetime.strptime(params.get('date', ''), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        pass
+    else:
+        heure_debut, heure_fin = _heure(params.get('heure_debut')), _heure(params.get('heure_fin'))
+        if heure_debut and heure_fin and (heure_fin == time(0, 0) or heure_fin > heure_debut):
+            filtres['heure_debut'] = heure_debut.strftime('%H:%M')
+            filtres['heure_fin'] = heure_fin.strftime('%H:%M')
+    return filtres
+
+
+def types_categorie(categorie):
+    return CATEGORIES.get(categorie, [categorie])
+
+
+def cle_filtres(filtres):
+    return hashlib.sha1(json.dumps(filtres, sort_keys=True).encode()).hexdigest()
+
+
+def filtrer_espaces(filtres, espaces=None):
+    """Applique des filtres normalisés au catalogue des espaces disponibles."""
+    if espaces is None:
+        espaces = Espace.objects.filter(disponible=True)
+    if 'q' in filtres:
+        espaces = rechercher(espaces, filtres['q'])
+    if 'equipements' in filtres:
+        espaces = filtrer_equipements(espaces, filtres['equipements'])
+    if 'ville' in filtres:
+        espaces = espaces.filter(ville__icontains=filtres['ville'])
+    if 'type_espace' in filtres:
+        espaces = espaces.filter(type_espace=filtres['type_espace'])
+    if 'prix' in filtres:
+        _, _, minimum, maximum = next(t for t in TRANCHES_PRIX if t[0] == filtres['prix'])
+        espaces = espaces.filter(condition_tranche('prix_par_heure', minimum, maximum))
+    if 'capacite' in filtres:
+        _, _, minimum, maximum = next(t for t in TRANCHES_CAPACITE if t[0] == filtres['capacite'])
+        espaces = espaces.filter(condition_tranche('capacite', minimum, maximum))
+    if 'lat' in filtres:
+        espaces = autour(espaces, filtres['lat'], filtres['lon'], filtres['rayon'])
+    if 'date' in filtres:
+        heure_debut = heure_fin = None
+        if 'heure_debut' in filtres:
+            heure_debut = _heure(filtres['heure_debut'])
+            heure_fin = _heure(filtres['heure_fin'])
+        espaces = filtrer_libres(espaces, datetime.fromisoformat(filtres['date']).date(), heure_debut, heure_fin)
+    return espaces
@@ -0,0 +1,129 @@
+"""
+Masques de créneaux par (espace, jour).
+
+Chaque journée est découpée en 48 créneaux de 30 minutes ; un créneau
+partiellement couvert par une réservation est considéré comme occupé.
+La table DisponibiliteJour est recalculée à partir des réservations brutes
+pour les jours touchés, ce qui la garde exacte quel que soit l'ordre des
+modifications.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .disponibilite import MINUTES_PAR_JOUR, bornes, reservations_actives, reservations_periode
+from .models import DisponibiliteJour, Espace
+
+MINUTES_PAR_CRENEAU = 30
+NB_CRENEAUX = MINUTES_PAR_JOUR // MINUTES_PAR_CRENEAU
+JOURNEE_COMPLETE = (1 << NB_CRENEAUX) - 1
+
+
+def masque_minutes(debut, fin):
+    """Masque des créneaux couvrant [debut, fin[, en minutes depuis minuit."""
+    premier = debut // MINUTES_PAR_CRENEAU
+    dernier = -(-fin // MINUTES_PAR_CRENEAU)
+    return ((1 << (dernier - premier)) - 1) << premier
+
+
+def masque_plage(heure_debut, heure_fin):
+    """Masque d'une plage horaire dans la journée ; 00:00 en fin = minuit."""
+    debut = heure_debut.hour * 60 + heure_debut.minute
+    fin = heure_fin.hour * 60 + heure_fin.minute or MINUTES_PAR_JOUR
+    return masque_minutes(debut, fin)
+
+
+def masques_par_jour(date_obj, heure_debut, duree_heures):
+    """Découpe un créneau en {jour: masque}, en gérant le passage de minuit."""
+    debut, fin = bornes(date_obj, heure_debut, duree_heures)
+    masques = {}
+    while debut < fin:
+        jour_ordinal, minute = divmod(debut, MINUTES_PAR_JOUR)
+        fin_jour = min(fin, (jour_ordinal + 1) * MINUTES_PAR_JOUR)
+        masques[date_obj.fromordinal(jour_ordinal)] = masque_minutes(minute, fin_jour - jour_ordinal * MINUTES_PAR_JOUR)
+        debut = fin_jour
+    return masques
+
+
+def jours_couverts(date_obj, heure_debut, duree_heures):
+    return list(masques_par_jour(date_obj, heure_debut, duree_heures))
+
+
+def calculer_masques(espace_id, jours):
+    """Calcule les masques exacts d'un espace pour un ensemble de jours."""
+    jours = set(jours)
+    masques = dict.fromkeys(jours, 0)
+    proches, longues = reservations_periode(espace_id, min(jours), max(jours))
+    champs = ('date', 'heure_debut', 'duree_heures')
+    for d, h, duree in proches.values_list(*champs).union(longues.values_list(*champs), all=True):
+        for jour, masque in masques_par_jour(d, h, duree).items():
+            if jour in masques:
+                masques[jour] |= masque
+    return masques
+
+
+def recalculer_disponibilites(paires):
+    """
+    Recalcule les masques pour des couples (espace_id, date).
+
+    Une requête de lecture et un upsert groupé par espace, quel que soit
+    le nombre de jours concernés.
+    """
+    par_espace = defaultdict(set)
+    for espace_id, jour in paires:
+        par_espace[espace_id].add(jour)
+
+    for espace_id, jours in par_espace.items():
+        masques = calculer_masques(espace_id, jours)
+        DisponibiliteJour.objects.bulk_create(
+            [DisponibiliteJour(espace_id=espace_id, date=jour, creneaux=m) for jour, m in masques.items()],
+            update_conflicts=True,
+            unique_fields=['espace', 'date'],
+            update_fields=['creneaux', 'updated_at'],
+        )
+
+
+def reconstruire_disponibilites(espaces=None, taille_lot=5000):
+    """Reconstruit toute la table à partir des réservations actives."""
+    espaces = espaces if espaces is not None else Espace.objects.values_list('id', flat=True)
+    total = 0
+    for espace_id in espaces:
+        masques = defaultdict(int)
+        lignes = reservations_actives(espace_id).order_by().values_list('date', 'heure_debut', 'duree_heures')
+        for d, h, duree in lignes.iterator(chunk_size=taille_lot):
+            for jour, masque in masques_par_jour(d, h, duree).items():
+                masques[jour] |= masque
+
+        with transaction.atomic():
+            DisponibiliteJour.objects.filter(espace_id=espace_id).delete()
+            DisponibiliteJour.objects.bulk_create(
+                (DisponibiliteJour(espace_id=espace_id, date=jour, creneaux=m) for jour, m in masques.items()),
+                batch_size=taille_lot,
+            )
+        total += len(masques)
+    return total
+
+
+def espaces_occupes(date_obj, masque):
+    """Identifiants des espaces ayant au moins un créneau occupé dans le masque."""
+    return (
+        DisponibiliteJour.objects
+        .filter(date=date_obj)
+        .annotate(commun=F('creneaux').bitand(masque))
+        .exclude(commun=0)
+        .values('espace_id')
+    )
+
+
+def filtrer_libres(espaces, date_obj, heure_debut=None, heure_fin=None):
+    """
+    Restreint un queryset d'espaces à ceux libres sur la plage demandée.
+
+    Sans plage horaire, on garde les espaces qui ont encore au moins un
+    créneau libre dans la journée.
+    """
+    if heure_debut and heure_fin:
+        return espaces.exclude(id__in=espaces_occupes(date_obj, masque_plage(heure_debut, heure_fin)))
+    complets = DisponibiliteJour.objects.filter(date=date_obj, creneaux=JOURNEE_COMPLETE).values('espace_id')
+    return espaces.exclude(id__in=complets)
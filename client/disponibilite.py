@@ -0,0 +1,142 @@
+"""
+Moteur de disponibilité des espaces.
+
+Une réservation occupe l'intervalle [début, début + duree_heures[ exprimé en
+minutes absolues (jour ordinal * 1440 + minutes), ce qui gère naturellement
+les réservations qui débordent sur le lendemain.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .models import Reservation
+
+MINUTES_PAR_JOUR = 24 * 60
+
+STATUTS_LIBERES = Reservation.STATUTS_LIBERES
+
+
+def bornes(date_obj, heure_debut, duree_heures):
+    """Retourne (début, fin) en minutes absolues pour un créneau."""
+    debut = date_obj.toordinal() * MINUTES_PAR_JOUR + heure_debut.hour * 60 + heure_debut.minute
+    return debut, debut + int(duree_heures) * 60
+
+
+def bornes_reservation(reservation):
+    return bornes(reservation.date, reservation.heure_debut, reservation.duree_heures)
+
+
+class IntervalIndex:
+    """
+    Index d'intervalles d'un espace, trié par début.
+
+    Les réservations validées ne se chevauchent pas, mais l'historique peut en
+    contenir : on garde donc la durée maximale indexée pour borner la fenêtre
+    de recherche. Une vérification coûte O(log n + k), k étant le nombre
+    d'intervalles commençant dans cette fenêtre (quelques-uns en pratique).
+    """
+
+    def __init__(self, intervalles=()):
+        self._debuts = []
+        self._entrees = []
+        self._duree_max = 0
+        for debut, fin, ident in sorted(intervalles):
+            self._debuts.append(debut)
+            self._entrees.append((debut, fin, ident))
+            self._duree_max = max(self._duree_max, fin - debut)
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def ajouter(self, debut, fin, ident=None):
+        i = bisect_left(self._debuts, debut)
+        self._debuts.insert(i, debut)
+        self._entrees.insert(i, (debut, fin, ident))
+        self._duree_max = max(self._duree_max, fin - debut)
+
+    def retirer(self, debut, ident):
+        i = bisect_left(self._debuts, debut)
+        j = bisect_right(self._debuts, debut, lo=i)
+        for k in range(i, j):
+            if self._entrees[k][2] == ident:
+                del self._debuts[k]
+                del self._entrees[k]
+                return True
+        return False
+
+    def _candidats(self, debut, fin):
+        i = bisect_left(self._debuts, debut - self._duree_max + 1)
+        j = bisect_left(self._debuts, fin, lo=i)
+        return self._entrees[i:j]
+
+    def conflits(self, debut, fin, exclure=None):
+        """Identifiants des intervalles qui chevauchent [debut, fin[."""
+        return [
+            ident for d, f, ident in self._candidats(debut, fin)
+            if f > debut and (exclure is None or ident != exclure)
+        ]
+
+    def chevauche(self, debut, fin, exclure=None):
+        return any(
+            f > debut and (exclure is None or ident != exclure)
+            for d, f, ident in self._candidats(debut, fin)
+        )
+
+
+def reservations_actives(espace):
+    """
+    Réservations d'un espace qui bloquent encore leur créneau.
+
+    Un blocage en attente de paiement dont le délai est dépassé ne compte
+    plus, même avant que le balayage ne l'ait passé en « expiree ».
+    """
+    espace_id = getattr(espace, 'pk', espace)
+    return (
+        Reservation.objects.filter(espace_id=espace_id)
+        .exclude(status__in=STATUTS_LIBERES)
+        .exclude(status='en_attente', expire_le__lte=timezone.now())
+    )
+
+
+def reservations_periode(espace, date_debut, date_fin):
+    """
+    Réservations actives pouvant toucher les jours [date_debut, date_fin].
+
+    Une réservation de moins de 24h ne peut déborder que depuis la veille ;
+    les rares réservations plus longues sont récupérées à part. Les deux
+    parties sont réunies par UNION pour que chacune reste une recherche sur
+    l'index (espace, date) : un OR ferait parcourir tout l'espace.
+    """
+    actives = reservations_actives(espace).order_by()
+    proches = actives.filter(date__range=(date_debut - timedelta(days=1), date_fin))
+    longues = actives.filter(date__lt=date_debut - timedelta(days=1), duree_heures__gt=24)
+    return proches, longues
+
+
+def construire_index(espace, date_debut, date_fin):
+    """Charge en une requête l'index d'intervalles d'un espace sur une période."""
+    champs = ('id', 'date', 'heure_debut', 'duree_heures')
+    proches, longues = reservations_periode(espace, date_debut, date_fin)
+    lignes = proches.values_list(*champs).union(longues.values_list(*champs), all=True)
+    return IntervalIndex(
+        bornes(d, h, duree) + (ident,) for ident, d, h, duree in lignes
+    )
+
+
+def jour_de(minutes):
+    """Jour calendaire contenant la minute absolue donnée."""
+    return date.fromordinal(minutes // MINUTES_PAR_JOUR)
+
+
+def trouver_conflits(espace, date_obj, heure_debut, duree_heures, exclure=None):
+    """Retourne les réservations actives qui chevauchent le créneau demandé."""
+    debut, fin = bornes(date_obj, heure_debut, duree_heures)
+    index = construire_index(espace, date_obj, jour_de(fin - 1))
+    return Reservation.objects.filter(id__in=index.conflits(debut, fin, exclure=exclure))
+
+
+def est_disponible(espace, date_obj, heure_debut, duree_heures, exclure=None):
+    debut, fin = bornes(date_obj, heure_debut, duree_heures)
+    index = construire_index(espace, date_obj, jour_de(fin - 1))
+    return not index.chevauche(debut, fin, exclure=exclure)
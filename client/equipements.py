@@ -0,0 +1,96 @@
+"""
+Vocabulaire normalisé des équipements.
+
+Le champ texte Espace.equipements reste la saisie de l'administration ; à
+chaque enregistrement il est découpé en étiquettes Equipement reliées par
+EspaceEquipement. Les pages lisent ces étiquettes préchargées
+(equipements_list) et le catalogue filtre dessus via l'index
+(equipement, espace).
+"""
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.utils.text import slugify
+
+from .models import Equipement, EspaceEquipement
+
+CLE_FREQUENTS = 'equipements:frequents'
+DUREE_CACHE_FREQUENTS = 600
+
+
+@lru_cache(maxsize=4096)
+def _slug(nom):
+    return slugify(nom)[:100]
+
+
+def decouper(texte):
+    """« Wi-Fi, projecteur ,Wi-fi » -> {'wi-fi': 'Wi-Fi', 'projecteur': 'projecteur'}"""
+    equipements = {}
+    for nom in (texte or '').split(','):
+        nom = nom.strip()
+        slug = _slug(nom)
+        if slug and slug not in equipements:
+            equipements[slug] = nom[:100]
+    return equipements
+
+
+def synchroniser_equipements(espaces):
+    """Recrée les liens équipement des espaces donnés à partir de leur texte."""
+    par_espace = {espace.pk: decouper(espace.equipements) for espace in espaces}
+    noms = {slug: nom for equipements in par_espace.values() for slug, nom in equipements.items()}
+    with transaction.atomic():
+        Equipement.objects.bulk_create(
+            [Equipement(slug=slug, nom=nom) for slug, nom in noms.items()], ignore_conflicts=True
+        )
+        ids = dict(Equipement.objects.filter(slug__in=noms).values_list('slug', 'id'))
+        EspaceEquipement.objects.filter(espace_id__in=par_espace).delete()
+        EspaceEquipement.objects.bulk_create(
+            [
+                EspaceEquipement(espace_id=espace_id, equipement_id=ids[slug])
+                for espace_id, equipements in par_espace.items()
+                for slug in equipements
+            ],
+            batch_size=2000,
+        )
+    cache.delete(CLE_FREQUENTS)
+
+
+def avec_equipements(espaces):
+    """Précharge les équipements de chaque espace dans equipements_list."""
+    return espaces.prefetch_related(
+        Prefetch('equipements_tags', queryset=Equipement.objects.order_by('nom'), to_attr='equipements_list')
+    )
+
+
+def filtrer_equipements(espaces, slugs):
+    """
+    Espaces possédant tous les équipements demandés : les liens du premier
+    équipement sont parcourus par l'index (equipement, espace) et chacun des
+    autres est vérifié par une recherche dans la contrainte unique
+    (espace, equipement).
+    """
+    slugs = set(slugs)
+    if not slugs:
+        return espaces
+    ids = list(Equipement.objects.filter(slug__in=slugs).values_list('id', flat=True))
+    if len(ids) < len(slugs):
+        return espaces.none()
+    complets = EspaceEquipement.objects.filter(equipement_id=ids[0])
+    for equipement_id in ids[1:]:
+        complets = complets.filter(Exists(
+            EspaceEquipement.objects.filter(espace_id=OuterRef('espace_id'), equipement_id=equipement_id)
+        ))
+    return espaces.filter(id__in=complets.values('espace_id'))
+
+
+def equipements_frequents(limite=12):
+    """Équipements les plus répandus, proposés comme filtres (mis en cache)."""
+    equipements = cache.get(CLE_FREQUENTS)
+    if equipements is None:
+        equipements = list(
+            Equipement.objects.annotate(nb=Count('espaceequipement')).order_by('-nb', 'nom')[:limite]
+        )
+        cache.set(CLE_FREQUENTS, equipements, DUREE_CACHE_FREQUENTS)
+    return equipements
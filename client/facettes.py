@@ -0,0 +1,83 @@
+"""
+Comptes par facette pour la recherche du catalogue.
+
+Toutes les facettes (ville, type, tranche de prix, tranche de capacité) sont
+calculées en une seule agrégation groupée sur le queryset filtré, puis
+sommées en Python. Le résultat est lu dans le cache du catalogue sous la clé
+des filtres normalisés (voir client.cache_catalogue).
+"""
+from collections import Counter
+
+from django.db.models import Count
+
+from .cache_catalogue import lire
+from .catalogue import TRANCHES_CAPACITE, TRANCHES_PRIX, cle_filtres, filtrer_espaces, tranche
+from .models import Espace
+
+# Le filtre par date dépend aussi des réservations : durée de vie courte
+DUREE_CACHE = 60
+
+
+def compter_facettes(espaces):
+    """{facette: [(valeur, libellé, nombre), ...]} pour un queryset d'espaces."""
+    groupes = (
+        espaces.order_by()
+        .values('ville', 'type_espace')
+        .annotate(
+            tranche_prix=tranche('prix_par_heure', TRANCHES_PRIX),
+            tranche_capacite=tranche('capacite', TRANCHES_CAPACITE),
+        )
+        .values('ville', 'type_espace', 'tranche_prix', 'tranche_capacite')
+        .annotate(nb=Count('id'))
+    )
+    comptes = {facette: Counter() for facette in ('ville', 'type_espace', 'prix', 'capacite')}
+    for groupe in groupes:
+        comptes['ville'][groupe['ville']] += groupe['nb']
+        comptes['type_espace'][groupe['type_espace']] += groupe['nb']
+        comptes['prix'][groupe['tranche_prix']] += groupe['nb']
+        comptes['capacite'][groupe['tranche_capacite']] += groupe['nb']
+
+    types = dict(Espace.TYPE_CHOICES)
+    return {
+        'ville': [(ville, ville, nb) for ville, nb in sorted(comptes['ville'].items(), key=lambda c: (-c[1], c[0]))],
+        'type_espace': [(code, types.get(code, code), nb) for code, nb in comptes['type_espace'].most_common()],
+        'prix': [(code, libelle, comptes['prix'][code]) for code, libelle, *_ in TRANCHES_PRIX if comptes['prix'][code]],
+        'capacite': [
+            (code, libelle, comptes['capacite'][code])
+            for code, libelle, *_ in TRANCHES_CAPACITE if comptes['capacite'][code]
+        ],
+    }
+
+
+def facettes(filtres):
+    """Facettes des filtres normalisés donnés, lues en cache si possible."""
+    return lire(f"facettes:{cle_filtres(filtres)}", lambda: compter_facettes(filtrer_espaces(filtres)), DUREE_CACHE)
+
+
+TITRES = {
+    'ville': 'Ville',
+    'type_espace': "Type d'espace",
+    'prix': 'Prix par heure',
+    'capacite': 'Capacité',
+}
+
+
+def avec_liens(resultat, params):
+    """
+    Ajoute à chaque valeur de facette l'URL de recherche qui l'applique (ou
+    la retire si elle est déjà appliquée), en conservant les autres paramètres.
+    """
+    blocs = []
+    for facette, valeurs in resultat.items():
+        liens = []
+        for valeur, libelle, nb in valeurs:
+            requete = params.copy()
+            actif = params.get(facette, '').lower() == str(valeur).lower()
+            if actif:
+                requete.pop(facette, None)
+            else:
+                requete[facette] = valeur
+            liens.append({'libelle': libelle, 'nb': nb, 'actif': actif, 'url': '?' + requete.urlencode()})
+        if liens:
+            blocs.append({'titre': TITRES[facette], 'liens': liens})
+    return blocs
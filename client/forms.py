@@ -1,7 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from datetime import date, datetime
-from .models import Reservation
+from .models import Reservation, SerieReservation
+from .disponibilite import est_disponible
 
 class ReservationForm(forms.ModelForm):
     class Meta:
@@ -26,6 +27,7 @@ class ReservationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.espace = kwargs.pop('espace', None)
         super().__init__(*args, **kwargs)
+        self.creneau_complet = False
 
     def clean_date(self):
         """Valider que la date n'est pas dans le passé"""
@@ -51,14 +53,11 @@ class ReservationForm(forms.ModelForm):
                 raise ValidationError("Vous ne pouvez pas réserver dans le passé.")
 
 
-        if self.espace and selected_date and selected_time:
-            exists = Reservation.objects.filter(
-                espace=self.espace,
-                date=selected_date,
-                heure_debut=selected_time
-            ).exists()
-            
-            if exists:
+        duree = cleaned_data.get('duree_heures')
+
+        if self.espace and selected_date and selected_time and duree:
+            if not est_disponible(self.espace, selected_date, selected_time, duree, exclure=self.instance.pk):
+                self.creneau_complet = True
                 raise ValidationError("Ce créneau est déjà réservé.")
         
         return cleaned_data
@@ -72,4 +71,42 @@ class ReservationForm(forms.ModelForm):
             reservation.user = user
         if commit:
             reservation.save()
-        return reservation
\ No newline at end of file
+        return reservation
+
+
+class SerieReservationForm(forms.Form):
+    JOURS_SEMAINE = [
+        (0, 'Lun'), (1, 'Mar'), (2, 'Mer'), (3, 'Jeu'), (4, 'Ven'), (5, 'Sam'), (6, 'Dim'),
+    ]
+
+    frequence = forms.ChoiceField(
+        choices=SerieReservation.FREQUENCE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    intervalle = forms.IntegerField(
+        min_value=1, max_value=12, initial=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    jours_semaine = forms.TypedMultipleChoiceField(
+        choices=JOURS_SEMAINE, coerce=int, required=False,
+        widget=forms.CheckboxSelectMultiple
+    )
+    date_debut = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    date_fin = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    heure_debut = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}))
+    duree_heures = forms.TypedChoiceField(
+        choices=[(1, '1h'), (2, '2h'), (3, '3h'), (4, '4h')], coerce=int,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_debut = cleaned_data.get('date_debut')
+        date_fin = cleaned_data.get('date_fin')
+
+        if date_debut and date_debut < date.today():
+            raise ValidationError("Vous ne pouvez pas réserver une date dans le passé.")
+        if date_debut and date_fin and date_fin < date_debut:
+            raise ValidationError("La date de fin doit suivre la date de début.")
+
+        return cleaned_data
@@ -0,0 +1,123 @@
+"""
+Recherche géographique des espaces.
+
+Les coordonnées viennent d'une table de villes livrée avec le projet
+(client/data/villes.csv, sans appel réseau) : un espace est placé au centre
+de sa ville. Chaque espace porte aussi le numéro de sa cellule dans une
+grille de PAS_GRILLE degrés ; une recherche par rayon se ramène à la liste
+des cellules de la boîte englobante (colonne indexée), puis à un filtre
+exact sur la distance calculée en SQL.
+"""
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ACos, Cos, Least, Radians, Sin
+
+from .recherche import replier
+
+FICHIER_VILLES = Path(__file__).resolve().parent / 'data' / 'villes.csv'
+RAYON_TERRE_KM = 6371.0
+PAS_GRILLE = 0.1
+COLONNES = int(360 / PAS_GRILLE)
+# Au-delà, la boîte englobante seule (index sur latitude) est plus efficace
+CELLULES_MAX = 400
+
+
+def cle_ville(nom):
+    """« Saint-Étienne » et « saint etienne » donnent la même clé."""
+    return ' '.join(replier(nom or '').replace('-', ' ').replace("'", ' ').split())
+
+
+@lru_cache(maxsize=1)
+def table_villes():
+    with open(FICHIER_VILLES, encoding='utf-8') as fichier:
+        return {
+            cle_ville(ligne['ville']): (float(ligne['latitude']), float(ligne['longitude']))
+            for ligne in csv.DictReader(fichier)
+        }
+
+
+def geocoder(ville):
+    """(latitude, longitude) du centre d'une ville connue, sinon None."""
+    return table_villes().get(cle_ville(ville))
+
+
+def localiser(espace, ancienne_ville=None):
+    """
+    Place un espace au centre de sa ville s'il n'a pas de coordonnées ou si
+    sa ville a changé, puis recalcule sa cellule de grille.
+    """
+    if espace.latitude is None or espace.longitude is None or (
+        ancienne_ville is not None and cle_ville(ancienne_ville) != cle_ville(espace.ville)
+    ):
+        espace.latitude, espace.longitude = geocoder(espace.ville) or (None, None)
+    if espace.latitude is None or espace.longitude is None:
+        espace.cellule = None
+    else:
+        espace.cellule = cellule(espace.latitude, espace.longitude)
+
+
+def cellule(latitude, longitude):
+    ligne = int((latitude + 90) // PAS_GRILLE)
+    colonne = int((longitude + 180) // PAS_GRILLE) % COLONNES
+    return ligne * COLONNES + colonne
+
+
+def boite(latitude, longitude, rayon_km):
+    """Boîte englobante (lat_min, lat_max, lon_min, lon_max) d'un cercle."""
+    delta_lat = math.degrees(rayon_km / RAYON_TERRE_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    delta_lon = min(180.0, math.degrees(rayon_km / (RAYON_TERRE_KM * cos_lat)))
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def cellules_boite(lat_min, lat_max, lon_min, lon_max):
+    lignes = range(int((lat_min + 90) // PAS_GRILLE), int((lat_max + 90) // PAS_GRILLE) + 1)
+    colonnes = range(int((lon_min + 180) // PAS_GRILLE), int((lon_max + 180) // PAS_GRILLE) + 1)
+    if len(lignes) * len(colonnes) > CELLULES_MAX:
+        return None
+    return [ligne * COLONNES + colonne % COLONNES for ligne in lignes for colonne in colonnes]
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique (haversine) en kilomètres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAYON_TERRE_KM * math.asin(math.sqrt(a))
+
+
+def expression_distance(latitude, longitude):
+    """Distance en km entre le point donné et chaque espace, calculée par la base."""
+    phi = math.radians(latitude)
+    cosinus = (
+        Value(math.cos(phi)) * Cos(Radians(F('latitude'))) * Cos(Radians(F('longitude')) - Value(math.radians(longitude)))
+        + Value(math.sin(phi)) * Sin(Radians(F('latitude')))
+    )
+    # Least évite un arrondi au-dessus de 1, hors du domaine d'ACOS
+    return Value(RAYON_TERRE_KM) * ACos(Least(Value(1.0), cosinus), output_field=FloatField())
+
+
+def dans_boite(espaces, latitude, longitude, rayon_km):
+    """Pré-filtre indexé : cellules de la grille, puis bornes de la boîte."""
+    lat_min, lat_max, lon_min, lon_max = boite(latitude, longitude, rayon_km)
+    cellules = cellules_boite(lat_min, lat_max, lon_min, lon_max)
+    if cellules is not None:
+        espaces = espaces.filter(cellule__in=cellules)
+    espaces = espaces.filter(latitude__range=(lat_min, lat_max))
+    if lon_min >= -180 and lon_max <= 180:
+        espaces = espaces.filter(longitude__range=(lon_min, lon_max))
+    return espaces
+
+
+def autour(espaces, latitude, longitude, rayon_km):
+    """Espaces à moins de rayon_km du point, annotés de leur distance (km)."""
+    return (
+        dans_boite(espaces, latitude, longitude, rayon_km)
+        .annotate(distance=expression_distance(latitude, longitude))
+        .filter(distance__lte=rayon_km)
+    )
@@ -0,0 +1,139 @@
+"""
+Journal des paiements et rapprochement avec le relevé de la passerelle.
+
+Chaque mouvement d'argent est une EcriturePaiement ajoutée dans la
+transaction qui l'a causé (capture, remboursement) : le journal n'est jamais
+modifié, les rapports financiers le somment par (date, espace, client) sans
+réinterpréter les réservations.
+
+Le relevé de règlement de la passerelle est un CSV « reference;date;montant »
+(montants signés, remboursements négatifs), trié par référence, avec
+éventuellement plusieurs lignes par référence. Le rapprochement est une
+fusion de deux flux triés par référence : les écritures lues par l'index
+(reference, nature) par paquets, et les lignes du relevé lues une à une. Les
+montants sont sommés par référence de chaque côté puis comparés ; la mémoire
+utilisée ne dépend pas de la taille du journal ni du relevé.
+
+La fusion compare les références avec les opérateurs de chaînes Python,
+c'est-à-dire par points de code. Le journal est donc trié avec une collation
+binaire (BINARY sous SQLite, "C" sous PostgreSQL, utf8mb4_bin sous MySQL,
+équivalentes pour de l'UTF-8) et non celle de la base, qui peut ignorer la
+casse ou les accents ; le relevé doit suivre le même ordre. Chaque flux est
+vérifié au fil de la lecture : un ordre différent lève une erreur au lieu de
+produire de faux écarts.
+"""
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
+
+from django.db import connections
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from .models import EcriturePaiement
+
+TAILLE_PAQUET = 2000
+COLONNES_RELEVE = ('reference', 'date', 'montant')
+COLLATIONS_BINAIRES = {'sqlite': 'BINARY', 'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+
+class ReleveInvalide(ValueError):
+    pass
+
+
+class JournalMalTrie(ValueError):
+    """La base n'a pas rendu les références dans l'ordre des chaînes Python."""
+
+
+class Ecart(NamedTuple):
+    reference: str
+    nature: str
+    montant_journal: Decimal = None
+    montant_releve: Decimal = None
+
+
+def inscrire(nature, reservation, montant, reference=''):
+    """Ajoute une écriture au journal ; à appeler dans la transaction du mouvement."""
+    return EcriturePaiement.objects.create(
+        date=timezone.localdate(), nature=nature, montant=montant, reference=reference,
+        reservation_id=reservation.id, espace_id=reservation.espace_id, user_id=reservation.user_id,
+    )
+
+
+def soldes_journal(taille_paquet=TAILLE_PAQUET, ecritures=None):
+    """(reference, montant net) des écritures (toutes par défaut), par référence croissante (ordre binaire)."""
+    ecritures = EcriturePaiement.objects.all() if ecritures is None else ecritures
+    collation = COLLATIONS_BINAIRES.get(connections[ecritures.db].vendor)
+    lignes = (
+        ecritures.exclude(reference='')
+        .order_by(Collate('reference', collation) if collation else 'reference', 'nature')
+        .values_list('reference', 'montant').iterator(chunk_size=taille_paquet)
+    )
+    precedente = ''
+    for reference, groupe in groupby(lignes, itemgetter(0)):
+        if reference < precedente:
+            raise JournalMalTrie(f"{reference!r} lue après {precedente!r}")
+        precedente = reference
+        yield reference, sum(montant for _, montant in groupe)
+
+
+def lignes_releve(fichier):
+    """(reference, montant) de chaque ligne du relevé ; ReleveInvalide s'il est mal formé ou mal trié."""
+    lecteur = csv.reader(fichier, delimiter=';')
+    if tuple(next(lecteur, ())) != COLONNES_RELEVE:
+        raise ReleveInvalide(f"En-tête attendu : {';'.join(COLONNES_RELEVE)}")
+    precedente = ''
+    for numero, ligne in enumerate(lecteur, start=2):
+        try:
+            reference, _, montant = ligne
+            montant = Decimal(montant)
+        except (ValueError, InvalidOperation):
+            raise ReleveInvalide(f"Ligne {numero} illisible : {';'.join(ligne)}")
+        if reference < precedente:
+            raise ReleveInvalide(f"Ligne {numero} : le relevé doit être trié par référence")
+        precedente = reference
+        yield reference, montant
+
+
+def soldes_releve(fichier):
+    for reference, groupe in groupby(lignes_releve(fichier), itemgetter(0)):
+        yield reference, sum(montant for _, montant in groupe)
+
+
+def rapprocher(journal, releve, compteurs=None):
+    """
+    Fusionne deux flux (reference, montant) triés par référence et produit un
+    Ecart par référence absente d'un côté ou dont les montants diffèrent.
+    compteurs, s'il est fourni, reçoit le nombre de références lues de chaque côté.
+    """
+    compteurs = compteurs if compteurs is not None else {}
+    compteurs.update(journal=0, releve=0)
+    fin = (None, None)
+    journal, releve = iter(journal), iter(releve)
+    ref_j, montant_j = next(journal, fin)
+    ref_r, montant_r = next(releve, fin)
+    while ref_j is not None or ref_r is not None:
+        if ref_r is None or (ref_j is not None and ref_j < ref_r):
+            yield Ecart(ref_j, 'absente_du_releve', montant_journal=montant_j)
+            compteurs['journal'] += 1
+            ref_j, montant_j = next(journal, fin)
+        elif ref_j is None or ref_r < ref_j:
+            yield Ecart(ref_r, 'absente_du_journal', montant_releve=montant_r)
+            compteurs['releve'] += 1
+            ref_r, montant_r = next(releve, fin)
+        else:
+            if montant_j != montant_r:
+                yield Ecart(ref_j, 'montant', montant_j, montant_r)
+            compteurs['journal'] += 1
+            compteurs['releve'] += 1
+            ref_j, montant_j = next(journal, fin)
+            ref_r, montant_r = next(releve, fin)
+
+
+def ecrire_releve(fichier, mouvements):
+    """Écrit un relevé à partir de (reference, date, montant) déjà triés par référence."""
+    ecrivain = csv.writer(fichier, delimiter=';', lineterminator='\n')
+    ecrivain.writerow(COLONNES_RELEVE)
+    ecrivain.writerows(mouvements)
@@ -0,0 +1,126 @@
+"""
+Liste d'attente des créneaux complets.
+
+Quand des réservations libèrent des journées, la promotion des demandes en
+attente est planifiée après le commit dans un thread dédié : la requête qui
+annule ne fait qu'ajouter une tâche à la file. Pour une journée, les demandes
+sont lues par l'index (espace, date, statut, created_at) dans l'ordre
+d'arrivée et confrontées à un index d'intervalles chargé une seule fois ;
+seules celles qui tiennent dans un trou passent par le service de réservation.
+"""
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from .boite_envoi import mettre_en_file
+from .disponibilite import bornes, construire_index
+from .models import ListeAttente
+from .reservations import CreneauIndisponible, fin_blocage, reserver
+
+logger = logging.getLogger(__name__)
+
+_executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix='liste-attente')
+_contexte = threading.local()
+
+
+def planifier_promotions(paires):
+    """À appeler quand des journées (espace_id, date) ont pu se libérer."""
+    paires = set(paires)
+    # Les réservations créées par une promotion ne relancent pas de promotion
+    if not paires or getattr(_contexte, 'en_promotion', False):
+        return
+    if getattr(settings, 'LISTE_ATTENTE_ASYNCHRONE', True):
+        transaction.on_commit(lambda: _executeur.submit(_promouvoir_en_tache, paires))
+    else:
+        transaction.on_commit(lambda: promouvoir_paires(paires))
+
+
+def _promouvoir_en_tache(paires):
+    close_old_connections()
+    try:
+        promouvoir_paires(paires)
+    except Exception:
+        logger.exception("Échec de la promotion de la liste d'attente")
+    finally:
+        close_old_connections()
+
+
+def promouvoir_paires(paires):
+    _contexte.en_promotion = True
+    try:
+        return _promouvoir_paires(paires)
+    finally:
+        _contexte.en_promotion = False
+
+
+def _promouvoir_paires(paires):
+    par_espace = defaultdict(set)
+    for espace_id, jour in paires:
+        par_espace[espace_id].add(jour)
+
+    # Une seule requête pour écarter les journées sans personne en attente
+    attendues = set(
+        ListeAttente.objects
+        .filter(statut='en_attente', espace_id__in=par_espace.keys(), date__in={j for js in par_espace.values() for j in js})
+        .values_list('espace_id', 'date')
+        .distinct()
+    )
+    total = 0
+    for espace_id, jour in attendues:
+        if jour in par_espace[espace_id]:
+            total += promouvoir(espace_id, jour)
+    return total
+
+
+def promouvoir(espace_id, jour, taille_lot=500):
+    """
+    Transforme en réservations, dans l'ordre d'arrivée, les demandes d'une
+    journée qui tiennent désormais. Retourne le nombre de demandes promues.
+    """
+    demandes = (
+        ListeAttente.objects
+        .filter(espace_id=espace_id, date=jour, statut='en_attente')
+        .order_by('created_at')
+        .values_list('id', 'heure_debut', 'duree_heures')
+    )
+    # L'index ne sert qu'à écarter sans requête les demandes qui ne tiennent
+    # pas ; reserver() reste seul juge pour celles qui semblent tenir.
+    index = construire_index(espace_id, jour, jour + timedelta(days=1))
+    promues = 0
+    for ident, heure_debut, duree_heures in demandes.iterator(chunk_size=taille_lot):
+        debut, fin = bornes(jour, heure_debut, duree_heures)
+        if index.chevauche(debut, fin):
+            continue
+        demande = ListeAttente.objects.select_related('user', 'espace').get(pk=ident)
+        try:
+            reservation = reserver(
+                demande.user, demande.espace, jour, heure_debut, duree_heures,
+                expire_le=fin_blocage(getattr(settings, 'LISTE_ATTENTE_DUREE_BLOCAGE_MINUTES', 60)),
+            )
+        except CreneauIndisponible:
+            continue
+        index.ajouter(debut, fin, reservation.pk)
+        ListeAttente.objects.filter(pk=ident, statut='en_attente').update(statut='promue', reservation=reservation)
+        notifier_promotion(demande, reservation)
+        promues += 1
+    return promues
+
+
+def notifier_promotion(demande, reservation):
+    html_message = render_to_string('client/emails/liste_attente_promue.html', {
+        'user': demande.user,
+        'reservation': reservation,
+    })
+    mettre_en_file(
+        f"Un créneau s'est libéré - {reservation.espace.nom}",
+        strip_tags(html_message),
+        [demande.user.email],
+        html_message=html_message,
+    )
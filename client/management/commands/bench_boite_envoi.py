@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from client.boite_envoi import envoyer_en_attente, mettre_en_file
+from client.models import EmailSortant
+from client.smtp_local import ServeurSMTPLocal
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, contre un serveur SMTP local simulant une latence réseau, "
+        "l'envoi direct dans la requête (une connexion par email) et la boîte "
+        "d'envoi : INSERT dans la requête puis worker(s) à connexion réutilisée. "
+        "Les emails créés sont supprimés à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500)
+        parser.add_argument('--latence', type=float, default=2.0, help="Aller-retour simulé, en millisecondes.")
+        parser.add_argument('--connexions', type=int, default=4)
+
+    def handle(self, *args, **options):
+        n = options['emails']
+        premier_id = (EmailSortant.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        with ServeurSMTPLocal(latence=options['latence'] / 1000) as serveur, override_settings(**serveur.reglages()):
+            try:
+                t0 = time.perf_counter()
+                for i in range(n):
+                    send_mail(f"Bench {i}", "Bonjour", None, [f"client{i}@exemple.fr"])
+                direct = time.perf_counter() - t0
+                self.stdout.write(
+                    f"Envoi direct      : {direct / n * 1000:6.2f} ms par requête, "
+                    f"{n / direct:6.0f} emails/s, {serveur.connexions} connexions"
+                )
+
+                for workers in (1, options['connexions']):
+                    t0 = time.perf_counter()
+                    for i in range(n):
+                        mettre_en_file(f"Bench {i}", "Bonjour", [f"client{i}@exemple.fr"])
+                    insertion = time.perf_counter() - t0
+
+                    connexions_avant = serveur.connexions
+                    t0 = time.perf_counter()
+                    with ThreadPoolExecutor(workers) as executeur:
+                        resultats = list(executeur.map(lambda _: self.worker(), range(workers)))
+                    envoi = time.perf_counter() - t0
+                    envoyes = sum(r['envoyes'] for r in resultats)
+                    assert envoyes == n, resultats
+                    self.stdout.write(
+                        f"Boîte d'envoi x{workers} : {insertion / n * 1000:6.2f} ms par requête, "
+                        f"{n / envoi:6.0f} emails/s, {serveur.connexions - connexions_avant} connexions"
+                    )
+            finally:
+                EmailSortant.objects.filter(id__gte=premier_id).delete()
+
+    def worker(self):
+        connexion_smtp = get_connection()
+        try:
+            return envoyer_en_attente(connexion=connexion_smtp)
+        finally:
+            connexion_smtp.close()
+            connection.close()
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from client.cache_catalogue import antememoire, invalider, remettre_a_zero, statistiques
+from client.models import Espace
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les pages du catalogue servies par le cache face à une "
+        "reconstruction, et le nombre de reconstructions quand de nombreuses "
+        "requêtes arrivent ensemble sur une clé froide. Les espaces sont "
+        "insérés (validés, pour être visibles des autres connexions) puis supprimés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espaces', type=int, default=20_000)
+        parser.add_argument('--requetes', type=int, default=50)
+        parser.add_argument('--concurrents', type=int, default=16)
+
+    def handle(self, *args, **options):
+        villes = ["Paris", "Lyon", "Lille", "Nantes", "Bordeaux"]
+        Espace.objects.bulk_create(
+            (Espace(
+                nom=f"Bench {i}", type_espace='reunion', ville=villes[i % len(villes)],
+                capacite=4 + i % 40, prix_par_heure=10 + i % 90, image='espaces/bench.jpg',
+            ) for i in range(options['espaces'])),
+            batch_size=5000,
+        )
+        try:
+            self.mesurer(options)
+        finally:
+            Espace.objects.filter(nom__startswith="Bench ").delete()
+
+    def mesurer(self, options):
+        client = Client(HTTP_HOST='localhost')
+        espace_id = Espace.objects.filter(nom='Bench 0').values_list('id', flat=True).first()
+        pages = {
+            'recherche': '/?ville=lyon&tri=prix_asc',
+            'categorie': '/espaces/categorie/reunion/?tri=capacite',
+            'detail': f'/espace/{espace_id}/',
+        }
+        for nom, url in pages.items():
+            froid = []
+            for _ in range(5):
+                invalider()
+                t0 = time.perf_counter()
+                client.get(url)
+                froid.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            for _ in range(options['requetes']):
+                client.get(url)
+            chaud = (time.perf_counter() - t0) / options['requetes']
+            self.stdout.write(
+                f"{nom:10} : reconstruction {sum(froid) / len(froid) * 1000:6.1f} ms, "
+                f"en cache {chaud * 1000:6.1f} ms"
+            )
+
+        # Rafale sur une clé froide : une seule reconstruction attendue
+        antememoire().clear()
+        remettre_a_zero()
+        depart = threading.Barrier(options['concurrents'])
+
+        def visiteur():
+            depart.wait()
+            Client(HTTP_HOST='localhost').get(pages['categorie'])
+
+        threads = [threading.Thread(target=visiteur) for _ in range(options['concurrents'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = statistiques()
+        self.stdout.write(
+            f"{options['concurrents']} requêtes simultanées sur une clé froide : "
+            f"{stats['reconstruction']} reconstruction(s), {stats['attente']} après attente"
+        )
@@ -0,0 +1,88 @@
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client.disponibilite import IntervalIndex, bornes, est_disponible
+from client.models import Espace, Reservation
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût d'une vérification de chevauchement sur un espace très chargé."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=100_000)
+        parser.add_argument('--verifications', type=int, default=10_000)
+        parser.add_argument(
+            '--db', action='store_true',
+            help="Mesure aussi le chemin base de données (données insérées puis annulées).",
+        )
+
+    def handle(self, *args, **options):
+        n = options['reservations']
+        nb_verifs = options['verifications']
+        creneaux = self.generer_creneaux(n)
+
+        t0 = time.perf_counter()
+        index = IntervalIndex(bornes(d, h, duree) + (i,) for i, (d, h, duree) in enumerate(creneaux))
+        construction = time.perf_counter() - t0
+
+        requetes = self.generer_requetes(creneaux, nb_verifs)
+        t0 = time.perf_counter()
+        occupes = sum(index.chevauche(*bornes(d, h, duree)) for d, h, duree in requetes)
+        verification = time.perf_counter() - t0
+
+        self.stdout.write(f"{len(index)} réservations indexées en {construction * 1000:.1f} ms")
+        self.stdout.write(
+            f"{nb_verifs} vérifications en mémoire : {verification / nb_verifs * 1e6:.2f} µs/vérif "
+            f"({occupes} créneaux occupés)"
+        )
+
+        if options['db']:
+            self.bench_db(creneaux, requetes[:min(nb_verifs, 1000)])
+
+    def generer_creneaux(self, n):
+        """Créneaux sans chevauchement, de 1 à 4h, répartis jour après jour."""
+        creneaux = []
+        jour = date.today()
+        heure = 8
+        for _ in range(n):
+            duree = random.randint(1, 4)
+            if heure + duree > 22:
+                jour += timedelta(days=1)
+                heure = 8
+            creneaux.append((jour, dtime(heure, 0), duree))
+            heure += duree + random.randint(0, 1)
+        return creneaux
+
+    def generer_requetes(self, creneaux, n):
+        premier, dernier = creneaux[0][0], creneaux[-1][0]
+        etendue = (dernier - premier).days + 1
+        return [
+            (premier + timedelta(days=random.randrange(etendue)), dtime(random.randint(7, 21), random.choice((0, 30))), random.randint(1, 4))
+            for _ in range(n)
+        ]
+
+    def bench_db(self, creneaux, requetes):
+        with transaction.atomic():
+            user = User.objects.create(username=f"bench_{time.time_ns()}")
+            espace = Espace.objects.create(
+                nom="Bench", type_espace='reunion', capacite=10, ville="Bench", prix_par_heure=10
+            )
+            Reservation.objects.bulk_create(
+                (Reservation(user=user, espace=espace, date=d, heure_debut=h, duree_heures=duree)
+                 for d, h, duree in creneaux),
+                batch_size=2000,
+            )
+
+            t0 = time.perf_counter()
+            for d, h, duree in requetes:
+                est_disponible(espace, d, h, duree)
+            ecoule = time.perf_counter() - t0
+            self.stdout.write(
+                f"{len(requetes)} vérifications en base : {ecoule / len(requetes) * 1000:.3f} ms/vérif"
+            )
+            transaction.set_rollback(True)
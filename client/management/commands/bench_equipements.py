@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from client.equipements import decouper, filtrer_equipements, synchroniser_equipements
+from client.models import Espace
+
+EQUIPEMENTS = [
+    "Wi-Fi", "Projecteur", "Écran", "Tableau blanc", "Café", "Visioconférence", "Climatisation",
+    "Sonorisation", "Paperboard", "Cuisine", "Parking", "Accès PMR",
+]
+NOMS = decouper(", ".join(EQUIPEMENTS))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le filtre « a tel ET tel équipement » par étiquettes indexées au "
+        "filtre icontains sur le texte (espaces insérés puis annulés)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espaces', type=int, default=100_000)
+        parser.add_argument('--repetitions', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            espaces = Espace.objects.bulk_create(
+                (Espace(nom=f"Bench {i}", type_espace='reunion', capacite=10, ville="Bench", prix_par_heure=10,
+                        equipements=", ".join(random.sample(EQUIPEMENTS, random.randint(1, 5))))
+                 for i in range(options['espaces'])),
+                batch_size=2000,
+            )
+            synchroniser_equipements(espaces)
+            self.stdout.write(f"{len(espaces)} espaces étiquetés en {time.perf_counter() - t0:.1f} s")
+
+            for demande in (["projecteur"], ["projecteur", "tableau-blanc"], ["wi-fi", "ecran", "cafe"]):
+                t0 = time.perf_counter()
+                for _ in range(options['repetitions']):
+                    nb_index = filtrer_equipements(Espace.objects.all(), demande).count()
+                index = (time.perf_counter() - t0) / options['repetitions'] * 1000
+
+                texte = Q()
+                for slug in demande:
+                    texte &= Q(equipements__icontains=NOMS[slug])
+                t0 = time.perf_counter()
+                for _ in range(options['repetitions']):
+                    nb_texte = Espace.objects.filter(texte).count()
+                icontains = (time.perf_counter() - t0) / options['repetitions'] * 1000
+
+                self.stdout.write(
+                    f"{' ET '.join(demande)} : étiquettes {index:.1f} ms ({nb_index}), "
+                    f"icontains {icontains:.1f} ms ({nb_texte})"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client.geo import autour, cellule, expression_distance
+from client.models import Espace
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la recherche par rayon (grille indexée) face au calcul de "
+        "distance sur toute la table. Les points sont insérés puis annulés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=300_000)
+        parser.add_argument('--requetes', type=int, default=20)
+        parser.add_argument('--rayon', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        # Points tirés dans la France métropolitaine
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            Espace.objects.bulk_create(
+                (self.point(i) for i in range(options['points'])), batch_size=5000
+            )
+            self.stdout.write(f"{options['points']} points insérés en {time.perf_counter() - t0:.1f} s")
+
+            centres = [(random.uniform(43.0, 50.5), random.uniform(-1.0, 7.0)) for _ in range(options['requetes'])]
+            rayon = options['rayon']
+
+            t0 = time.perf_counter()
+            trouves = 0
+            for lat, lon in centres:
+                trouves += len(list(
+                    autour(Espace.objects.all(), lat, lon, rayon).order_by('distance').values_list('id', flat=True)
+                ))
+            grille = (time.perf_counter() - t0) / len(centres) * 1000
+
+            t0 = time.perf_counter()
+            trouves_scan = 0
+            for lat, lon in centres[:max(1, len(centres) // 4)]:
+                trouves_scan += len(list(
+                    Espace.objects.annotate(distance=expression_distance(lat, lon))
+                    .filter(distance__lte=rayon).order_by('distance').values_list('id', flat=True)
+                ))
+            balayage = (time.perf_counter() - t0) / max(1, len(centres) // 4) * 1000
+
+            self.stdout.write(
+                f"rayon {rayon} km : grille {grille:.2f} ms/requête ({trouves / len(centres):.0f} résultats en moyenne), "
+                f"balayage complet {balayage:.1f} ms/requête"
+            )
+            transaction.set_rollback(True)
+
+    def point(self, i):
+        latitude, longitude = random.uniform(42.5, 51.0), random.uniform(-4.5, 8.0)
+        return Espace(
+            nom=f"Point {i}", type_espace='reunion', capacite=10, ville="Bench", prix_par_heure=10,
+            latitude=latitude, longitude=longitude, cellule=cellule(latitude, longitude),
+        )
@@ -0,0 +1,67 @@
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client.models import Espace, Reservation
+from client.moderation import moderer, reservations_a_moderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la validation groupée de réservations en attente, comparée à "
+        "une sauvegarde par réservation. Les données sont insérées puis annulées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=10_000)
+        parser.add_argument('--echantillon', type=int, default=500,
+                            help="Réservations validées une par une pour comparaison.")
+        parser.add_argument('--taille-lot', type=int, default=1000)
+        parser.add_argument('--sans-notification', action='store_true')
+
+    def handle(self, *args, **options):
+        n = options['reservations']
+
+        with transaction.atomic():
+            user = User.objects.create(username=f"bench_{time.time_ns()}", email="bench@example.com")
+            espaces = [
+                Espace.objects.create(nom=f"Bench {i}", type_espace='reunion', capacite=10,
+                                      ville="Bench", prix_par_heure=10)
+                for i in range(10)
+            ]
+            premier_jour = date.today() + timedelta(days=1)
+            Reservation.objects.bulk_create(
+                (Reservation(user=user, espace=espaces[i % 10], date=premier_jour + timedelta(days=i // 140),
+                             heure_debut=dtime(8 + (i // 10) % 14, 0), duree_heures=1)
+                 for i in range(n + options['echantillon'])),
+                batch_size=2000,
+            )
+            ids = list(Reservation.objects.filter(user=user).order_by('id').values_list('id', flat=True))
+            echantillon = ids[n:]
+
+            t0 = time.perf_counter()
+            for reservation in Reservation.objects.filter(id__in=echantillon):
+                reservation.status = 'validee'
+                reservation.save()
+            unitaire = (time.perf_counter() - t0) / max(1, len(echantillon))
+
+            t0 = time.perf_counter()
+            compteurs = moderer(
+                reservations_a_moderer().filter(user=user), 'valider',
+                notifier=not options['sans_notification'],
+                taille_lot=options['taille_lot'],
+            )
+            groupe = time.perf_counter() - t0
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"une par une : {unitaire * 1000:.2f} ms/réservation "
+            f"(soit ~{unitaire * n:.1f} s pour {n})"
+        )
+        self.stdout.write(
+            f"groupée : {compteurs['modifiees']} validées, {compteurs['notifiees']} courriels mis en file "
+            f"en {groupe:.2f} s ({compteurs['modifiees'] / groupe:.0f} réservations/s)"
+        )
@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client.models import Espace
+from client.pagination import TAILLE_PAGE, TRIS, encoder_curseur, paginer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le coût d'une page du catalogue selon sa profondeur, par "
+        "curseur et par OFFSET. Les espaces sont insérés puis annulés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espaces', type=int, default=100_000)
+        parser.add_argument('--repetitions', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Espace.objects.bulk_create(
+                (Espace(
+                    nom=f"Espace {i}", type_espace='reunion', ville="Bench",
+                    capacite=random.randint(2, 80), prix_par_heure=random.randint(10, 150),
+                ) for i in range(options['espaces'])),
+                batch_size=5000,
+            )
+            espaces = Espace.objects.filter(disponible=True)
+            total = espaces.count()
+
+            for tri in ('prix_asc', 'prix_desc', 'capacite'):
+                ordre = TRIS[tri]
+                for profondeur in (0.01, 0.5, 0.99):
+                    rang = int(total * profondeur)
+                    # Curseur tel que l'aurait reçu un client arrivé à ce rang
+                    precedente = espaces.order_by(*ordre)[rang - 1]
+                    curseur = encoder_curseur(tri, [getattr(precedente, c.lstrip('-')) for c in ordre])
+
+                    t0 = time.perf_counter()
+                    for _ in range(options['repetitions']):
+                        page, _ = paginer(espaces, tri, curseur)
+                    keyset = (time.perf_counter() - t0) / options['repetitions'] * 1000
+
+                    t0 = time.perf_counter()
+                    for _ in range(options['repetitions']):
+                        attendue = list(espaces.order_by(*ordre)[rang:rang + TAILLE_PAGE])
+                    offset = (time.perf_counter() - t0) / options['repetitions'] * 1000
+
+                    assert [e.id for e in page] == [e.id for e in attendue]
+                    self.stdout.write(
+                        f"{tri:10} rang {rang:>7} : curseur {keyset:6.2f} ms, OFFSET {offset:6.2f} ms"
+                    )
+            transaction.set_rollback(True)
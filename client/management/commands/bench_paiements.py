@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from client.models import EcriturePaiement, EmailSortant, Espace, PaymentCard, Reservation, TentativePaiement
+
+PREFIXE = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge le paiement : --workers threads jouent le rôle des workers web et "
+        "envoient --paiements paiements, en mode bloquant puis avec l'appel à la "
+        "passerelle factice déporté. Les données créées sont supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paiements', type=int, default=60)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--latence', type=float, default=0.3)
+
+    def handle(self, *args, **options):
+        premier_email = (EmailSortant.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        # Nom unique : un utilisateur laissé par une exécution interrompue ne bloque pas la suivante
+        user = User.objects.create(username=f"bench_{time.time_ns()}", email="bench@exemple.fr")
+        espace = Espace.objects.create(nom="Bench paiements", type_espace='reunion', capacite=8, ville="Bench", prix_par_heure=20)
+        carte = PaymentCard.objects.create(user=user, name="Bench", last_four="4242", type='Visa', expiry="12/30")
+        reglages = {'latence': options['latence'], 'taux_echec': 0, 'prefixe': PREFIXE}
+        try:
+            for asynchrone in (False, True):
+                reservations = Reservation.objects.bulk_create(
+                    Reservation(
+                        user=user, espace=espace, date=date.today() + timedelta(days=400 + i),
+                        heure_debut='09:00', prix_total=20, status='en_attente',
+                    )
+                    for i in range(options['paiements'])
+                )
+                ids = [r.id for r in reservations]
+                with override_settings(PAIEMENT_ASYNCHRONE=asynchrone, PAIEMENT_PASSERELLE_OPTIONS=reglages):
+                    self.mesurer(asynchrone, ids, carte, options)
+                Reservation.objects.filter(id__in=ids).delete()
+        finally:
+            # Le journal refuse les suppressions par l'ORM : nettoyage en SQL
+            with connection.cursor() as curseur:
+                curseur.execute(
+                    f"DELETE FROM {EcriturePaiement._meta.db_table} WHERE reference LIKE %s", [PREFIXE + '%'],
+                )
+            user.delete()
+            espace.delete()
+            EmailSortant.objects.filter(id__gte=premier_email).delete()
+
+    def mesurer(self, asynchrone, ids, carte, options):
+        workers = options['workers']
+        # Connexions faites hors mesure, une par une
+        clients = []
+        for _ in range(workers):
+            clients.append(Client(HTTP_HOST='localhost'))
+            clients[-1].force_login(carte.user)
+            clients[-1].get(reverse('mes_reservations'))
+
+        def payer(client, reservation_ids):
+            try:
+                for reservation_id in reservation_ids:
+                    reponse = client.post(
+                        reverse('process_payment', args=[reservation_id]),
+                        {'payment_method': 'existing_card', 'card_id': carte.id},
+                    )
+                    assert reponse.status_code == 302, reponse.status_code
+            finally:
+                connection.close()
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(workers) as executeur:
+            list(executeur.map(payer, clients, [ids[i::workers] for i in range(workers)]))
+        requetes = time.perf_counter() - t0
+        # Fin de traitement : toutes les tentatives terminées
+        while TentativePaiement.objects.filter(reservation_id__in=ids, statut__in=TentativePaiement.STATUTS_ACTIFS).exists():
+            time.sleep(0.01)
+        total = time.perf_counter() - t0
+        confirmees = Reservation.objects.filter(id__in=ids, status='confirmee').count()
+        assert confirmees == len(ids), confirmees
+
+        mode = "déporté " if asynchrone else "bloquant"
+        self.stdout.write(
+            f"{mode} : {len(ids) / requetes:6.1f} requêtes/s ({requetes / len(ids) * workers * 1000:5.0f} ms par requête), "
+            f"{len(ids) / total:6.1f} paiements confirmés/s"
+        )
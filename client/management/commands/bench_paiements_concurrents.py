@@ -0,0 +1,110 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from client import paiements
+from client.models import EcriturePaiement, EmailSortant, Espace, Reservation, TentativePaiement
+
+PREFIXE = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie --envois paiements simultanés pour chacune de --reservations "
+        "réservations, avec la même clé d'idempotence ou une clé neuve, et vérifie "
+        "qu'il n'y a eu qu'une autorisation, une capture, un paiement capturé et un "
+        "email par réservation. Les données créées sont supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=50)
+        parser.add_argument('--envois', type=int, default=6, help="Envois par réservation.")
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--latence', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        premier_email = (EmailSortant.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        user = User.objects.create(username=f"bench_{time.time_ns()}", email="bench@exemple.fr")
+        espace = Espace.objects.create(
+            nom="Bench paiements concurrents", type_espace='reunion', capacite=8, ville="Bench", prix_par_heure=20
+        )
+        carte = paiements.Carte("Bench", 'Visa', "4242", "12/30")
+        reglages = {'latence': options['latence'], 'taux_echec': 0, 'prefixe': PREFIXE}
+        try:
+            reservations = Reservation.objects.bulk_create(
+                Reservation(
+                    user=user, espace=espace, date=date.today() + timedelta(days=400 + i),
+                    heure_debut='09:00', prix_total=20, status='en_attente',
+                )
+                for i in range(options['reservations'])
+            )
+            # Une clé sur deux est celle du premier envoi (double clic), les autres sont neuves (onglets)
+            envois = []
+            for reservation in reservations:
+                cle = paiements.nouvelle_cle()
+                envois += [
+                    (reservation, cle if i % 2 == 0 else paiements.nouvelle_cle())
+                    for i in range(options['envois'])
+                ]
+            random.shuffle(envois)
+
+            def payer(envoi):
+                reservation, cle = envoi
+                try:
+                    return paiements.lancer_paiement(reservation, carte, cle).id
+                finally:
+                    connection.close()
+
+            with override_settings(PAIEMENT_ASYNCHRONE=False, PAIEMENT_PASSERELLE_OPTIONS=reglages):
+                debut = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                    tentatives = list(pool.map(payer, envois))
+                ecoule = time.perf_counter() - debut
+                appels = Counter(paiements.passerelle().appels)
+
+            ids = [r.id for r in reservations]
+            erreurs = self.verifier(ids, appels, premier_email)
+        finally:
+            # Le journal refuse les suppressions par l'ORM : nettoyage en SQL
+            with connection.cursor() as curseur:
+                curseur.execute(
+                    f"DELETE FROM {EcriturePaiement._meta.db_table} WHERE reference LIKE %s", [PREFIXE + '%'],
+                )
+            espace.delete()
+            user.delete()
+            EmailSortant.objects.filter(id__gte=premier_email).delete()
+
+        self.stdout.write(
+            f"{len(envois)} envois / {options['threads']} threads en {ecoule:.2f} s "
+            f"({len(envois) / ecoule:.0f} envois/s) : {len(set(tentatives))} paiements, "
+            f"{appels['autoriser']} autorisations, {appels['capturer']} captures"
+        )
+        if erreurs:
+            raise CommandError("\n".join(erreurs))
+        self.stdout.write(self.style.SUCCESS("Un seul débit et un seul email par réservation"))
+
+    def verifier(self, ids, appels, premier_email):
+        attendu = len(ids)
+        erreurs = []
+        if appels['autoriser'] != attendu or appels['capturer'] != attendu:
+            erreurs.append(f"{appels['autoriser']} autorisations et {appels['capturer']} captures pour {attendu} réservations")
+        par_reservation = Counter(
+            TentativePaiement.objects.filter(reservation_id__in=ids, statut='capturee')
+            .values_list('reservation_id', flat=True)
+        )
+        if sorted(par_reservation.values()) != [1] * attendu:
+            erreurs.append(f"paiements capturés par réservation : {sorted(Counter(par_reservation.values()).items())}")
+        confirmees = Reservation.objects.filter(id__in=ids, status='confirmee', paid=True).count()
+        if confirmees != attendu:
+            erreurs.append(f"{confirmees} réservations confirmées sur {attendu}")
+        emails = EmailSortant.objects.filter(id__gte=premier_email).count()
+        if emails != attendu:
+            erreurs.append(f"{emails} emails de confirmation pour {attendu} réservations")
+        return erreurs
@@ -0,0 +1,71 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from client.boite_envoi import mettre_en_file
+from client.models import EmailSortant, Espace, Reservation
+from client.rappels import envoyer_rappels, reservations_a_rappeler
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la mise en file des rappels réservation par réservation (rendu "
+        "du gabarit, INSERT et save() à chaque fois) et par lots. Les données "
+        "sont insérées puis annulées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=100_000)
+        parser.add_argument('--jours', type=int, default=60)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user('bench_rappels', 'bench@exemple.fr')
+            espaces = Espace.objects.bulk_create(
+                Espace(nom=f"Bench {i}", type_espace='reunion', ville="Bench", capacite=10, prix_par_heure=20)
+                for i in range(200)
+            )
+            maintenant = timezone.localtime()
+            Reservation.objects.bulk_create(
+                (Reservation(
+                    user=user, espace=espaces[i % len(espaces)],
+                    date=maintenant.date() + timedelta(days=random.randrange(options['jours'])),
+                    heure_debut=maintenant.time().replace(hour=i // len(espaces) % 24, minute=0, second=0, microsecond=0),
+                    status=random.choice(('validee', 'en_attente', 'annulee')),
+                ) for i in range(options['reservations'])),
+                batch_size=5000, ignore_conflicts=True,
+            )
+            a_rappeler = reservations_a_rappeler()
+            with connection.cursor() as curseur:
+                sql, params = a_rappeler.values('id').query.sql_with_params()
+                curseur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                self.stdout.write("Plan : " + " / ".join(ligne[-1] for ligne in curseur.fetchall()))
+
+            sid = transaction.savepoint()
+            t0 = time.perf_counter()
+            for reservation in a_rappeler.select_related('user', 'espace'):
+                html_message = render_to_string(
+                    'client/emails/rappel_reservation.html', {'user': reservation.user, 'reservation': reservation}
+                )
+                mettre_en_file("Rappel", strip_tags(html_message), [reservation.user.email], html_message=html_message)
+                reservation.rappel_envoye_le = timezone.now()
+                reservation.save()
+            unitaire = time.perf_counter() - t0
+            n = EmailSortant.objects.count()
+            transaction.savepoint_rollback(sid)
+
+            t0 = time.perf_counter()
+            total = envoyer_rappels()
+            groupe = time.perf_counter() - t0
+            assert total == n, (total, n)
+            self.stdout.write(f"{n} rappels sur {options['reservations']} réservations")
+            self.stdout.write(f"Un par un : {unitaire:6.2f} s ({n / unitaire:6.0f} rappels/s)")
+            self.stdout.write(f"Par lots  : {groupe:6.2f} s ({n / groupe:6.0f} rappels/s)")
+            transaction.set_rollback(True)
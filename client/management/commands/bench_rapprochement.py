@@ -0,0 +1,117 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from client.journal_paiements import ecrire_releve, rapprocher, soldes_journal, soldes_releve
+from client.models import EcriturePaiement, Espace
+
+PREFIXE = 'BENCH-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Remplit le journal de --ecritures paiements, écrit un relevé qui en diffère "
+        "par quelques écarts connus, puis compare le rapprochement en flux à un "
+        "rapprochement qui charge le journal en mémoire. Les données créées sont "
+        "supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ecritures', type=int, default=1_000_000)
+        parser.add_argument('--taille-lot', type=int, default=10_000)
+        parser.add_argument('--periode-ecart', type=int, default=10_000, help="Un écart de chaque sorte tous les N paiements.")
+
+    def handle(self, *args, **options):
+        n, periode = options['ecritures'], options['periode_ecart']
+        user = User.objects.create(username=f"bench_{time.time_ns()}")
+        espace = Espace.objects.create(nom="Bench journal", type_espace='reunion', capacite=8, ville="Bench", prix_par_heure=20)
+        descripteur, chemin = tempfile.mkstemp(suffix='.csv')
+        try:
+            debut = time.perf_counter()
+            self.remplir(n, options['taille_lot'], espace, user)
+            self.stdout.write(f"{n} écritures insérées en {time.perf_counter() - debut:.1f} s")
+            with os.fdopen(descripteur, 'w', newline='', encoding='utf-8') as fichier:
+                ecrire_releve(fichier, self.mouvements(n, periode))
+
+            attendus = Counter(
+                absente_du_releve=len(range(0, n, periode)),
+                montant=len(range(1, n, periode)),
+                absente_du_journal=len(range(2, n, periode)),
+            )
+            for libelle, methode in (("en flux", self.en_flux), ("en mémoire", self.en_memoire)):
+                tracemalloc.start()
+                debut = time.perf_counter()
+                natures = methode(chemin)
+                ecoule = time.perf_counter() - debut
+                pic = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{libelle:10} : {ecoule:6.1f} s ({n / ecoule:7.0f} références/s), "
+                    f"pic mémoire {pic / 2 ** 20:7.1f} Mio, écarts {dict(natures)}"
+                )
+                if natures != attendus:
+                    raise CommandError(f"Écarts attendus : {dict(attendus)}")
+        finally:
+            os.remove(chemin)
+            # Le journal refuse les suppressions par l'ORM : nettoyage en SQL
+            with connection.cursor() as curseur:
+                curseur.execute(
+                    f"DELETE FROM {EcriturePaiement._meta.db_table} WHERE reference LIKE %s", [PREFIXE + '%'],
+                )
+            espace.delete()
+            user.delete()
+        self.stdout.write(self.style.SUCCESS("Tous les écarts ont été trouvés"))
+
+    def remplir(self, n, taille_lot, espace, user):
+        for depart in range(0, n, taille_lot):
+            with transaction.atomic():
+                EcriturePaiement.objects.bulk_create(
+                    EcriturePaiement(
+                        date=date.today(), nature='paiement', montant=Decimal(20 + i % 50),
+                        reference=f"{PREFIXE}{i:09d}", espace=espace, user=user,
+                    )
+                    for i in range(depart, min(n, depart + taille_lot))
+                )
+
+    def mouvements(self, n, periode):
+        # Tous les `periode` paiements : un absent du relevé, un montant faux, une référence inconnue du journal
+        jour = date.today()
+        for i in range(n):
+            reference = f"{PREFIXE}{i:09d}"
+            if i % periode == 0:
+                continue
+            montant = Decimal(20 + i % 50)
+            yield reference, jour, montant + 1 if i % periode == 1 else montant
+            if i % periode == 2:
+                yield f"{reference}-X", jour, montant
+
+    def ecritures(self):
+        return EcriturePaiement.objects.filter(reference__startswith=PREFIXE)
+
+    def en_flux(self, chemin):
+        with open(chemin, newline='', encoding='utf-8') as releve:
+            journal = soldes_journal(ecritures=self.ecritures())
+            return Counter(e.nature for e in rapprocher(journal, soldes_releve(releve)))
+
+    def en_memoire(self, chemin):
+        journal = Counter()
+        for reference, montant in self.ecritures().values_list('reference', 'montant'):
+            journal[reference] += montant
+        natures = Counter()
+        with open(chemin, newline='', encoding='utf-8') as releve:
+            for reference, montant in soldes_releve(releve):
+                attendu = journal.pop(reference, None)
+                if attendu is None:
+                    natures['absente_du_journal'] += 1
+                elif attendu != montant:
+                    natures['montant'] += 1
+        natures['absente_du_releve'] += len(journal)
+        return natures
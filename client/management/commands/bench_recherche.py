@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from client.models import Espace
+from client.recherche import MoteurFTS5, MoteurIcontains
+
+VILLES = ["Paris", "Lyon", "Marseille", "Lille", "Toulouse", "Nantes", "Besançon", "Orléans", "Nîmes", "Montréal"]
+ADJECTIFS = ["lumineuse", "calme", "spacieuse", "moderne", "chaleureuse", "équipée", "privée", "élégante"]
+EQUIPEMENTS = ["Wi-Fi", "Projecteur", "Écran", "Tableau blanc", "Café", "Visioconférence", "Climatisation", "Sonorisation"]
+TYPES = [code for code, _ in Espace.TYPE_CHOICES]
+REQUETES = ["salle lumineuse", "projecteur", "reunion lyon", "besancon", "ecran visio", "cha", "orleans calme", "studio sono"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la recherche FTS5 au filtre icontains sur des espaces synthétiques "
+        "(insérés puis annulés)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espaces', type=int, default=100_000)
+        parser.add_argument('--repetitions', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            Espace.objects.bulk_create(
+                (self.espace_synthetique(i) for i in range(options['espaces'])), batch_size=2000
+            )
+            fts = MoteurFTS5()
+            fts.reconstruire()
+            self.stdout.write(f"{options['espaces']} espaces créés et indexés en {time.perf_counter() - t0:.1f} s")
+
+            for requete in REQUETES:
+                resultats = {}
+                for nom, moteur_ in (("icontains", MoteurIcontains()), ("fts5", fts)):
+                    t0 = time.perf_counter()
+                    for _ in range(options['repetitions']):
+                        ids = list(
+                            moteur_.filtrer(Espace.objects.all(), requete)
+                            .order_by('pertinence').values_list('id', flat=True)[:20]
+                        )
+                        nombre = moteur_.filtrer(Espace.objects.all(), requete).count()
+                    resultats[nom] = ((time.perf_counter() - t0) / options['repetitions'] * 1000, nombre)
+                self.stdout.write(
+                    f"« {requete} » : icontains {resultats['icontains'][0]:.1f} ms ({resultats['icontains'][1]} résultats), "
+                    f"fts5 {resultats['fts5'][0]:.1f} ms ({resultats['fts5'][1]} résultats)"
+                )
+            transaction.set_rollback(True)
+
+    def espace_synthetique(self, i):
+        ville = random.choice(VILLES)
+        type_espace = random.choice(TYPES)
+        return Espace(
+            nom=f"Salle {random.choice(ADJECTIFS)} {i}",
+            description=f"Espace {random.choice(ADJECTIFS)} et {random.choice(ADJECTIFS)} au cœur de {ville}.",
+            type_espace=type_espace,
+            capacite=random.randint(2, 200),
+            ville=ville,
+            equipements=", ".join(random.sample(EQUIPEMENTS, 3)),
+            prix_par_heure=random.randint(10, 300),
+        )
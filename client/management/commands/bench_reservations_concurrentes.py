@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from client.disponibilite import IntervalIndex, bornes, reservations_actives
+from client.models import Espace
+from client.reservations import CreneauIndisponible, reserver
+
+
+class Command(BaseCommand):
+    help = (
+        "Lance des réservations concurrentes sur un même espace et vérifie "
+        "qu'aucune ne se chevauche. Les données créées sont supprimées à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requetes', type=int, default=2000)
+        parser.add_argument('--jours', type=int, default=5, help="Nombre de jours disputés.")
+        parser.add_argument('--p99-max', type=float, default=2000.0, help="Latence p99 maximale (ms).")
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f"bench_{time.time_ns()}")
+        espace = Espace.objects.create(
+            nom="Bench concurrence", type_espace='reunion', capacite=10, ville="Bench", prix_par_heure=10
+        )
+        premier_jour = date.today() + timedelta(days=365)
+        latences = []
+        compteurs = {'acceptees': 0, 'refusees': 0}
+        verrou = threading.Lock()
+
+        def tenter(_):
+            jour = premier_jour + timedelta(days=random.randrange(options['jours']))
+            heure = dtime(random.randint(6, 20), random.choice((0, 30)))
+            debut = time.perf_counter()
+            try:
+                reserver(user, espace, jour, heure, random.randint(1, 3))
+                resultat = 'acceptees'
+            except CreneauIndisponible:
+                resultat = 'refusees'
+            finally:
+                connection.close()
+            with verrou:
+                latences.append(time.perf_counter() - debut)
+                compteurs[resultat] += 1
+
+        try:
+            debut = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(tenter, range(options['requetes'])))
+            ecoule = time.perf_counter() - debut
+
+            chevauchements = self.compter_chevauchements(espace)
+        finally:
+            espace.delete()
+            user.delete()
+
+        latences.sort()
+        p50 = latences[len(latences) // 2] * 1000
+        p99 = latences[min(len(latences) - 1, int(len(latences) * 0.99))] * 1000
+        self.stdout.write(
+            f"{options['requetes']} requêtes / {options['threads']} threads en {ecoule:.2f} s "
+            f"({options['requetes'] / ecoule:.0f} req/s)"
+        )
+        self.stdout.write(f"acceptées : {compteurs['acceptees']}, refusées : {compteurs['refusees']}")
+        self.stdout.write(f"latence p50 : {p50:.1f} ms, p99 : {p99:.1f} ms")
+
+        if chevauchements:
+            raise CommandError(f"{chevauchements} réservations se chevauchent")
+        if p99 > options['p99_max']:
+            raise CommandError(f"p99 {p99:.1f} ms au-dessus de {options['p99_max']} ms")
+        self.stdout.write(self.style.SUCCESS("Aucun chevauchement"))
+
+    def compter_chevauchements(self, espace):
+        index = IntervalIndex()
+        chevauchements = 0
+        lignes = reservations_actives(espace).order_by('date', 'heure_debut').values_list(
+            'id', 'date', 'heure_debut', 'duree_heures'
+        )
+        for ident, d, h, duree in lignes:
+            debut, fin = bornes(d, h, duree)
+            if index.chevauche(debut, fin):
+                chevauchements += 1
+            index.ajouter(debut, fin, ident)
+        return chevauchements
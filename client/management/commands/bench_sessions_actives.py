@@ -0,0 +1,69 @@
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, RequestFactory, override_settings
+
+from client import sessions_actives
+from client.middleware import SessionTrackingMiddleware
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure, par requête authentifiée, les écritures en base et la latence "
+        "du suivi des sessions actives, sans puis avec écriture différée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=500)
+        parser.add_argument('--url', default='/mon-compte/payment-methods/')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='bench_sessions', defaults={'email': 'bench@exemple.fr'})
+        user.set_password('bench-sessions')
+        user.save()
+        try:
+            for differee in (False, True):
+                with override_settings(SESSIONS_ACTIVES_ECRITURE_DIFFEREE=differee):
+                    self.mesurer(user, differee, options)
+        finally:
+            sessions_actives.oublier(['bench-sessions'])
+            user.delete()
+
+    def mesurer(self, user, differee, options):
+        client = Client(HTTP_HOST='localhost', HTTP_USER_AGENT='Mozilla/5.0 (X11; Linux x86_64)')
+        client.force_login(user)
+        client.get(options['url'])
+        sessions_actives.vider()
+
+        ecritures = []
+
+        def compter(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) and 'active' in sql.lower():
+                ecritures.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(compter):
+            t0 = time.perf_counter()
+            for _ in range(options['requetes']):
+                client.get(options['url'])
+            sessions_actives.vider()
+            ecoule = time.perf_counter() - t0
+
+        # Le middleware seul, sans le rendu de la page
+        requete = RequestFactory().get('/', HTTP_USER_AGENT='Mozilla/5.0 (X11; Linux x86_64)')
+        requete.user, requete.session = user, SimpleNamespace(session_key='bench-sessions')
+        middleware = SessionTrackingMiddleware(lambda r: None)
+        t0 = time.perf_counter()
+        for _ in range(options['requetes']):
+            middleware.process_request(requete)
+        sessions_actives.vider()
+        seul = time.perf_counter() - t0
+
+        self.stdout.write(
+            f"{'différée' if differee else 'directe':8} : {len(ecritures) / options['requetes']:.3f} écriture(s) "
+            f"ActiveSession par requête, {ecoule / options['requetes'] * 1000:.2f} ms par requête, "
+            f"middleware seul {seul / options['requetes'] * 1000:.3f} ms"
+        )
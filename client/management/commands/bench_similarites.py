@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.similarites import voisins_numpy, voisins_python, np
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le calcul des espaces similaires sur des interactions générées "
+        "(popularité des espaces en loi de puissance), avec NumPy/SciPy et en "
+        "Python pur. Rien n'est écrit en base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--utilisateurs', type=int, default=100_000)
+        parser.add_argument('--espaces', type=int, default=5_000)
+        parser.add_argument('--interactions', type=int, default=1_000_000)
+        parser.add_argument('--sans-python', action='store_true', help="Ne mesure que NumPy/SciPy.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        poids = [1 / (rang + 1) ** 0.8 for rang in range(options['espaces'])]
+        espaces = rng.choices(range(1, options['espaces'] + 1), weights=poids, k=options['interactions'])
+        lignes = [
+            (rng.randrange(options['utilisateurs']), espace_id, 1.0 if rng.random() < 0.7 else 2.0)
+            for espace_id in espaces
+        ]
+        self.stdout.write(
+            f"{len(lignes)} interactions, {options['utilisateurs']} utilisateurs, {options['espaces']} espaces"
+        )
+        cibles = set(range(1, options['espaces'] + 1, 50))
+
+        moteurs = []
+        if np is not None:
+            moteurs.append(('numpy', voisins_numpy))
+        else:
+            self.stdout.write("NumPy/SciPy ne sont pas installés : mesure en Python seulement.")
+        if not options['sans_python']:
+            moteurs.append(('python', voisins_python))
+
+        for nom, calcul in moteurs:
+            t0 = time.perf_counter()
+            complet = calcul(lignes)
+            ecoule = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            calcul(lignes, cibles)
+            partiel = time.perf_counter() - t0
+            self.stdout.write(
+                f"{nom:6} : complet {ecoule:6.2f} s ({len(complet)} espaces), "
+                f"incrémental sur {len(cibles)} espaces {partiel:6.2f} s"
+            )
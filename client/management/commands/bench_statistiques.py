@@ -0,0 +1,104 @@
+import random
+import statistics
+import time
+from datetime import date, time as dtime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from client.models import Espace, Reservation
+from client.statistiques import STATUTS_EXCLUS, recalculer_statistiques, reconstruire_statistiques, statistiques_periode
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la lecture des statistiques d'une période dans la table de faits à "
+        "une agrégation sur les réservations, et mesure la reconstruction et la mise "
+        "à jour d'une journée. Les données sont insérées puis annulées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=200_000)
+        parser.add_argument('--espaces', type=int, default=50)
+        parser.add_argument('--jours', type=int, default=730, help="Étendue des dates réservées.")
+        parser.add_argument('--repetitions', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.mesurer(options)
+            transaction.set_rollback(True)
+
+    def mesurer(self, options):
+        user = User.objects.create(username=f"bench_{time.time_ns()}")
+        espaces = Espace.objects.bulk_create(
+            Espace(nom=f"Bench {i}", type_espace='reunion', capacite=10, ville="Bench", prix_par_heure=10)
+            for i in range(options['espaces'])
+        )
+        premier = date.today() - timedelta(days=options['jours'] // 2)
+        statuts = ['validee'] * 4 + ['confirmee'] * 4 + ['annulee', 'en_attente']
+        # Débuts distincts de 8 h à 18 h (un début par espace et par heure), fins avant minuit :
+        # les minutes de chaque réservation restent sur son jour
+        heures = 11
+        debuts = random.sample(range(len(espaces) * options['jours'] * heures), options['reservations'])
+        Reservation.objects.bulk_create(
+            (
+                Reservation(
+                    user=user, espace=espaces[n // (options['jours'] * heures)],
+                    date=premier + timedelta(days=n // heures % options['jours']), heure_debut=dtime(8 + n % heures),
+                    duree_heures=(duree := random.randint(1, 4)), prix_total=10 * duree, status=(statut := random.choice(statuts)),
+                    paid=statut == 'confirmee',
+                )
+                for n in debuts
+            ),
+            batch_size=5000,
+        )
+
+        debut = time.perf_counter()
+        journees = reconstruire_statistiques()
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(
+            f"reconstruction : {journees} journées en {ecoule:.2f} s "
+            f"({Reservation.objects.count() / ecoule:.0f} réservations/s)"
+        )
+
+        paires = [(random.choice(espaces).id, premier + timedelta(days=random.randrange(options['jours']))) for _ in range(500)]
+        debut = time.perf_counter()
+        for paire in paires:
+            recalculer_statistiques([paire])
+        self.stdout.write(f"mise à jour d'une journée : {(time.perf_counter() - debut) / len(paires) * 1000:.2f} ms")
+
+        fin = date.today()
+        for jours in (30, 365):
+            periode = (fin - timedelta(days=jours - 1), fin)
+            faits, t_faits = self.chronometrer(statistiques_periode, periode, options['repetitions'])
+            scan, t_scan = self.chronometrer(self.par_scan, periode, options['repetitions'])
+            self.stdout.write(
+                f"{jours:3} jours : table de faits {t_faits:7.2f} ms, agrégation des réservations {t_scan:7.2f} ms"
+            )
+            attendu = {cle: faits['totaux'][cle] for cle in scan}
+            if attendu != scan:
+                raise CommandError(f"Totaux différents : faits {attendu}, réservations {scan}")
+
+    def chronometrer(self, fonction, periode, repetitions):
+        durees = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            resultat = fonction(*periode)
+            durees.append(time.perf_counter() - debut)
+        return resultat, statistics.median(durees) * 1000
+
+    def par_scan(self, debut, fin):
+        """Ce que la page devrait calculer sans table de faits : totaux, séries par jour et par espace."""
+        reservations = Reservation.objects.filter(date__range=(debut, fin)).order_by()
+        actives = Q(status__in=STATUTS_EXCLUS)
+        agregats = {
+            'reservations': Count('id', filter=~actives),
+            'chiffre_affaires': Sum('prix_total', filter=~actives & Q(paid=True)),
+            'minutes': Sum(F('duree_heures') * 60, filter=~actives),
+            'annulations': Count('id', filter=Q(status='annulee')),
+        }
+        list(reservations.values('date').annotate(**agregats))
+        list(reservations.exclude(actives).values('espace_id', 'espace__nom').annotate(minutes=agregats['minutes']))
+        return {cle: valeur or 0 for cle, valeur in reservations.aggregate(**agregats).items()}
@@ -0,0 +1,64 @@
+import random
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from client import agents
+
+CORPUS = Path(agents.__file__).resolve().parent / 'data' / 'user_agents.txt'
+
+
+def ancien_libelle(user_agent):
+    """Classification par sous-chaînes utilisée auparavant par le middleware."""
+    if 'Mobile' in user_agent or 'Android' in user_agent or 'iPhone' in user_agent:
+        if 'Android' in user_agent:
+            return '📱 Mobile Android'
+        elif 'iPhone' in user_agent or 'iPad' in user_agent:
+            return '📱 iPhone/iPad'
+        return '📱 Mobile'
+    elif 'Windows' in user_agent:
+        return '💻 Windows'
+    elif 'Macintosh' in user_agent or 'Mac OS' in user_agent:
+        return '💻 Mac'
+    elif 'Linux' in user_agent:
+        return '💻 Linux'
+    return '🖥️ Navigateur'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le coût par requête de la classification des user-agents : "
+        "ancienne recherche de sous-chaînes, expressions régulières sans cache, "
+        "puis avec le cache LRU, sur un trafic tiré du corpus client/data/user_agents.txt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=200_000)
+
+    def handle(self, *args, **options):
+        corpus = [
+            ligne.strip() for ligne in CORPUS.read_text(encoding='utf-8').splitlines()
+            if ligne.strip() and not ligne.startswith('#')
+        ]
+        # Trafic réaliste : quelques navigateurs dominent, chaque visiteur répète sa chaîne
+        poids = [1 / (rang + 1) for rang in range(len(corpus))]
+        trafic = random.choices(corpus, weights=poids, k=options['requetes'])
+
+        agents._classer.cache_clear()
+        mesures = [
+            ('sous-chaînes', ancien_libelle),
+            ('regex sans cache', lambda ua: agents._classer.__wrapped__(ua).libelle),
+            ('regex + cache LRU', lambda ua: agents.classer(ua).libelle),
+        ]
+        for nom, fonction in mesures:
+            t0 = time.perf_counter()
+            for user_agent in trafic:
+                fonction(user_agent)
+            par_requete = (time.perf_counter() - t0) / len(trafic) * 1_000_000
+            self.stdout.write(f"{nom:18} : {par_requete:6.2f} µs par requête")
+
+        info = agents.statistiques_cache()
+        self.stdout.write(
+            f"Cache : {info.hits} succès, {info.misses} échecs, {info.currsize}/{info.maxsize} entrées"
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from client.cache_catalogue import invalider, remettre_a_zero, statistiques, version
+
+
+class Command(BaseCommand):
+    help = "Affiche les compteurs du cache du catalogue, ou l'invalide."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invalider', action='store_true', help="Passe à une nouvelle version du catalogue.")
+        parser.add_argument('--remise-a-zero', action='store_true', help="Remet les compteurs à zéro.")
+
+    def handle(self, *args, **options):
+        stats = statistiques()
+        self.stdout.write(
+            f"version {version()} : {stats['hit']} hit, {stats['miss']} miss "
+            f"(taux {stats['taux']:.1%}), {stats['reconstruction']} reconstruction(s), "
+            f"{stats['attente']} lecture(s) servie(s) après attente"
+        )
+        if options['invalider']:
+            invalider()
+            self.stdout.write(self.style.SUCCESS(f"Catalogue invalidé (version {version()})."))
+        if options['remise_a_zero']:
+            remettre_a_zero()
+            self.stdout.write(self.style.SUCCESS("Compteurs remis à zéro."))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.similarites import calculer_similarites, moteur_disponible
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule les espaces similaires à partir des favoris et des réservations. "
+        "À planifier (cron), par exemple en incrémental toutes les heures et en "
+        "complet chaque nuit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help="Ne recalcule que les espaces touchés depuis le dernier calcul.")
+        parser.add_argument('-k', type=int, default=None, help="Nombre de voisins conservés par espace.")
+        parser.add_argument('--moteur', choices=['numpy', 'python'], default=None)
+
+    def handle(self, *args, **options):
+        moteur = options['moteur'] or moteur_disponible()
+        if moteur == 'numpy' and moteur_disponible() != 'numpy':
+            self.stderr.write("NumPy/SciPy ne sont pas installés : repli sur le calcul en Python.")
+            moteur = 'python'
+        debut = time.perf_counter()
+        resume = calculer_similarites(incremental=options['incremental'], k=options['k'], moteur=moteur)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resume['voisins']} voisin(s) pour {resume['espaces']} espace(s) "
+            f"({resume['moteur']}) en {time.perf_counter() - debut:.2f} s"
+        ))
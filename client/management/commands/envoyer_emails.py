@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from client.boite_envoi import TAILLE_LOT, envoyer_en_attente
+
+
+class Command(BaseCommand):
+    help = (
+        "Expédie les emails de la boîte d'envoi, chaque worker réutilisant sa "
+        "connexion SMTP d'un lot à l'autre. Avec --intervalle, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+        parser.add_argument(
+            '--connexions', type=int, default=1,
+            help="Nombre de workers, chacun avec sa propre connexion SMTP.",
+        )
+        parser.add_argument(
+            '--intervalle', type=int, default=0,
+            help="Relance le traitement toutes les N secondes (0 : une seule passe).",
+        )
+
+    def handle(self, *args, **options):
+        connexions = [get_connection() for _ in range(max(1, options['connexions']))]
+        try:
+            while True:
+                self.passe(connexions, options['taille_lot'])
+                if not options['intervalle']:
+                    return
+                time.sleep(options['intervalle'])
+        finally:
+            for connexion in connexions:
+                connexion.close()
+
+    def passe(self, connexions, taille_lot):
+        debut = time.perf_counter()
+        if len(connexions) == 1:
+            resultats = [envoyer_en_attente(taille_lot, connexions[0])]
+        else:
+            with ThreadPoolExecutor(len(connexions)) as executeur:
+                resultats = list(executeur.map(lambda c: self.worker(c, taille_lot), connexions))
+        ecoule = time.perf_counter() - debut
+        envoyes = sum(r['envoyes'] for r in resultats)
+        echecs = sum(r['echecs'] for r in resultats)
+        self.stdout.write(self.style.SUCCESS(
+            f"{envoyes} email(s) envoyé(s), {echecs} échec(s) en {ecoule:.2f} s ({envoyes / ecoule:.0f} emails/s)"
+        ))
+
+    def worker(self, connexion_smtp, taille_lot):
+        try:
+            return envoyer_en_attente(taille_lot, connexion_smtp)
+        finally:
+            connection.close()
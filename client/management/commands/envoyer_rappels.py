@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.boite_envoi import envoyer_en_attente
+from client.rappels import HEURES_AVANT, TAILLE_LOT, envoyer_rappels, envoyer_recapitulatifs
+
+
+class Command(BaseCommand):
+    help = (
+        "Met en file les rappels des réservations des prochaines heures et, avec "
+        "--recapitulatif, le récapitulatif de la veille pour chaque administrateur. "
+        "Relancer la commande n'envoie rien deux fois. Avec --intervalle, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heures', type=int, default=HEURES_AVANT)
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+        parser.add_argument('--recapitulatif', action='store_true')
+        parser.add_argument(
+            '--envoyer', action='store_true',
+            help="Expédie aussitôt la boîte d'envoi sur une connexion SMTP, sans attendre envoyer_emails.",
+        )
+        parser.add_argument(
+            '--intervalle', type=int, default=0,
+            help="Relance le traitement toutes les N secondes (0 : une seule passe).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.passe(options)
+            if not options['intervalle']:
+                return
+            time.sleep(options['intervalle'])
+
+    def passe(self, options):
+        debut = time.perf_counter()
+        total = envoyer_rappels(options['heures'], options['taille_lot'])
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} rappel(s) mis en file en {ecoule:.2f} s ({total / ecoule:.0f} rappels/s)"
+        ))
+        if options['recapitulatif']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{envoyer_recapitulatifs()} récapitulatif(s) mis en file"
+            ))
+        if options['envoyer']:
+            compteurs = envoyer_en_attente()
+            self.stdout.write(self.style.SUCCESS(
+                f"{compteurs['envoyes']} email(s) envoyé(s), {compteurs['echecs']} échec(s)"
+            ))
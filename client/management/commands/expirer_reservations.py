@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.reservations import expirer_reservations_passees, liberer_blocages_expires
+
+
+class Command(BaseCommand):
+    help = (
+        "Libère les créneaux des réservations en attente dont le délai de paiement "
+        "est dépassé ou dont l'horaire est passé. Avec --intervalle, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=1000)
+        parser.add_argument(
+            '--intervalle', type=int, default=0,
+            help="Relance le traitement toutes les N secondes (0 : une seule passe).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.passe(options['taille_lot'])
+            if not options['intervalle']:
+                return
+            time.sleep(options['intervalle'])
+
+    def passe(self, taille_lot):
+        for libelle, traitement in (
+            ("blocage(s) expiré(s) libéré(s)", liberer_blocages_expires),
+            ("réservation(s) passée(s) expirée(s)", expirer_reservations_passees),
+        ):
+            debut = time.perf_counter()
+            total = traitement(taille_lot=taille_lot)
+            ecoule = time.perf_counter() - debut
+            self.stdout.write(self.style.SUCCESS(
+                f"{total} {libelle} en {ecoule:.2f} s ({total / ecoule:.0f} lignes/s)"
+            ))
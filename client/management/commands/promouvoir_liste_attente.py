@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from client.liste_attente import promouvoir_paires
+from client.models import ListeAttente
+
+
+class Command(BaseCommand):
+    help = (
+        "Promeut les demandes de liste d'attente dont le créneau est libre, "
+        "par exemple après une interruption du traitement en arrière-plan."
+    )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        paires = set(
+            ListeAttente.objects.filter(statut='en_attente', date__gte=timezone.localdate())
+            .values_list('espace_id', 'date')
+            .distinct()
+        )
+        total = promouvoir_paires(paires)
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} demande(s) promue(s) sur {len(paires)} journée(s) en {ecoule:.2f} s"
+        ))
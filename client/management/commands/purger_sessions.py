@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.sessions_actives import purger_sessions_expirees, purger_sessions_orphelines
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime par lots les sessions Django expirées puis les sessions actives "
+        "orphelines. Avec --intervalle, tourne en continu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help="Attente en secondes entre deux lots, pour laisser passer les écrivains.",
+        )
+        parser.add_argument(
+            '--intervalle', type=int, default=0,
+            help="Relance le traitement toutes les N secondes (0 : une seule passe).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.passe(options['taille_lot'], options['pause'])
+            if not options['intervalle']:
+                return
+            time.sleep(options['intervalle'])
+
+    def passe(self, taille_lot, pause):
+        # Les sessions expirées d'abord : leurs ActiveSession deviennent orphelines
+        for libelle, traitement in (
+            ("session(s) expirée(s) supprimée(s)", purger_sessions_expirees),
+            ("session(s) active(s) orpheline(s) supprimée(s)", purger_sessions_orphelines),
+        ):
+            debut = time.perf_counter()
+            total = traitement(taille_lot=taille_lot, pause=pause)
+            ecoule = time.perf_counter() - debut
+            self.stdout.write(self.style.SUCCESS(
+                f"{total} {libelle} en {ecoule:.2f} s ({total / ecoule:.0f} lignes/s)"
+            ))
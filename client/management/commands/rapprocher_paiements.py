@@ -0,0 +1,60 @@
+import csv
+import sys
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client.journal_paiements import (
+    TAILLE_PAQUET, JournalMalTrie, ReleveInvalide, rapprocher, soldes_journal, soldes_releve,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapproche le journal des paiements du relevé de règlement de la passerelle "
+        "(CSV reference;date;montant trié par référence) et liste les écarts, en un "
+        "seul passage et en mémoire bornée. Sort en erreur s'il y a des écarts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('releve', help="Chemin du relevé de règlement.")
+        parser.add_argument(
+            '--ecarts', default='-',
+            help="Fichier CSV où écrire les écarts (par défaut la sortie standard).",
+        )
+        parser.add_argument('--taille-paquet', type=int, default=TAILLE_PAQUET)
+
+    def handle(self, *args, **options):
+        compteurs = {}
+        natures = Counter()
+        debut = time.perf_counter()
+        with open(options['releve'], newline='', encoding='utf-8') as releve, \
+                self.ouvrir(options['ecarts']) as sortie:
+            ecrivain = csv.writer(sortie, delimiter=';', lineterminator='\n')
+            ecrivain.writerow(('reference', 'ecart', 'montant_journal', 'montant_releve'))
+            try:
+                for ecart in rapprocher(
+                    soldes_journal(options['taille_paquet']), soldes_releve(releve), compteurs,
+                ):
+                    ecrivain.writerow(ecart)
+                    natures[ecart.nature] += 1
+            except (JournalMalTrie, ReleveInvalide) as erreur:
+                raise CommandError(str(erreur))
+        ecoule = time.perf_counter() - debut
+
+        lues = compteurs['journal'] + compteurs['releve']
+        self.stderr.write(
+            f"{compteurs['journal']} référence(s) au journal et {compteurs['releve']} au relevé "
+            f"rapprochées en {ecoule:.2f} s ({lues / ecoule:.0f} références/s)"
+        )
+        if natures:
+            detail = ", ".join(f"{nombre} {nature}" for nature, nombre in sorted(natures.items()))
+            raise CommandError(f"{sum(natures.values())} écart(s) : {detail}")
+        self.stderr.write(self.style.SUCCESS("Journal et relevé concordent"))
+
+    def ouvrir(self, chemin):
+        if chemin == '-':
+            # Le flux standard reste ouvert après la commande
+            return open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+        return open(chemin, 'w', newline='', encoding='utf-8')
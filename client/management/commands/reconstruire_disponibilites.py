@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.creneaux import reconstruire_disponibilites
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les masques de créneaux par jour à partir des réservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espace', type=int, action='append', help="Limiter à un ou plusieurs espaces.")
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        total = reconstruire_disponibilites(options['espace'])
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(f"{total} journées recalculées en {ecoule:.2f} s"))
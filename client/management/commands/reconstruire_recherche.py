@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.models import Espace
+from client.recherche import moteur
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des espaces."
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        moteur().reconstruire()
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{Espace.objects.count()} espace(s) indexé(s) par {type(moteur()).__name__} en {ecoule:.2f} s"
+        ))
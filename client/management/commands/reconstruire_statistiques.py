@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client.statistiques import reconstruire_statistiques
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les faits quotidiens des statistiques à partir des réservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espace', type=int, action='append', help="Limiter à un ou plusieurs espaces.")
+        parser.add_argument('--taille-lot', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        total = reconstruire_statistiques(options['espace'], options['taille_lot'])
+        ecoule = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(f"{total} journées recalculées en {ecoule:.2f} s"))
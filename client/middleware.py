@@ -1,5 +1,6 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import ActiveSession
+from .agents import classer
+from .sessions_actives import enregistrer
 
 class SessionTrackingMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -12,31 +13,12 @@ class SessionTrackingMiddleware(MiddlewareMixin):
                 device_info = self.parse_user_agent(user_agent)
                 ip_address = self.get_client_ip(request)
                 
-                # Créer ou mettre à jour la session
-                ActiveSession.objects.update_or_create(
-                    session_key=session_key,
-                    defaults={
-                        'user': request.user,
-                        'device_info': device_info,
-                        'ip_address': ip_address,
-                    }
-                )
+                # Créer ou mettre à jour la session (écriture différée, voir client.sessions_actives)
+                enregistrer(session_key, request.user, device_info, ip_address, user_agent=user_agent)
     
     def parse_user_agent(self, user_agent):
-        """Parse le user agent pour extraire les infos du device"""
-        if 'Mobile' in user_agent or 'Android' in user_agent or 'iPhone' in user_agent:
-            if 'Android' in user_agent:
-                return '📱 Mobile Android'
-            elif 'iPhone' in user_agent or 'iPad' in user_agent:
-                return '📱 iPhone/iPad'
-            return '📱 Mobile'
-        elif 'Windows' in user_agent:
-            return '💻 Windows'
-        elif 'Macintosh' in user_agent or 'Mac OS' in user_agent:
-            return '💻 Mac'
-        elif 'Linux' in user_agent:
-            return '💻 Linux'
-        return '🖥️ Navigateur'
+        """Libellé du device (navigateur, système), lu dans le cache de client.agents"""
+        return classer(user_agent).libelle
     
     def get_client_ip(self, request):
         """Récupère l'IP du client"""
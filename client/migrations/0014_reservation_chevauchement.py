@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0013_remove_profile_profile_photo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='reservation',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['espace', 'date'], name='reservation_espace_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('duree_heures__gt', 24)), fields=['espace', 'date'], name='reservation_longue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['annulee', 'refusee']), _negated=True), fields=('espace', 'date', 'heure_debut'), name='reservation_creneau_actif_unique'),
+        ),
+    ]
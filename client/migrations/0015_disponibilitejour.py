@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0014_reservation_chevauchement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibiliteJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('creneaux', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilites', to='client.espace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'creneaux'], name='disponibilite_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('espace', 'date'), name='disponibilite_espace_date_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0015_disponibilitejour'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reservation',
+            name='reservation_creneau_actif_unique',
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='expire_le',
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Blocage du créneau jusqu'au"),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('validee', 'Validée'), ('refusee', 'Refusée'), ('annulee', 'Annulée'), ('expiree', 'Expirée')], default='en_attente', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'expire_le'], name='reservation_expiration_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['annulee', 'refusee', 'expiree']), _negated=True), fields=('espace', 'date', 'heure_debut'), name='reservation_creneau_actif_unique'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0016_reservation_blocage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequence', models.CharField(choices=[('quotidienne', 'Tous les jours'), ('hebdomadaire', 'Toutes les semaines'), ('mensuelle', 'Tous les mois')], default='hebdomadaire', max_length=20)),
+                ('intervalle', models.PositiveIntegerField(default=1)),
+                ('jours_semaine', models.CharField(blank=True, max_length=20)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField()),
+                ('heure_debut', models.TimeField()),
+                ('duree_heures', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_reservations', to='client.espace')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='client.seriereservation'),
+        ),
+    ]
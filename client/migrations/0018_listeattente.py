@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0017_seriereservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListeAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('heure_debut', models.TimeField()),
+                ('duree_heures', models.PositiveIntegerField(default=1)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('promue', 'Promue'), ('annulee', 'Annulée')], default='en_attente', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listes_attente', to='client.espace')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='client.reservation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listes_attente', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['espace', 'date', 'statut', 'created_at'], name='liste_attente_creneau_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0018_listeattente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'date', 'heure_debut'], name='reservation_statut_date_idx'),
+        ),
+    ]
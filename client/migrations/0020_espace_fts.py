@@ -0,0 +1,38 @@
+from django.db import migrations
+
+CREER = """
+CREATE VIRTUAL TABLE IF NOT EXISTS client_espace_fts USING fts5(
+    nom, ville, type_espace, equipements, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+REMPLIR = """
+INSERT INTO client_espace_fts (rowid, nom, ville, type_espace, equipements, description)
+SELECT id, nom, ville, type_espace, equipements, description FROM client_espace
+"""
+
+
+def creer_index(apps, schema_editor):
+    # Index plein texte propre à SQLite ; les autres bases utilisent le repli icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREER)
+    schema_editor.execute(REMPLIR)
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS client_espace_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0019_reservation_statut_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def importer_equipements(apps, schema_editor):
+    """Découpe le texte existant Espace.equipements en étiquettes."""
+    Espace = apps.get_model('client', 'Espace')
+    Equipement = apps.get_model('client', 'Equipement')
+    EspaceEquipement = apps.get_model('client', 'EspaceEquipement')
+
+    liens = {}
+    noms = {}
+    for espace_id, texte in Espace.objects.values_list('id', 'equipements').iterator():
+        for nom in (texte or '').split(','):
+            nom = nom.strip()
+            slug = slugify(nom)[:100]
+            if slug:
+                noms.setdefault(slug, nom[:100])
+                liens.setdefault(espace_id, set()).add(slug)
+
+    Equipement.objects.bulk_create([Equipement(slug=slug, nom=nom) for slug, nom in noms.items()])
+    ids = dict(Equipement.objects.values_list('slug', 'id'))
+    EspaceEquipement.objects.bulk_create(
+        [EspaceEquipement(espace_id=espace_id, equipement_id=ids[slug])
+         for espace_id, slugs in liens.items() for slug in slugs],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0020_espace_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Equipement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['nom'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EspaceEquipement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='client.equipement')),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='client.espace')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='espace',
+            name='equipements_tags',
+            field=models.ManyToManyField(blank=True, related_name='espaces', through='client.EspaceEquipement', to='client.equipement'),
+        ),
+        migrations.AddIndex(
+            model_name='espaceequipement',
+            index=models.Index(fields=['equipement', 'espace'], name='equipement_espace_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='espaceequipement',
+            constraint=models.UniqueConstraint(fields=('espace', 'equipement'), name='espace_equipement_unique'),
+        ),
+        migrations.RunPython(importer_equipements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0021_equipements'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='espace',
+            index=models.Index(fields=['disponible', 'ville', 'type_espace', 'prix_par_heure', 'capacite'], name='espace_facettes_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+from client.geo import cellule, geocoder
+
+
+def geocoder_espaces(apps, schema_editor):
+    Espace = apps.get_model('client', 'Espace')
+    espaces = []
+    for espace in Espace.objects.only('id', 'ville'):
+        coordonnees = geocoder(espace.ville)
+        if coordonnees:
+            espace.latitude, espace.longitude = coordonnees
+            espace.cellule = cellule(*coordonnees)
+            espaces.append(espace)
+    Espace.objects.bulk_update(espaces, ['latitude', 'longitude', 'cellule'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0022_espace_facettes_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='espace',
+            name='cellule',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='espace',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='espace',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='espace',
+            index=models.Index(fields=['cellule', 'latitude'], name='espace_cellule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='espace',
+            index=models.Index(fields=['latitude', 'longitude'], name='espace_coordonnees_idx'),
+        ),
+        migrations.RunPython(geocoder_espaces, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0023_espace_coordonnees'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='espace',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['prix_par_heure', 'id'], name='espace_prix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='espace',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['capacite', 'id'], name='espace_capacite_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0024_espace_pagination_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EspaceSimilaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rang', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('calcule_le', models.DateTimeField()),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similaires', to='client.espace')),
+                ('voisin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='client.espace')),
+            ],
+            options={
+                'ordering': ['espace', 'rang'],
+                'constraints': [models.UniqueConstraint(fields=('espace', 'rang'), name='espace_similaire_rang_unique')],
+            },
+        ),
+    ]
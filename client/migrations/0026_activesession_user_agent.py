@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0025_espace_similaire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activesession',
+            name='user_agent',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0028_rappels_recapitulatifs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TentativePaiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('moyen', models.CharField(max_length=100)),
+                ('statut', models.CharField(choices=[('en_cours', 'En cours'), ('reussi', 'Réussi'), ('echoue', 'Échoué'), ('a_rembourser', 'À rembourser')], default='en_cours', max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('termine_le', models.DateTimeField(blank=True, null=True)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tentatives_paiement', to='client.reservation')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
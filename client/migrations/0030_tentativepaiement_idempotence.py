@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:10
+
+import uuid
+
+from django.db import migrations, models
+
+STATUTS = {'en_cours': 'echouee', 'reussi': 'capturee', 'echoue': 'echouee', 'a_rembourser': 'echouee'}
+
+
+def cles_et_statuts(apps, schema_editor):
+    TentativePaiement = apps.get_model('client', 'TentativePaiement')
+    for tentative in TentativePaiement.objects.all():
+        tentative.cle_idempotence = uuid.uuid4().hex
+        tentative.statut = STATUTS.get(tentative.statut, tentative.statut)
+        tentative.save(update_fields=['cle_idempotence', 'statut'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0029_tentativepaiement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tentativepaiement',
+            name='cle_idempotence',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(cles_et_statuts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tentativepaiement',
+            name='cle_idempotence',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tentativepaiement',
+            name='statut',
+            field=models.CharField(choices=[('initiee', 'Initiée'), ('autorisee', 'Autorisée'), ('capturee', 'Capturée'), ('echouee', 'Échouée')], default='initiee', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='tentativepaiement',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut', 'echouee'), _negated=True), fields=('reservation',), name='paiement_unique_par_reservation'),
+        ),
+    ]
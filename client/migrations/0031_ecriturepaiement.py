@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:40
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reprendre_paiements(apps, schema_editor):
+    # Une écriture par réservation déjà payée, avec la référence de son paiement capturé s'il existe
+    Reservation = apps.get_model('client', 'Reservation')
+    TentativePaiement = apps.get_model('client', 'TentativePaiement')
+    EcriturePaiement = apps.get_model('client', 'EcriturePaiement')
+    references = dict(
+        TentativePaiement.objects.filter(statut='capturee').exclude(reference='')
+        .values_list('reservation_id', 'reference')
+    )
+    lot = []
+    for r in Reservation.objects.filter(paid=True).iterator(chunk_size=2000):
+        lot.append(EcriturePaiement(
+            date=(r.payment_date or r.created_at).date(), nature='paiement', montant=r.prix_total,
+            reference=references.get(r.id, ''), reservation_id=r.id, espace_id=r.espace_id, user_id=r.user_id,
+        ))
+        if len(lot) == 2000:
+            EcriturePaiement.objects.bulk_create(lot)
+            lot = []
+    EcriturePaiement.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0030_tentativepaiement_idempotence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EcriturePaiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=datetime.date.today)),
+                ('nature', models.CharField(choices=[('paiement', 'Paiement'), ('remboursement', 'Remboursement')], max_length=20)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('espace', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='client.espace')),
+                ('reservation', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='client.reservation')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'espace', 'user'], name='ecriture_date_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('reference', ''), _negated=True), fields=('reference', 'nature'), name='ecriture_unique_par_reference')],
+            },
+        ),
+        migrations.RunPython(reprendre_paiements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0031_ecriturepaiement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reservations', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('minutes', models.PositiveIntegerField(default=0)),
+                ('annulations', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('espace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='client.espace')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'espace'), name='statistique_date_espace_unique')],
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from datetime import date, time
+from django.utils import timezone
 
 
 class Espace(models.Model):
@@ -24,15 +25,66 @@ class Espace(models.Model):
     ville = models.CharField(max_length=100)
     adresse = models.CharField(max_length=200, blank=True)
     equipements = models.TextField(blank=True)
+    # Version normalisée de `equipements`, synchronisée à l'enregistrement
+    equipements_tags = models.ManyToManyField(
+        'Equipement', through='EspaceEquipement', blank=True, related_name='espaces'
+    )
     prix_par_heure = models.DecimalField(max_digits=6, decimal_places=2)
     image = models.ImageField(upload_to='espaces/', blank=True, null=True)
     disponible = models.BooleanField(default=True)
     date_creation = models.DateTimeField(auto_now_add=True)
+    # Renseignés depuis la table de villes (client.geo) à l'enregistrement
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    cellule = models.IntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Index couvrant du calcul des facettes du catalogue
+            models.Index(
+                fields=['disponible', 'ville', 'type_espace', 'prix_par_heure', 'capacite'],
+                name='espace_facettes_idx',
+            ),
+            models.Index(fields=['cellule', 'latitude'], name='espace_cellule_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='espace_coordonnees_idx'),
+            # Tris paginés par curseur : (colonne triée, id) comme le keyset,
+            # partiels car SQLite ne sert pas « WHERE disponible » par un préfixe
+            models.Index(fields=['prix_par_heure', 'id'], name='espace_prix_idx', condition=models.Q(disponible=True)),
+            models.Index(fields=['capacite', 'id'], name='espace_capacite_idx', condition=models.Q(disponible=True)),
+        ]
 
     def __str__(self):
         return f"{self.nom} ({self.ville})"
 
 
+class Equipement(models.Model):
+    nom = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['nom']
+
+    def __str__(self):
+        return self.nom
+
+
+class EspaceEquipement(models.Model):
+    espace = models.ForeignKey(Espace, on_delete=models.CASCADE)
+    equipement = models.ForeignKey(Equipement, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['espace', 'equipement'], name='espace_equipement_unique'),
+        ]
+        indexes = [
+            # Filtrage « a tel ET tel équipement » : parcours par équipement
+            models.Index(fields=['equipement', 'espace'], name='equipement_espace_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.espace.nom} : {self.equipement.nom}"
+
+
 class EspaceImage(models.Model):
     espace = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to='espaces/')
@@ -41,6 +93,25 @@ class EspaceImage(models.Model):
         return f"Image de {self.espace.nom}"
 
 
+class EspaceSimilaire(models.Model):
+    """Plus proches voisins d'un espace, calculés par client.similarites."""
+    espace = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name='similaires')
+    voisin = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name='+')
+    rang = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    calcule_le = models.DateTimeField()
+
+    class Meta:
+        ordering = ['espace', 'rang']
+        constraints = [
+            # Sert aussi d'index à la lecture des voisins d'un espace
+            models.UniqueConstraint(fields=['espace', 'rang'], name='espace_similaire_rang_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.espace.nom} ~ {self.voisin.nom} ({self.score:.2f})"
+
+
 class PaymentCard(models.Model):
     CARD_TYPES = [
         ('Visa', 'Visa'),
@@ -103,6 +174,8 @@ class ActiveSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='active_sessions')
     session_key = models.CharField(max_length=40, unique=True)
     device_info = models.CharField(max_length=255, blank=True)
+    # Chaîne brute, détaillée à l'affichage par client.agents
+    user_agent = models.CharField(max_length=512, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     last_activity = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -114,13 +187,40 @@ class ActiveSession(models.Model):
         return f"{self.user.username} - {self.device_info}"
 
 
+class SerieReservation(models.Model):
+    """Réservation récurrente : chaque occurrence est une Reservation liée."""
+    FREQUENCE_CHOICES = [
+        ('quotidienne', 'Tous les jours'),
+        ('hebdomadaire', 'Toutes les semaines'),
+        ('mensuelle', 'Tous les mois'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='series_reservations')
+    espace = models.ForeignKey('Espace', on_delete=models.CASCADE, related_name='series_reservations')
+    frequence = models.CharField(max_length=20, choices=FREQUENCE_CHOICES, default='hebdomadaire')
+    intervalle = models.PositiveIntegerField(default=1)
+    # Jours de la semaine (0 = lundi) séparés par des virgules, pour le mode hebdomadaire
+    jours_semaine = models.CharField(max_length=20, blank=True)
+    date_debut = models.DateField()
+    date_fin = models.DateField()
+    heure_debut = models.TimeField()
+    duree_heures = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.espace.nom} ({self.get_frequence_display()} du {self.date_debut} au {self.date_fin})"
+
+
 class Reservation(models.Model):
     STATUS_CHOICES = [
         ('en_attente', 'En attente'),
         ('validee', 'Validée'),
         ('refusee', 'Refusée'),
         ('annulee', 'Annulée'),
+        ('expiree', 'Expirée'),
     ]
+    # Statuts qui ne bloquent plus le créneau
+    STATUTS_LIBERES = ('annulee', 'refusee', 'expiree')
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="reservations")
     espace = models.ForeignKey("Espace", on_delete=models.CASCADE, related_name="reservations")
@@ -135,10 +235,32 @@ class Reservation(models.Model):
     payment_method = models.CharField(max_length=100, blank=True, verbose_name="Méthode de paiement")
     payment_date = models.DateTimeField(null=True, blank=True, verbose_name="Date de paiement")
     notes_admin = models.TextField(blank=True, null=True)
+    expire_le = models.DateTimeField(null=True, blank=True, verbose_name="Blocage du créneau jusqu'au")
+    serie = models.ForeignKey(SerieReservation, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations')
+    # Renseigné par client.rappels quand le rappel est mis en file
+    rappel_envoye_le = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ("espace", "date", "heure_debut")
         ordering = ['-date', 'heure_debut']
+        indexes = [
+            models.Index(fields=['espace', 'date'], name='reservation_espace_date_idx'),
+            models.Index(
+                fields=['espace', 'date'],
+                condition=models.Q(duree_heures__gt=24),
+                name='reservation_longue_idx',
+            ),
+            models.Index(fields=['status', 'expire_le'], name='reservation_expiration_idx'),
+            models.Index(fields=['status', 'date', 'heure_debut'], name='reservation_statut_date_idx'),
+        ]
+        constraints = [
+            # Filet de sécurité en base : le chevauchement réel est vérifié
+            # par client.disponibilite, un créneau libéré peut être repris.
+            models.UniqueConstraint(
+                fields=['espace', 'date', 'heure_debut'],
+                condition=~models.Q(status__in=['annulee', 'refusee', 'expiree']),
+                name='reservation_creneau_actif_unique',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.espace.nom} le {self.date} à {self.heure_debut}"
@@ -150,6 +272,11 @@ class Reservation(models.Model):
         fin = debut + timedelta(hours=self.duree_heures)
         return fin.time()
     
+    @property
+    def blocage_expire(self):
+        """Réservation en attente de paiement dont le délai est dépassé."""
+        return self.status == 'en_attente' and self.expire_le is not None and self.expire_le <= timezone.now()
+
     @property
     def date_fin(self):
         from datetime import datetime, timedelta
@@ -168,4 +295,228 @@ class Favori(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.espace.nom}"
\ No newline at end of file
+        return f"{self.user.username} - {self.espace.nom}"
+
+
+class DisponibiliteJour(models.Model):
+    """
+    Occupation d'un espace sur une journée, sous forme de masque de bits :
+    le bit i correspond au créneau de 30 minutes commençant à i * 30 min.
+    Maintenu par les signaux de Reservation (voir client.creneaux).
+    """
+    espace = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name='disponibilites')
+    date = models.DateField()
+    creneaux = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['espace', 'date'], name='disponibilite_espace_date_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'creneaux'], name='disponibilite_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.espace.nom} le {self.date} : {self.creneaux:048b}"
+
+
+class StatistiqueJour(models.Model):
+    """
+    Faits d'un espace sur une journée, pour les statistiques de l'administration.
+    Maintenu par les signaux de Reservation (voir client.statistiques).
+    """
+    espace = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name='statistiques')
+    date = models.DateField()
+    # Réservations non annulées, refusées ou expirées qui commencent ce jour-là
+    reservations = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Minutes occupées ce jour-là, une réservation qui passe minuit comptant sur les deux jours
+    minutes = models.PositiveIntegerField(default=0)
+    annulations = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'espace'], name='statistique_date_espace_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.espace.nom} le {self.date} : {self.reservations} réservation(s)"
+
+
+class ListeAttente(models.Model):
+    """Demande d'un client pour un créneau déjà pris, promue si le créneau se libère."""
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('promue', 'Promue'),
+        ('annulee', 'Annulée'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listes_attente')
+    espace = models.ForeignKey(Espace, on_delete=models.CASCADE, related_name='listes_attente')
+    date = models.DateField()
+    heure_debut = models.TimeField()
+    duree_heures = models.PositiveIntegerField(default=1)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    reservation = models.ForeignKey(Reservation, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['espace', 'date', 'statut', 'created_at'], name='liste_attente_creneau_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} attend {self.espace.nom} le {self.date} à {self.heure_debut}"
+
+
+class EmailSortant(models.Model):
+    """Message en file d'envoi, expédié par la commande envoyer_emails (voir client.boite_envoi)."""
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Échec'),
+    ]
+
+    sujet = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True)
+    expediteur = models.CharField(max_length=254)
+    # Adresses séparées par des virgules
+    destinataires = models.TextField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    tentatives = models.PositiveIntegerField(default=0)
+    prochain_essai = models.DateTimeField(default=timezone.now)
+    # Jeton du lot qui a réservé le message, jusqu'à prochain_essai
+    reserve_par = models.CharField(max_length=32, blank=True)
+    derniere_erreur = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    envoye_le = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['prochain_essai', 'id'], name='email_a_envoyer_idx',
+                condition=models.Q(statut='en_attente'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sujet} → {self.destinataires} ({self.statut})"
+
+
+class RecapitulatifQuotidien(models.Model):
+    """Trace des récapitulatifs envoyés aux administrateurs (un par jour et par destinataire)."""
+    destinataire = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recapitulatifs')
+    jour = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['destinataire', 'jour'], name='recapitulatif_unique'),
+        ]
+
+    def __str__(self):
+        return f"Récapitulatif du {self.jour} pour {self.destinataire.username}"
+
+
+class TentativePaiement(models.Model):
+    """
+    Paiement d'une réservation (voir client.paiements), identifié par la clé
+    d'idempotence envoyée avec le formulaire. initiee → autorisee → capturee,
+    ou echouee depuis initiee ou autorisee.
+    """
+    STATUT_CHOICES = [
+        ('initiee', 'Initiée'),
+        ('autorisee', 'Autorisée'),
+        ('capturee', 'Capturée'),
+        ('echouee', 'Échouée'),
+    ]
+    STATUTS_ACTIFS = ('initiee', 'autorisee')
+
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='tentatives_paiement')
+    cle_idempotence = models.CharField(max_length=64, unique=True)
+    montant = models.DecimalField(max_digits=8, decimal_places=2)
+    moyen = models.CharField(max_length=100)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='initiee')
+    # Référence de l'autorisation chez la passerelle
+    reference = models.CharField(max_length=100, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    termine_le = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Au plus un paiement en cours ou capturé par réservation : les envois concurrents
+            # se replient sur lui
+            models.UniqueConstraint(
+                fields=['reservation'], condition=~models.Q(statut='echouee'),
+                name='paiement_unique_par_reservation',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Paiement de la réservation #{self.reservation_id} ({self.statut})"
+
+
+class EcritureQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise ValueError("Le journal des paiements n'accepte que des ajouts.")
+
+    def delete(self):
+        raise ValueError("Le journal des paiements n'accepte que des ajouts.")
+
+
+class EcriturePaiement(models.Model):
+    """
+    Mouvement d'argent du journal des paiements (voir client.journal_paiements).
+    Les écritures ne sont jamais modifiées ni supprimées : une correction est
+    une nouvelle écriture. Réservation, espace et client sont conservés par
+    identifiant, sans clé étrangère en base, pour survivre à leur suppression.
+    """
+    NATURE_CHOICES = [
+        ('paiement', 'Paiement'),
+        ('remboursement', 'Remboursement'),
+    ]
+
+    date = models.DateField(default=date.today)
+    nature = models.CharField(max_length=20, choices=NATURE_CHOICES)
+    # Négatif pour un remboursement
+    montant = models.DecimalField(max_digits=10, decimal_places=2)
+    # Référence chez la passerelle, vide pour les paiements antérieurs au journal
+    reference = models.CharField(max_length=100, blank=True)
+    reservation = models.ForeignKey(
+        Reservation, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+',
+    )
+    espace = models.ForeignKey(Espace, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = EcritureQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'espace', 'user'], name='ecriture_date_idx'),
+        ]
+        constraints = [
+            # Un paiement ou un remboursement n'est inscrit qu'une fois par référence ; sert aussi
+            # au parcours par référence du rapprochement
+            models.UniqueConstraint(
+                fields=['reference', 'nature'], condition=~models.Q(reference=''),
+                name='ecriture_unique_par_reference',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Le journal des paiements n'accepte que des ajouts.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Le journal des paiements n'accepte que des ajouts.")
+
+    def __str__(self):
+        return f"{self.get_nature_display()} de {self.montant} € le {self.date} ({self.reference or 'sans référence'})"
@@ -0,0 +1,75 @@
+"""
+Modération groupée des réservations en attente.
+
+Les réservations sont validées ou refusées par lots d'UPDATE (changer_statut)
+et les avis aux clients mis en file lot par lot par INSERT groupés (voir
+client.boite_envoi), au lieu d'une sauvegarde et d'un envoi par réservation :
+la requête de modération ne contacte pas le serveur SMTP.
+"""
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .boite_envoi import email_sortant, mettre_en_file_groupe
+from .models import Reservation
+from .reservations import avec_reprise, changer_statut
+
+DECISIONS = {
+    'valider': 'validee',
+    'refuser': 'refusee',
+}
+
+
+def reservations_a_moderer(espace=None, date_debut=None, date_fin=None):
+    """Réservations en attente de décision (blocages échus exclus), filtrées."""
+    reservations = Reservation.objects.filter(status='en_attente').exclude(expire_le__lte=timezone.now())
+    if espace:
+        reservations = reservations.filter(espace=espace)
+    if date_debut:
+        reservations = reservations.filter(date__gte=date_debut)
+    if date_fin:
+        reservations = reservations.filter(date__lte=date_fin)
+    return reservations
+
+
+def moderer(reservations, decision, notifier=True, taille_lot=1000):
+    """
+    Applique une décision ('valider' ou 'refuser') aux réservations en attente
+    du queryset. Retourne {'modifiees': n, 'notifiees': n}, notifiees étant le
+    nombre d'avis mis en file.
+    """
+    statut = DECISIONS[decision]
+    compteurs = {'modifiees': 0, 'notifiees': 0}
+    template = get_template('client/emails/reservation_moderee.html')
+
+    def notifier_lot(ids):
+        # Seules les lignes passées au nouveau statut sont notifiées
+        modifiees = (
+            Reservation.objects.filter(id__in=ids, status=statut)
+            .select_related('user', 'espace')
+        )
+        messages = [message_decision(template, r) for r in modifiees]
+        compteurs['notifiees'] += avec_reprise(mettre_en_file_groupe, messages)
+
+    compteurs['modifiees'] = changer_statut(
+        reservations.filter(status='en_attente'), statut, taille_lot=taille_lot,
+        apres_lot=notifier_lot if notifier else None, expire_le=None,
+    )
+    return compteurs
+
+
+def message_decision(template, reservation):
+    validee = reservation.status == 'validee'
+    sujet = (
+        f"✓ Réservation validée - {reservation.espace.nom}" if validee
+        else f"Réservation refusée - {reservation.espace.nom}"
+    )
+    texte = (
+        f"Bonjour {reservation.user.get_full_name() or reservation.user.username},\n\n"
+        f"Votre réservation #{reservation.id} ({reservation.espace.nom}, le "
+        f"{reservation.date:%d/%m/%Y} à {reservation.heure_debut:%H:%M}) a été "
+        f"{'validée' if validee else 'refusée'}.\n\nL'équipe PointPro\n"
+    )
+    return email_sortant(
+        sujet, texte, [reservation.user.email],
+        html_message=template.render({'user': reservation.user, 'reservation': reservation, 'validee': validee}),
+    )
@@ -0,0 +1,105 @@
+"""
+Pagination par curseur du catalogue.
+
+Chaque tri se termine par l'id, ce qui en fait un ordre total : la page
+suivante est lue par « après la dernière ligne vue » (keyset) plutôt que par
+OFFSET, si bien qu'une page coûte la même chose quelle que soit sa
+profondeur et qu'un espace ajouté ou retiré entre deux pages ne décale ni ne
+duplique les résultats. Le curseur transmis au client encode le tri et les
+valeurs de la dernière ligne.
+"""
+import base64
+import binascii
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+TAILLE_PAGE = 12
+TAILLE_PAGE_MAX = 48
+
+TRIS = {
+    'defaut': ('id',),
+    'prix_asc': ('prix_par_heure', 'id'),
+    'prix_desc': ('-prix_par_heure', '-id'),
+    # -id plutôt que id : l'index (disponible, capacite) parcouru à l'envers suffit
+    'capacite': ('-capacite', '-id'),
+    'distance': ('distance', 'id'),
+    'pertinence': ('pertinence', 'id'),
+}
+
+
+class CurseurInvalide(ValueError):
+    pass
+
+
+def choisir_tri(tri, filtres):
+    """Tri demandé s'il est applicable, sinon pertinence, distance ou défaut."""
+    if tri in ('prix_asc', 'prix_desc', 'capacite'):
+        return tri
+    if tri == 'distance' and 'lat' in filtres:
+        return 'distance'
+    if 'q' in filtres:
+        return 'pertinence'
+    if 'lat' in filtres:
+        return 'distance'
+    return 'defaut'
+
+
+def encoder_curseur(tri, valeurs):
+    brut = json.dumps([tri, *valeurs], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def decoder_curseur(tri, curseur):
+    """Valeurs de la dernière ligne vue ; le curseur doit venir du même tri."""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        donnees = json.loads(brut)
+    except (binascii.Error, ValueError):
+        raise CurseurInvalide("Curseur illisible.")
+    if not isinstance(donnees, list) or len(donnees) != len(TRIS[tri]) + 1 or donnees[0] != tri:
+        raise CurseurInvalide("Curseur d'un autre tri.")
+    return donnees[1:]
+
+
+def condition_apres(champs, valeurs):
+    """
+    Lignes strictement après valeurs dans l'ordre champs :
+    a > x OR (a = x AND id > y), précédé de a >= x pour borner le parcours de
+    l'index sur la première colonne.
+    """
+    condition = Q()
+    egalites = {}
+    for champ, valeur in zip(champs, valeurs):
+        nom = champ.lstrip('-')
+        operateur = 'lt' if champ.startswith('-') else 'gt'
+        condition |= Q(**egalites, **{f'{nom}__{operateur}': valeur})
+        egalites[nom] = valeur
+    premier = champs[0].lstrip('-')
+    borne = 'lte' if champs[0].startswith('-') else 'gte'
+    return Q(**{f'{premier}__{borne}': valeurs[0]}) & condition
+
+
+def paginer(espaces, tri, curseur=None, taille=TAILLE_PAGE):
+    """
+    Retourne (page, curseur suivant ou None). Une ligne de plus que la page
+    est lue pour savoir s'il reste des résultats, sans COUNT.
+    """
+    champs = TRIS[tri]
+    if curseur:
+        espaces = espaces.filter(condition_apres(champs, decoder_curseur(tri, curseur)))
+    ordre = [F(c[1:]).desc() if c.startswith('-') else F(c).asc() for c in champs]
+    lignes = list(espaces.order_by(*ordre)[:taille + 1])
+    page = lignes[:taille]
+    if len(lignes) <= taille:
+        return page, None
+    derniere = page[-1]
+    return page, encoder_curseur(tri, [getattr(derniere, c.lstrip('-')) for c in champs])
+
+
+def taille_demandee(valeur, defaut=TAILLE_PAGE):
+    try:
+        return min(TAILLE_PAGE_MAX, max(1, int(valeur)))
+    except (TypeError, ValueError):
+        return defaut
@@ -0,0 +1,351 @@
+"""
+Paiement des réservations.
+
+La passerelle est la classe désignée par PAIEMENT_PASSERELLE, construite avec
+PAIEMENT_PASSERELLE_OPTIONS ; PasserelleFactice simule un prestataire avec une
+latence et un taux d'échec réglables. Ses appels sont bloquants.
+
+Chaque paiement est une TentativePaiement identifiée par la clé d'idempotence
+du formulaire : un formulaire renvoyé (double clic, rechargement, reprise
+réseau) retrouve la tentative existante au lieu d'en créer une. Une contrainte
+unique partielle n'admet qu'une tentative non échouée (en cours ou capturée)
+par réservation, si bien que des envois concurrents avec des clés différentes
+se replient eux aussi sur une seule tentative, donc un seul appel à la
+passerelle, et qu'une réservation n'est jamais débitée deux fois.
+
+La tentative suit initiee → autorisee → capturee (ou echouee). Chaque
+transition est un UPDATE conditionnel sur le statut attendu : seul le
+processus qui la réussit poursuit, ce qui tient lieu de verrou de ligne sous
+SQLite. À l'autorisation, le blocage de la réservation est figé (expire_le
+vidé) pour qu'il n'expire pas avant la capture ; la confirmation de la
+réservation et l'email partent dans la transaction de la capture, une seule
+fois, avec l'écriture du journal des paiements (voir client.journal_paiements).
+Une autorisation sur une réservation qui n'attend plus de paiement est annulée
+chez la passerelle, sans débit ; une réservation annulée entre l'autorisation
+et la capture est remboursée aussitôt la capture enregistrée.
+
+Avec PAIEMENT_ASYNCHRONE (par défaut), la vue n'enregistre que la tentative et
+rend la main : les appels à la passerelle sont exécutés après le commit dans
+un pool de PAIEMENT_WORKERS threads. Sans PAIEMENT_ASYNCHRONE, executer() est
+appelé dans la requête.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import journal_paiements
+from .boite_envoi import mettre_en_file
+from .models import PaymentCard, Reservation, TentativePaiement
+from .reservations import avec_reprise
+from .signals import jours_reservation, reservations_modifiees
+from .utils import contenu_confirmation_paiement
+
+logger = logging.getLogger(__name__)
+
+PASSERELLE_DEFAUT = 'client.paiements.PasserelleFactice'
+WORKERS = 8
+TRANSITIONS = {
+    'initiee': ('autorisee', 'echouee'),
+    'autorisee': ('capturee', 'echouee'),
+}
+
+
+class TransitionInvalide(ValueError):
+    pass
+
+
+class CleInvalide(ValueError):
+    """Clé d'idempotence déjà utilisée pour une autre réservation."""
+
+
+class Carte(NamedTuple):
+    """Ce que la passerelle reçoit de la carte (ni numéro complet ni CVV ne sont conservés)."""
+    titulaire: str
+    type: str
+    last_four: str
+    expiry: str
+
+
+class ResultatPaiement(NamedTuple):
+    succes: bool
+    reference: str = ''
+    message: str = ''
+
+
+class Passerelle:
+    """
+    Les autorisations portent la clé d'idempotence de la tentative : une
+    autorisation rejouée avec la même clé ne doit pas débiter une seconde fois.
+    """
+    def autoriser(self, montant, carte, cle):
+        """Réserve montant sur carte ; ResultatPaiement dont reference désigne l'autorisation."""
+        raise NotImplementedError
+
+    def capturer(self, reference):
+        """Débite une autorisation ; ResultatPaiement."""
+        raise NotImplementedError
+
+    def annuler(self, reference):
+        """Libère une autorisation non capturée."""
+        raise NotImplementedError
+
+    def rembourser(self, reference, montant):
+        """Rembourse un paiement capturé ; ResultatPaiement."""
+        raise NotImplementedError
+
+
+class PasserelleFactice(Passerelle):
+    def __init__(self, latence=0.3, taux_echec=0.05, prefixe='FACTICE-'):
+        self.latence = latence
+        self.taux_echec = taux_echec
+        self.prefixe = prefixe
+        self.appels = Counter()
+        self.autorisations = {}
+        self.montants = {}
+        # Relevé de règlement : (reference, date, montant signé)
+        self.mouvements = []
+        self._verrou = threading.Lock()
+
+    def autoriser(self, montant, carte, cle):
+        with self._verrou:
+            self.appels['autoriser'] += 1
+            if cle in self.autorisations:
+                return self.autorisations[cle]
+        time.sleep(self.latence)
+        if not carte.last_four or random.random() < self.taux_echec:
+            resultat = ResultatPaiement(False, message="Le paiement a été refusé.")
+        else:
+            resultat = ResultatPaiement(True, reference=f"{self.prefixe}{uuid.uuid4().hex[:12]}")
+        with self._verrou:
+            self.montants.setdefault(resultat.reference, montant)
+            return self.autorisations.setdefault(cle, resultat)
+
+    def capturer(self, reference):
+        with self._verrou:
+            self.appels['capturer'] += 1
+            self.mouvements.append((reference, timezone.localdate(), self.montants[reference]))
+        return ResultatPaiement(True, reference=reference)
+
+    def annuler(self, reference):
+        with self._verrou:
+            self.appels['annuler'] += 1
+
+    def rembourser(self, reference, montant):
+        with self._verrou:
+            self.appels['rembourser'] += 1
+            self.mouvements.append((reference, timezone.localdate(), -montant))
+        return ResultatPaiement(True, reference=reference)
+
+    def releve(self):
+        """Mouvements triés par référence, au format de client.journal_paiements.ecrire_releve."""
+        with self._verrou:
+            return sorted(self.mouvements, key=lambda m: m[0])
+
+
+@lru_cache(maxsize=None)
+def passerelle():
+    classe = import_string(getattr(settings, 'PAIEMENT_PASSERELLE', PASSERELLE_DEFAUT))
+    return classe(**getattr(settings, 'PAIEMENT_PASSERELLE_OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def _reglages_modifies(setting, **kwargs):
+    if setting.startswith('PAIEMENT_PASSERELLE'):
+        passerelle.cache_clear()
+
+
+_executeur = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PAIEMENT_WORKERS', WORKERS), thread_name_prefix='paiement',
+)
+
+
+def nouvelle_cle():
+    return uuid.uuid4().hex
+
+
+def transition(tentative, vers, **champs):
+    """
+    Passe la tentative de son statut courant à vers par un UPDATE conditionnel.
+    Retourne False si un autre processus l'a changée entre-temps.
+    """
+    if vers not in TRANSITIONS.get(tentative.statut, ()):
+        raise TransitionInvalide(f"{tentative.statut} → {vers}")
+    if vers not in TentativePaiement.STATUTS_ACTIFS:
+        champs['termine_le'] = timezone.now()
+    if not TentativePaiement.objects.filter(id=tentative.id, statut=tentative.statut).update(statut=vers, **champs):
+        return False
+    tentative.statut = vers
+    for nom, valeur in champs.items():
+        setattr(tentative, nom, valeur)
+    return True
+
+
+def tentative_pour(reservation, cle, moyen):
+    """Tentative de cette clé, ou tentative non échouée de la réservation, sinon une nouvelle. (tentative, creee)"""
+    for _ in range(3):
+        existante = (
+            TentativePaiement.objects.filter(cle_idempotence=cle).first()
+            or TentativePaiement.objects.filter(reservation=reservation).exclude(statut='echouee').first()
+        )
+        if existante:
+            if existante.reservation_id != reservation.id:
+                raise CleInvalide(cle)
+            return existante, False
+        try:
+            return avec_reprise(
+                TentativePaiement.objects.create,
+                reservation=reservation, cle_idempotence=cle, montant=reservation.prix_total, moyen=moyen,
+            ), True
+        except IntegrityError:
+            # Un envoi concurrent l'a créée : elle est relue au tour suivant
+            continue
+    raise IntegrityError(f"Tentative introuvable pour la réservation {reservation.id}")
+
+
+def lancer_paiement(reservation, carte, cle, enregistrer_carte=False):
+    """
+    Retourne la tentative de paiement correspondant à cle, en la créant et en
+    la lançant si besoin. En mode synchrone elle est terminée au retour.
+    """
+    tentative, creee = tentative_pour(reservation, cle, f"{carte.type} •••• {carte.last_four}")
+    if not creee:
+        return tentative
+    if getattr(settings, 'PAIEMENT_ASYNCHRONE', True):
+        transaction.on_commit(lambda: _executeur.submit(_payer_en_tache, tentative.id, carte, enregistrer_carte))
+    else:
+        executer(tentative.id, carte, enregistrer_carte)
+        tentative.refresh_from_db()
+    return tentative
+
+
+def _payer_en_tache(tentative_id, carte, enregistrer_carte):
+    close_old_connections()
+    try:
+        executer(tentative_id, carte, enregistrer_carte)
+    except Exception:
+        logger.exception("Échec du paiement %s", tentative_id)
+    finally:
+        close_old_connections()
+
+
+def executer(tentative_id, carte, enregistrer_carte=False):
+    """Autorise puis capture une tentative initiée. Retourne son statut final."""
+    tentative = TentativePaiement.objects.select_related('reservation').get(id=tentative_id)
+    if tentative.statut != 'initiee':
+        return tentative.statut
+    try:
+        autorisation = passerelle().autoriser(tentative.montant, carte, tentative.cle_idempotence)
+    except Exception:
+        logger.exception("Passerelle de paiement indisponible (tentative %s)", tentative_id)
+        autorisation = ResultatPaiement(False, message="Le service de paiement est indisponible.")
+    if not autorisation.succes:
+        avec_reprise(transition, tentative, 'echouee', message=(autorisation.message or "Le paiement a échoué.")[:255])
+        return tentative.statut
+
+    expire_le = tentative.reservation.expire_le
+    if not avec_reprise(_autoriser, tentative, autorisation.reference):
+        passerelle().annuler(autorisation.reference)
+        avec_reprise(
+            transition, tentative, 'echouee', reference=autorisation.reference,
+            message="La réservation n'attendait plus de paiement, l'autorisation a été annulée.",
+        )
+        return tentative.statut
+
+    capture = passerelle().capturer(autorisation.reference)
+    if not capture.succes:
+        passerelle().annuler(autorisation.reference)
+        avec_reprise(_echec_capture, tentative, expire_le, capture.message or "Le paiement a échoué.")
+        return tentative.statut
+    if avec_reprise(_capturer, tentative, carte if enregistrer_carte else None):
+        # Hors de la transaction de capture : l'appel à la passerelle n'est pas rejoué par avec_reprise
+        rembourser(tentative.reservation)
+    return tentative.statut
+
+
+def _autoriser(tentative, reference):
+    # Le blocage est figé : la réservation ne peut plus expirer avant la capture
+    if not Reservation.objects.filter(id=tentative.reservation_id, status='en_attente').update(expire_le=None):
+        return False
+    if not transition(tentative, 'autorisee', reference=reference):
+        transaction.set_rollback(True)
+        return False
+    return True
+
+
+def _echec_capture(tentative, expire_le, message):
+    Reservation.objects.filter(id=tentative.reservation_id, status='en_attente').update(expire_le=expire_le)
+    transition(tentative, 'echouee', message=message[:255])
+
+
+def _capturer(tentative, carte_a_enregistrer):
+    """Enregistre la capture ; retourne True si la réservation n'attendait plus le paiement (débit à rembourser)."""
+    if not transition(tentative, 'capturee'):
+        return False
+    journal_paiements.inscrire('paiement', tentative.reservation, tentative.montant, tentative.reference)
+    maintenant = timezone.now()
+    confirmee = Reservation.objects.filter(id=tentative.reservation_id, status='en_attente').update(
+        status='confirmee', paid=True, payment_method=tentative.moyen,
+        payment_date=maintenant, expire_le=None, updated_at=maintenant,
+    )
+    if not confirmee:
+        # Réservation annulée entre l'autorisation et la capture
+        TentativePaiement.objects.filter(id=tentative.id).update(
+            message="Débité alors que la réservation n'attendait plus de paiement : remboursé.",
+        )
+        return True
+    reservation = Reservation.objects.select_related('user__profile', 'espace').get(id=tentative.reservation_id)
+    # Le chiffre d'affaires du jour compte désormais la réservation (voir client.statistiques)
+    reservations_modifiees(jours_reservation(reservation))
+    if carte_a_enregistrer:
+        enregistrer(reservation.user, carte_a_enregistrer)
+    # Dans la transaction de la capture : l'email n'existe que si la confirmation est enregistrée
+    sujet, message, html_message = contenu_confirmation_paiement(reservation)
+    mettre_en_file(sujet, message, [reservation.user.email], html_message=html_message)
+    return False
+
+
+def rembourser(reservation):
+    """
+    Rembourse le paiement capturé de la réservation, une seule fois : l'écriture
+    du journal est inscrite avant l'appel à la passerelle et annulée avec la
+    transaction si celle-ci refuse. Retourne l'écriture, ou None.
+    """
+    tentative = reservation.tentatives_paiement.filter(statut='capturee').exclude(reference='').first()
+    if tentative is None:
+        return None
+    try:
+        with transaction.atomic():
+            ecriture = journal_paiements.inscrire('remboursement', reservation, -tentative.montant, tentative.reference)
+            resultat = passerelle().rembourser(tentative.reference, tentative.montant)
+            if not resultat.succes:
+                transaction.set_rollback(True)
+    except IntegrityError:
+        # Déjà remboursé
+        return None
+    if not resultat.succes:
+        logger.warning("Remboursement refusé pour la réservation %s : %s", reservation.id, resultat.message)
+        return None
+    return ecriture
+
+
+def enregistrer(user, carte):
+    nouvelle = PaymentCard.objects.create(
+        user=user, name=carte.titulaire, last_four=carte.last_four, expiry=carte.expiry, type=carte.type,
+    )
+    if not user.profile.default_card:
+        user.profile.default_card = nouvelle
+        user.profile.save()
+    return nouvelle
@@ -0,0 +1,140 @@
+"""
+Rappels avant réservation et récapitulatif quotidien des administrateurs.
+
+À chaque passage, les réservations qui commencent dans les HEURES_AVANT
+prochaines heures sont lues par l'index (status, date, heure_debut), par lots
+d'ids croissants. Pour chaque lot, dans une seule transaction, les
+réservations sont marquées (rappel_envoye_le) puis leurs rappels insérés dans
+la boîte d'envoi : un passage relancé ou concurrent ne rappelle jamais deux
+fois la même réservation. L'expédition se fait ensuite sur une connexion SMTP
+réutilisée (voir client.boite_envoi).
+
+Les gabarits sont compilés une fois par processus et rendus pour chaque
+message.
+"""
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .boite_envoi import email_sortant, mettre_en_file_groupe
+from .models import RecapitulatifQuotidien, Reservation
+from .reservations import avec_reprise
+
+HEURES_AVANT = 24
+STATUTS_RAPPEL = ('validee', 'confirmee')
+TAILLE_LOT = 500
+# Réservations en attente détaillées dans le récapitulatif
+EN_ATTENTE_AFFICHEES = 20
+
+
+@lru_cache(maxsize=None)
+def gabarit(nom):
+    return get_template(nom)
+
+
+def reservations_a_rappeler(heures=HEURES_AVANT, maintenant=None):
+    """Réservations confirmées, pas encore rappelées, qui commencent dans les prochaines heures."""
+    maintenant = timezone.localtime(maintenant or timezone.now())
+    fin = maintenant + timedelta(hours=heures)
+    # Les bornes de date limitent le parcours de l'index, les OR affinent aux extrémités
+    return Reservation.objects.filter(
+        status__in=STATUTS_RAPPEL, date__gte=maintenant.date(), date__lte=fin.date(),
+        rappel_envoye_le__isnull=True,
+    ).filter(
+        Q(date__gt=maintenant.date()) | Q(heure_debut__gt=maintenant.time()),
+        Q(date__lt=fin.date()) | Q(heure_debut__lte=fin.time()),
+    )
+
+
+def envoyer_rappels(heures=HEURES_AVANT, taille_lot=TAILLE_LOT, maintenant=None):
+    """Met en file un rappel par réservation à venir. Retourne le nombre de rappels."""
+    reservations = reservations_a_rappeler(heures, maintenant).order_by('id')
+    total = 0
+    dernier_id = 0
+    while True:
+        ids = list(reservations.filter(id__gt=dernier_id).values_list('id', flat=True)[:taille_lot])
+        if not ids:
+            return total
+        dernier_id = ids[-1]
+        total += avec_reprise(_rappeler_lot, ids)
+        if len(ids) < taille_lot:
+            return total
+
+
+def _rappeler_lot(ids):
+    # L'horodatage sert de marque : seules les réservations marquées par ce lot sont rappelées
+    marque = timezone.now()
+    Reservation.objects.filter(id__in=ids, rappel_envoye_le__isnull=True).update(rappel_envoye_le=marque)
+    template = gabarit('client/emails/rappel_reservation.html')
+    return mettre_en_file_groupe(
+        message_rappel(template, reservation)
+        for reservation in Reservation.objects.filter(id__in=ids, rappel_envoye_le=marque)
+        .select_related('user', 'espace')
+    )
+
+
+def message_rappel(template, reservation):
+    html_message = template.render({'user': reservation.user, 'reservation': reservation})
+    return email_sortant(
+        f"Rappel : votre réservation du {reservation.date:%d/%m/%Y} - {reservation.espace.nom}",
+        strip_tags(html_message),
+        [reservation.user.email],
+        html_message=html_message,
+    )
+
+
+def bilan_du_jour(jour):
+    """Compteurs de la journée (nouvelles, annulées) et réservations en attente de décision."""
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    fin = debut + timedelta(days=1)
+    bilan = Reservation.objects.aggregate(
+        nouvelles=Count('id', filter=Q(created_at__gte=debut, created_at__lt=fin)),
+        annulees=Count('id', filter=Q(status='annulee', updated_at__gte=debut, updated_at__lt=fin)),
+    )
+    en_attente = Reservation.objects.filter(status='en_attente').exclude(expire_le__lte=timezone.now())
+    bilan['en_attente'] = en_attente.count()
+    bilan['a_traiter'] = list(
+        en_attente.select_related('user', 'espace').order_by('date', 'heure_debut')[:EN_ATTENTE_AFFICHEES]
+    )
+    return bilan
+
+
+def envoyer_recapitulatifs(jour=None):
+    """
+    Met en file le récapitulatif de la journée (la veille par défaut) pour
+    chaque administrateur qui ne l'a pas encore reçu. Retourne le nombre d'envois.
+    """
+    jour = jour or timezone.localdate() - timedelta(days=1)
+    destinataires = list(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='')
+        .exclude(recapitulatifs__jour=jour)
+    )
+    if not destinataires:
+        return 0
+    bilan = bilan_du_jour(jour)
+    template = gabarit('client/emails/recapitulatif_admin.html')
+
+    def enregistrer():
+        # La contrainte (destinataire, jour) départage deux passages concurrents
+        nouveaux = [
+            u for u in destinataires
+            if RecapitulatifQuotidien.objects.get_or_create(destinataire=u, jour=jour)[1]
+        ]
+        return mettre_en_file_groupe(message_recapitulatif(template, u, jour, bilan) for u in nouveaux)
+    return avec_reprise(enregistrer)
+
+
+def message_recapitulatif(template, user, jour, bilan):
+    html_message = template.render({'user': user, 'jour': jour, **bilan})
+    return email_sortant(
+        f"Récapitulatif du {jour:%d/%m/%Y} : {bilan['nouvelles']} nouvelle(s), "
+        f"{bilan['en_attente']} en attente, {bilan['annulees']} annulée(s)",
+        strip_tags(html_message),
+        [user.email],
+        html_message=html_message,
+    )
@@ -0,0 +1,131 @@
+"""
+Recherche plein texte dans le catalogue des espaces.
+
+Le moteur est choisi par le réglage RECHERCHE_MOTEUR (chemin d'une classe) ;
+par défaut FTS5 sur SQLite et, ailleurs, un repli sur icontains. Un moteur
+filtre un queryset d'espaces et l'annote d'une « pertinence » (plus petite =
+meilleure), ce qui permet de le combiner avec les autres filtres d'accueil.
+L'index est tenu à jour par les signaux de client.signals.
+"""
+import re
+import unicodedata
+from functools import reduce
+from itertools import islice
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+CHAMPS = ('nom', 'ville', 'type_espace', 'equipements', 'description')
+MOT = re.compile(r'\w+')
+
+
+def replier(texte):
+    """Minuscules sans accents : « Réunion » -> « reunion »."""
+    decompose = unicodedata.normalize('NFKD', texte.lower())
+    return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+
+def termes(texte):
+    return MOT.findall(replier(texte or ''))
+
+
+def sans_pertinence(espaces):
+    return espaces.annotate(pertinence=Value(0.0, output_field=FloatField()))
+
+
+class MoteurRecherche:
+    def filtrer(self, espaces, texte):
+        raise NotImplementedError
+
+    def indexer(self, espaces):
+        """Ajoute ou remplace des espaces dans l'index."""
+
+    def retirer(self, ids):
+        """Retire des espaces de l'index."""
+
+    def reconstruire(self):
+        from .models import Espace
+        self.vider()
+        self.indexer(Espace.objects.only(*CHAMPS).iterator(chunk_size=2000))
+
+    def vider(self):
+        pass
+
+
+class MoteurIcontains(MoteurRecherche):
+    """Repli sans index : chaque terme doit apparaître dans un des champs."""
+
+    def filtrer(self, espaces, texte):
+        mots = termes(texte)
+        if mots:
+            espaces = espaces.filter(reduce(and_, (
+                reduce(or_, (Q(**{f'{champ}__icontains': mot}) for champ in CHAMPS)) for mot in mots
+            )))
+        return sans_pertinence(espaces)
+
+
+class MoteurFTS5(MoteurRecherche):
+    """
+    Table virtuelle FTS5 client_espace_fts (rowid = id de l'espace), créée par
+    la migration 0020. Le tokenizer unicode61 retire les accents à l'indexation
+    et les requêtes sont repliées de la même façon ; chaque terme est cherché
+    en préfixe. Le classement BM25 favorise le nom puis la ville.
+    """
+    table = 'client_espace_fts'
+    poids = (10.0, 5.0, 3.0, 2.0, 1.0)
+
+    def requete(self, texte):
+        return ' '.join(f'"{mot}"*' for mot in termes(texte))
+
+    def filtrer(self, espaces, texte):
+        requete = self.requete(texte)
+        if not requete:
+            return sans_pertinence(espaces)
+        # Annotation plutôt que select d'extra() : la pertinence peut ainsi
+        # servir de clé à la pagination par curseur.
+        return espaces.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = client_espace.id', f'{self.table} MATCH %s'],
+            params=[requete],
+        ).annotate(pertinence=RawSQL(
+            f"bm25({self.table}, {', '.join(map(str, self.poids))})", (), output_field=FloatField()
+        ))
+
+    def indexer(self, espaces, taille_lot=2000):
+        sql = f"INSERT OR REPLACE INTO {self.table} (rowid, {', '.join(CHAMPS)}) VALUES (%s, %s, %s, %s, %s, %s)"
+        lignes = ((e.pk, *(getattr(e, champ) or '' for champ in CHAMPS)) for e in espaces)
+        with connection.cursor() as cursor:
+            while lot := list(islice(lignes, taille_lot)):
+                cursor.executemany(sql, lot)
+
+    def retirer(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(i,) for i in ids])
+
+    def vider(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+
+_moteur = None
+
+
+def moteur():
+    global _moteur
+    if _moteur is None:
+        chemin = getattr(settings, 'RECHERCHE_MOTEUR', None)
+        if chemin:
+            _moteur = import_string(chemin)()
+        elif connection.vendor == 'sqlite':
+            _moteur = MoteurFTS5()
+        else:
+            _moteur = MoteurIcontains()
+    return _moteur
+
+
+def rechercher(espaces, texte):
+    return moteur().filtrer(espaces, texte)
@@ -0,0 +1,198 @@
+"""
+Service de réservation.
+
+Toute création ou modification de réservation passe par enregistrer_reservation :
+les journées couvertes sont revendiquées dans la transaction (verrou de ligne
+sur DisponibiliteJour quand la base le permet, verrou d'écriture sur SQLite)
+avant la vérification de chevauchement, ce qui sérialise les réservations
+concurrentes d'un même espace sans bloquer les autres.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .creneaux import jours_couverts
+from .disponibilite import STATUTS_LIBERES, est_disponible
+from .models import DisponibiliteJour, Reservation
+from .signals import reservations_modifiees
+
+TENTATIVES_MAX = 8
+ATTENTE_BASE = 0.02
+ATTENTE_MAX = 1.0
+
+
+class CreneauIndisponible(Exception):
+    """Le créneau demandé chevauche une réservation existante."""
+
+
+def revendiquer_jours(espace_id, jours):
+    """
+    Verrouille les journées d'un espace pour la transaction en cours.
+
+    L'INSERT OR IGNORE est une écriture : sur SQLite il prend le verrou
+    d'écriture dès le début de la transaction, avant toute lecture, ce qui
+    évite le blocage mutuel lecture -> écriture. Ailleurs, les lignes sont
+    ensuite verrouillées par SELECT ... FOR UPDATE.
+    """
+    jours = sorted(jours)
+    DisponibiliteJour.objects.bulk_create(
+        [DisponibiliteJour(espace_id=espace_id, date=jour) for jour in jours],
+        ignore_conflicts=True,
+    )
+    if connection.features.has_select_for_update:
+        list(
+            DisponibiliteJour.objects.select_for_update()
+            .filter(espace_id=espace_id, date__in=jours)
+            .order_by('date')
+            .values_list('id', flat=True)
+        )
+
+
+def base_occupee(erreur):
+    message = str(erreur).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def avec_reprise(operation, *args, **kwargs):
+    """
+    Exécute operation dans une transaction, rejouée si la base est occupée
+    (SQLite « database is locked ») avec une attente exponentielle aléatoire.
+    """
+    for tentative in range(TENTATIVES_MAX):
+        try:
+            with transaction.atomic():
+                return operation(*args, **kwargs)
+        except OperationalError as e:
+            if not base_occupee(e) or tentative == TENTATIVES_MAX - 1:
+                raise
+            time.sleep(random.uniform(0, min(ATTENTE_MAX, ATTENTE_BASE * 2 ** tentative)))
+
+
+def enregistrer_reservation(reservation):
+    """
+    Enregistre une réservation neuve ou modifiée si son créneau est libre.
+
+    Lève CreneauIndisponible en cas de chevauchement.
+    """
+    jours = set(jours_couverts(reservation.date, reservation.heure_debut, reservation.duree_heures))
+    if reservation.pk:
+        ancienne = Reservation.objects.filter(pk=reservation.pk).values('espace_id', 'date', 'heure_debut', 'duree_heures').first()
+        if ancienne and ancienne['espace_id'] == reservation.espace_id:
+            jours.update(jours_couverts(ancienne['date'], ancienne['heure_debut'], ancienne['duree_heures']))
+
+    def operation():
+        revendiquer_jours(reservation.espace_id, jours)
+        # Les blocages expirés sur ces journées libèrent leur place
+        # (et leur entrée dans la contrainte unique) avant la vérification.
+        changer_statut(
+            blocages_expires().filter(espace_id=reservation.espace_id, date__in=jours),
+            'expiree',
+        )
+        if reservation.status not in STATUTS_LIBERES and not est_disponible(
+            reservation.espace_id, reservation.date, reservation.heure_debut,
+            reservation.duree_heures, exclure=reservation.pk,
+        ):
+            raise CreneauIndisponible("Ce créneau est déjà réservé.")
+        reservation.save()
+        return reservation
+
+    try:
+        return avec_reprise(operation)
+    except IntegrityError:
+        # La contrainte unique a arrêté une insertion concurrente
+        raise CreneauIndisponible("Ce créneau est déjà réservé.")
+
+
+def fin_blocage(minutes=None):
+    """Échéance du blocage d'un créneau en attente de paiement."""
+    if minutes is None:
+        minutes = getattr(settings, 'RESERVATION_DUREE_BLOCAGE_MINUTES', 15)
+    return timezone.now() + timedelta(minutes=minutes)
+
+
+def reserver(user, espace, date, heure_debut, duree_heures, **champs):
+    """
+    Crée une réservation pour un client ; le prix est calculé si absent.
+
+    Le créneau n'est bloqué que jusqu'à fin_blocage() : sans paiement d'ici
+    là, il redevient libre.
+    """
+    champs.setdefault('prix_total', espace.prix_par_heure * duree_heures)
+    champs.setdefault('expire_le', fin_blocage())
+    reservation = Reservation(
+        user=user, espace=espace, date=date, heure_debut=heure_debut,
+        duree_heures=duree_heures, **champs
+    )
+    return enregistrer_reservation(reservation)
+
+
+def changer_statut(reservations, statut, taille_lot=1000, apres_lot=None, **champs):
+    """
+    Change le statut d'un ensemble de réservations par lots d'UPDATE.
+
+    Chaque lot est relu par id croissant puis mis à jour avec les conditions
+    du queryset d'origine, dans sa propre courte transaction (rejouée si la
+    base est occupée) : une ligne modifiée entre-temps par une requête
+    concurrente n'est pas écrasée.
+    Les masques de créneaux des journées touchées sont recalculés.
+    apres_lot, s'il est fourni, reçoit les ids de chaque lot une fois sa
+    transaction terminée. Retourne le nombre de lignes modifiées.
+    """
+    reservations = reservations.order_by('id')
+    total = 0
+    dernier_id = 0
+    while True:
+        lot = list(
+            reservations.filter(id__gt=dernier_id)
+            .values_list('id', 'espace_id', 'date', 'heure_debut', 'duree_heures')[:taille_lot]
+        )
+        if not lot:
+            return total
+        dernier_id = lot[-1][0]
+        total += avec_reprise(_changer_statut_lot, reservations, lot, statut, champs)
+        if apres_lot:
+            apres_lot([ligne[0] for ligne in lot])
+        if len(lot) < taille_lot:
+            return total
+
+
+def _changer_statut_lot(reservations, lot, statut, champs):
+    modifiees = reservations.filter(id__in=[ligne[0] for ligne in lot]).update(
+        status=statut, updated_at=timezone.now(), **champs
+    )
+    reservations_modifiees(
+        (espace_id, jour)
+        for _, espace_id, d, h, duree in lot
+        for jour in jours_couverts(d, h, duree)
+    )
+    return modifiees
+
+
+def blocages_expires(maintenant=None):
+    """Réservations en attente de paiement dont le blocage est échu (index status, expire_le)."""
+    return Reservation.objects.filter(status='en_attente', expire_le__lte=maintenant or timezone.now())
+
+
+def liberer_blocages_expires(taille_lot=1000):
+    return changer_statut(blocages_expires(), 'expiree', taille_lot=taille_lot)
+
+
+def reservations_passees(maintenant=None):
+    """
+    Réservations restées en attente alors que leur créneau a commencé
+    (index status, date, heure_debut).
+    """
+    maintenant = timezone.localtime(maintenant or timezone.now())
+    # date__lte borne le parcours de l'index, le OR ne fait que trier le jour même
+    return Reservation.objects.filter(status='en_attente', date__lte=maintenant.date()).filter(
+        Q(date__lt=maintenant.date()) | Q(heure_debut__lte=maintenant.time())
+    )
+
+
+def expirer_reservations_passees(taille_lot=1000):
+    return changer_statut(reservations_passees(), 'expiree', taille_lot=taille_lot)
@@ -0,0 +1,140 @@
+"""
+Réservations récurrentes et groupées.
+
+Les occurrences d'une série sont vérifiées ensemble contre un seul index
+d'intervalles chargé en une requête, puis créées par bulk_create.
+"""
+import calendar
+from datetime import timedelta
+
+from .creneaux import jours_couverts
+from .disponibilite import bornes, construire_index, jour_de
+from .models import Reservation, SerieReservation
+from .reservations import avec_reprise, blocages_expires, changer_statut, revendiquer_jours
+from .signals import reservations_modifiees
+
+HORIZON_MAX_JOURS = 366
+
+
+class SerieInvalide(Exception):
+    pass
+
+
+def ajouter_mois(jour, nb_mois):
+    mois = jour.month - 1 + nb_mois
+    annee, mois = jour.year + mois // 12, mois % 12 + 1
+    return jour.replace(year=annee, month=mois, day=min(jour.day, calendar.monthrange(annee, mois)[1]))
+
+
+def generer_occurrences(date_debut, date_fin, frequence, intervalle=1, jours_semaine=None):
+    """
+    Dates d'une règle de récurrence, à la manière d'une RRULE simplifiée :
+    FREQ quotidienne/hebdomadaire/mensuelle, INTERVAL, et BYDAY pour
+    l'hebdomadaire (0 = lundi ; par défaut le jour de date_debut).
+    """
+    if date_fin < date_debut:
+        raise SerieInvalide("La date de fin précède la date de début.")
+    if (date_fin - date_debut).days > HORIZON_MAX_JOURS:
+        raise SerieInvalide("Une série ne peut pas dépasser un an.")
+    intervalle = max(1, int(intervalle))
+
+    if frequence == 'quotidienne':
+        nb_jours = (date_fin - date_debut).days
+        return [date_debut + timedelta(days=i) for i in range(0, nb_jours + 1, intervalle)]
+
+    if frequence == 'hebdomadaire':
+        jours = sorted(set(jours_semaine or [date_debut.weekday()]))
+        lundi = date_debut - timedelta(days=date_debut.weekday())
+        dates = []
+        semaine = lundi
+        while semaine <= date_fin:
+            for j in jours:
+                jour = semaine + timedelta(days=j)
+                if date_debut <= jour <= date_fin:
+                    dates.append(jour)
+            semaine += timedelta(weeks=intervalle)
+        return dates
+
+    if frequence == 'mensuelle':
+        dates = []
+        n = 0
+        while (jour := ajouter_mois(date_debut, n)) <= date_fin:
+            dates.append(jour)
+            n += intervalle
+        return dates
+
+    raise SerieInvalide(f"Fréquence inconnue : {frequence}")
+
+
+def verifier_occurrences(espace, dates, heure_debut, duree_heures):
+    """
+    Sépare les dates libres des dates en conflit, en une seule requête.
+
+    Les occurrences acceptées sont ajoutées à l'index au fur et à mesure pour
+    qu'une série ne se chevauche pas elle-même.
+    """
+    if not dates:
+        return [], []
+    _, dernier_fin = bornes(max(dates), heure_debut, duree_heures)
+    index = construire_index(espace, min(dates), jour_de(dernier_fin - 1))
+    libres, conflits = [], []
+    for jour in sorted(dates):
+        debut, fin = bornes(jour, heure_debut, duree_heures)
+        if index.chevauche(debut, fin):
+            conflits.append(jour)
+        else:
+            index.ajouter(debut, fin)
+            libres.append(jour)
+    return libres, conflits
+
+
+def creer_serie(user, espace, dates, heure_debut, duree_heures, serie=None, tout_ou_rien=False, **champs):
+    """
+    Crée en bloc les occurrences libres d'une série.
+
+    Les journées concernées sont revendiquées comme pour une réservation
+    simple, la vérification est groupée et les lignes insérées par
+    bulk_create. Avec tout_ou_rien, rien n'est créé s'il y a un conflit.
+    Retourne (réservations créées, dates en conflit).
+    """
+    champs.setdefault('prix_total', espace.prix_par_heure * duree_heures)
+    jours = {j for jour in dates for j in jours_couverts(jour, heure_debut, duree_heures)}
+    nouvelle_serie = serie is not None and serie.pk is None
+
+    def operation():
+        revendiquer_jours(espace.pk, jours)
+        changer_statut(blocages_expires().filter(espace_id=espace.pk, date__in=jours), 'expiree')
+        libres, conflits = verifier_occurrences(espace, dates, heure_debut, duree_heures)
+        if (conflits and tout_ou_rien) or not libres:
+            return [], conflits
+
+        if nouvelle_serie:
+            # pk remis à zéro : une tentative précédente a pu être annulée
+            serie.pk = None
+            serie.save()
+        creees = Reservation.objects.bulk_create([
+            Reservation(user=user, espace=espace, date=jour, heure_debut=heure_debut,
+                        duree_heures=duree_heures, serie=serie, **champs)
+            for jour in libres
+        ], batch_size=500)
+        reservations_modifiees(
+            (espace.pk, j) for jour in libres for j in jours_couverts(jour, heure_debut, duree_heures)
+        )
+        return creees, conflits
+
+    return avec_reprise(operation)
+
+
+def reserver_serie(user, espace, frequence, date_debut, date_fin, heure_debut, duree_heures,
+                   intervalle=1, jours_semaine=None, tout_ou_rien=False, **champs):
+    """Enregistre une SerieReservation et crée ses occurrences libres."""
+    dates = generer_occurrences(date_debut, date_fin, frequence, intervalle, jours_semaine)
+    serie = SerieReservation(
+        user=user, espace=espace, frequence=frequence, intervalle=intervalle,
+        jours_semaine=','.join(str(j) for j in sorted(set(jours_semaine or []))),
+        date_debut=date_debut, date_fin=date_fin, heure_debut=heure_debut, duree_heures=duree_heures,
+    )
+    creees, conflits = creer_serie(
+        user, espace, dates, heure_debut, duree_heures, serie=serie, tout_ou_rien=tout_ou_rien, **champs
+    )
+    return serie, creees, conflits
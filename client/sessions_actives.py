@@ -0,0 +1,210 @@
+"""
+Suivi des sessions actives avec écriture différée.
+
+Sans écriture différée, chaque requête authentifiée fait un update_or_create
+sur ActiveSession (un SELECT et un UPDATE), ce qui sérialise les écrivains
+sous SQLite. Avec SESSIONS_ACTIVES_ECRITURE_DIFFEREE, la ligne n'est écrite
+directement que pour une nouvelle session, un changement d'appareil, de
+user-agent ou d'adresse IP, ou quand la dernière écriture date de plus de
+SESSIONS_ACTIVES_INTERVALLE secondes. Entre-temps, l'état connu de la session
+est gardé en cache et seule l'heure de dernière activité est notée ; les
+heures en attente sont écrites toutes les SESSIONS_ACTIVES_DELAI_VIDAGE
+secondes, ou par lots de SESSIONS_ACTIVES_LOT, en un seul UPDATE par lot.
+
+Les heures en attente sont propres à chaque processus : en cas d'arrêt
+brutal, on perd au plus DELAI_VIDAGE secondes de « dernière activité ».
+
+La révocation et la purge travaillent par ensembles : revoquer() supprime
+les sessions visées en deux requêtes et oublie leurs états, les fonctions
+de purge parcourent les tables par lots courts, chacun dans sa propre
+transaction, pour ne jamais bloquer longtemps les écrivains (contrairement
+à clearsessions, qui supprime toutes les sessions expirées en une seule
+requête).
+"""
+import atexit
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import ActiveSession
+from .reservations import avec_reprise
+
+INTERVALLE = 300
+DELAI_VIDAGE = 30
+LOT = 200
+
+_en_attente = {}
+_verrou = threading.Lock()
+_dernier_vidage = time.monotonic()
+
+
+def reglage(nom, defaut):
+    return getattr(settings, f'SESSIONS_ACTIVES_{nom}', defaut)
+
+
+def antememoire():
+    return caches[reglage('CACHE', 'default')]
+
+
+def cle(session_key):
+    return f'session_active:{session_key}'
+
+
+def enregistrer(session_key, user, device_info, ip_address, maintenant=None, user_agent=''):
+    """
+    Note l'activité d'une session. Retourne True si la base a été écrite
+    immédiatement, False si seule l'heure d'activité a été mise en attente.
+    """
+    maintenant = maintenant or time.time()
+    if not reglage('ECRITURE_DIFFEREE', True):
+        ecrire(session_key, user, device_info, ip_address, user_agent)
+        return True
+
+    etat = antememoire().get(cle(session_key))
+    if (
+        etat is None
+        or etat['user_id'] != user.pk
+        or (etat['device_info'], etat['ip_address'], etat.get('user_agent', '')) != (device_info, ip_address, user_agent)
+        or maintenant - etat['ecrit_le'] >= reglage('INTERVALLE', INTERVALLE)
+    ):
+        ecrire(session_key, user, device_info, ip_address, user_agent)
+        antememoire().set(cle(session_key), {
+            'user_id': user.pk, 'device_info': device_info, 'ip_address': ip_address,
+            'user_agent': user_agent, 'ecrit_le': maintenant,
+        }, reglage('INTERVALLE', INTERVALLE))
+        with _verrou:
+            _en_attente.pop(session_key, None)
+        return True
+
+    with _verrou:
+        _en_attente[session_key] = maintenant
+        a_vider = (
+            len(_en_attente) >= reglage('LOT', LOT)
+            or time.monotonic() - _dernier_vidage >= reglage('DELAI_VIDAGE', DELAI_VIDAGE)
+        )
+    if a_vider:
+        vider()
+    return False
+
+
+def ecrire(session_key, user, device_info, ip_address, user_agent=''):
+    ActiveSession.objects.update_or_create(
+        session_key=session_key,
+        defaults={
+            'user': user,
+            'device_info': device_info,
+            'user_agent': user_agent[:512],
+            'ip_address': ip_address,
+        }
+    )
+
+
+def vider():
+    """Écrit les heures d'activité en attente, un UPDATE par lot. Retourne le nombre de sessions."""
+    global _en_attente, _dernier_vidage
+    with _verrou:
+        lot, _en_attente = _en_attente, {}
+        _dernier_vidage = time.monotonic()
+    if not lot:
+        return 0
+    cles = list(lot)
+    taille = reglage('LOT', LOT)
+    for debut in range(0, len(cles), taille):
+        morceau = cles[debut:debut + taille]
+        ActiveSession.objects.filter(session_key__in=morceau).update(last_activity=Case(
+            *(When(session_key=k, then=Value(datetime.fromtimestamp(lot[k], tz=dt_timezone.utc))) for k in morceau),
+            output_field=DateTimeField(),
+        ))
+    return len(lot)
+
+
+def oublier(session_keys):
+    """Efface l'état en cache et l'heure en attente de sessions supprimées."""
+    antememoire().delete_many([cle(k) for k in session_keys])
+    with _verrou:
+        for k in session_keys:
+            _en_attente.pop(k, None)
+
+
+def revoquer(sessions):
+    """
+    Déconnecte les sessions d'un queryset d'ActiveSession : leurs lignes sont
+    supprimées par un DELETE qui rend leurs clés (RETURNING, SQLite 3.35+),
+    puis les sessions Django correspondantes. Leurs états en cache et heures
+    en attente sont ensuite oubliés, pour qu'un vidage ne réécrive pas une
+    session révoquée. Retourne le nombre de sessions révoquées.
+    """
+    def supprimer():
+        sql, params = sessions.order_by().values('pk').query.sql_with_params()
+        with connections[sessions.db].cursor() as curseur:
+            curseur.execute(
+                f"DELETE FROM {ActiveSession._meta.db_table} WHERE id IN ({sql}) RETURNING session_key", params,
+            )
+            cles = [cle for cle, in curseur.fetchall()]
+        Session.objects.filter(session_key__in=cles).delete()
+        return cles
+    cles = avec_reprise(supprimer)
+    oublier(cles)
+    return len(cles)
+
+
+def purger_sessions_expirees(taille_lot=1000, pause=0):
+    """Supprime les sessions Django expirées par lots (index expire_date). Retourne le nombre de lignes."""
+    total = 0
+    while True:
+        cles = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .order_by('expire_date').values_list('session_key', flat=True)[:taille_lot]
+        )
+        if not cles:
+            return total
+        total += avec_reprise(lambda: Session.objects.filter(session_key__in=cles).delete()[0])
+        if len(cles) < taille_lot:
+            return total
+        time.sleep(pause)
+
+
+def purger_sessions_orphelines(taille_lot=1000, pause=0):
+    """
+    Supprime les ActiveSession dont la session Django n'existe plus ou a
+    expiré. La table est parcourue par id croissant ; chaque lot est comparé
+    à django_session par sa clé primaire. Retourne le nombre de lignes.
+    """
+    total = 0
+    dernier_id = 0
+    while True:
+        lot = list(
+            ActiveSession.objects.filter(id__gt=dernier_id).order_by('id')
+            .values_list('id', 'session_key')[:taille_lot]
+        )
+        if not lot:
+            return total
+        dernier_id = lot[-1][0]
+        vivantes = set(
+            Session.objects.filter(session_key__in=[cle for _, cle in lot], expire_date__gte=timezone.now())
+            .values_list('session_key', flat=True)
+        )
+        orphelines = [(id_, cle) for id_, cle in lot if cle not in vivantes]
+        if orphelines:
+            total += avec_reprise(lambda: ActiveSession.objects.filter(id__in=[id_ for id_, _ in orphelines]).delete()[0])
+            oublier([cle for _, cle in orphelines])
+        if len(lot) < taille_lot:
+            return total
+        time.sleep(pause)
+
+
+def _vider_a_la_sortie():
+    try:
+        vider()
+    except Exception:
+        pass
+
+
+atexit.register(_vider_a_la_sortie)
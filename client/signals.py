@@ -0,0 +1,99 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .creneaux import jours_couverts, recalculer_disponibilites
+from .equipements import synchroniser_equipements
+from .cache_catalogue import invalider as invalider_catalogue
+from .geo import localiser
+from .models import Espace, EspaceImage, Reservation
+from .recherche import moteur
+from .statistiques import recalculer_statistiques
+
+
+def jours_reservation(reservation):
+    return {
+        (reservation.espace_id, jour)
+        for jour in jours_couverts(reservation.date, reservation.heure_debut, reservation.duree_heures)
+    }
+
+
+def reservations_modifiees(paires):
+    """
+    Point d'entrée unique après une modification de réservations, y compris
+    les opérations groupées (update, bulk_create) qui ne déclenchent pas de signaux.
+    """
+    from .liste_attente import planifier_promotions
+
+    paires = set(paires)
+    if paires:
+        recalculer_disponibilites(paires)
+        recalculer_statistiques(paires)
+        planifier_promotions(paires)
+
+
+@receiver(pre_save, sender=Reservation)
+def memoriser_ancien_creneau(sender, instance, **kwargs):
+    instance._jours_avant = set()
+    if instance.pk:
+        ancienne = (
+            Reservation.objects.filter(pk=instance.pk)
+            .values('espace_id', 'date', 'heure_debut', 'duree_heures')
+            .first()
+        )
+        if ancienne:
+            instance._jours_avant = {
+                (ancienne['espace_id'], jour)
+                for jour in jours_couverts(ancienne['date'], ancienne['heure_debut'], ancienne['duree_heures'])
+            }
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_enregistree(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reservations_modifiees(jours_reservation(instance) | getattr(instance, '_jours_avant', set()))
+
+
+@receiver(pre_save, sender=Espace)
+def localiser_espace(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ancienne_ville = None
+    if instance.pk:
+        ancienne_ville = Espace.objects.filter(pk=instance.pk).values_list('ville', flat=True).first()
+    localiser(instance, ancienne_ville)
+
+
+@receiver(post_save, sender=Espace)
+def espace_enregistre(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    moteur().indexer([instance])
+    if update_fields is None or 'equipements' in update_fields:
+        synchroniser_equipements([instance])
+    invalider_catalogue()
+
+
+@receiver(post_delete, sender=Espace)
+def espace_supprime(sender, instance, **kwargs):
+    moteur().retirer([instance.pk])
+    invalider_catalogue()
+
+
+@receiver(post_save, sender=EspaceImage)
+@receiver(post_delete, sender=EspaceImage)
+def image_modifiee(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalider_catalogue()
+
+
+def suppression_d_espace(origin):
+    """Vrai si la suppression vient d'un Espace supprimé en cascade."""
+    return isinstance(origin, Espace) or getattr(origin, 'model', None) is Espace
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_supprimee(sender, instance, origin=None, **kwargs):
+    if suppression_d_espace(origin):
+        return
+    reservations_modifiees(jours_reservation(instance))
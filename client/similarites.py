@@ -0,0 +1,178 @@
+"""
+Recommandations « les clients qui ont aimé cet espace ont aussi aimé ».
+
+Les favoris et les réservations forment une matrice creuse utilisateurs x
+espaces (un favori compte POIDS_FAVORI, une réservation POIDS_RESERVATION).
+La similarité de deux espaces est le cosinus de leurs colonnes, obtenu par le
+produit creux XᵀX normalisé ; seuls les TOP_K meilleurs voisins de chaque
+espace sont conservés dans EspaceSimilaire, où la page d'un espace les lit en
+une requête sur l'index (espace, rang).
+
+Le calcul utilise NumPy/SciPy s'ils sont installés, sinon un repli en Python
+pur qui parcourt les paires d'espaces de chaque utilisateur. Les utilisateurs
+ayant plus de MAX_PAR_UTILISATEUR espaces sont écartés : leur coût est
+quadratique et ils n'apportent guère d'information.
+
+Le rafraîchissement incrémental ne recalcule que les lignes des espaces des
+utilisateurs ayant ajouté un favori ou une réservation depuis le dernier
+calcul. Les normes des autres espaces et les favoris retirés ne sont
+rattrapés que par un calcul complet, à lancer périodiquement.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import EspaceSimilaire, Favori, Reservation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # dépendances optionnelles
+    np = sparse = None
+
+POIDS_FAVORI = 1.0
+POIDS_RESERVATION = 2.0
+# Réservations annulées, refusées ou expirées ignorées ; les payées (« confirmee ») comptent
+STATUTS_EXCLUS = Reservation.STATUTS_LIBERES
+TOP_K = 10
+MAX_PAR_UTILISATEUR = 500
+
+
+def top_k():
+    return getattr(settings, 'SIMILARITES_TOP_K', TOP_K)
+
+
+def interactions(depuis=None):
+    """(user_id, espace_id, poids) des favoris puis des réservations retenues."""
+    favoris = Favori.objects.all()
+    reservations = Reservation.objects.exclude(status__in=STATUTS_EXCLUS)
+    if depuis:
+        favoris = favoris.filter(created_at__gt=depuis)
+        reservations = reservations.filter(updated_at__gt=depuis)
+    for user_id, espace_id in favoris.order_by().values_list('user_id', 'espace_id').iterator(chunk_size=20000):
+        yield user_id, espace_id, POIDS_FAVORI
+    for user_id, espace_id in (
+        reservations.order_by().values_list('user_id', 'espace_id').distinct().iterator(chunk_size=20000)
+    ):
+        yield user_id, espace_id, POIDS_RESERVATION
+
+
+def voisins_numpy(lignes, cibles=None, k=TOP_K):
+    """{espace: [(voisin, score), ...]} par produit creux XᵀX."""
+    donnees = np.array(list(lignes), dtype=np.float64).reshape(-1, 3)
+    if not len(donnees):
+        return {}
+    users, u = np.unique(donnees[:, 0].astype(np.int64), return_inverse=True)
+    espaces, e = np.unique(donnees[:, 1].astype(np.int64), return_inverse=True)
+    # Les doublons (favori + réservation d'un même espace) s'additionnent
+    x = sparse.csr_matrix((donnees[:, 2], (u, e)), shape=(len(users), len(espaces)))
+    x = x[np.flatnonzero(x.getnnz(axis=1) <= MAX_PAR_UTILISATEUR)]
+    normes = np.sqrt(np.asarray(x.multiply(x).sum(axis=0)).ravel())
+    inverses = np.divide(1.0, normes, out=np.zeros_like(normes), where=normes > 0)
+
+    if cibles is None:
+        colonnes = np.arange(len(espaces))
+    else:
+        colonnes = np.flatnonzero(np.isin(espaces, list(cibles)))
+    xt = x.tocsc()[:, colonnes].T.tocsr()
+    produits = (xt @ x).tocsr()
+    produits = sparse.diags(inverses[colonnes]) @ produits @ sparse.diags(inverses)
+    produits = produits.tocsr()
+
+    resultat = {}
+    for ligne, colonne in enumerate(colonnes):
+        debut, fin = produits.indptr[ligne], produits.indptr[ligne + 1]
+        voisins, scores = produits.indices[debut:fin], produits.data[debut:fin]
+        garder = (voisins != colonne) & (scores > 0)
+        voisins, scores = voisins[garder], scores[garder]
+        if len(scores) > k:
+            meilleurs = np.argpartition(-scores, k - 1)[:k]
+            voisins, scores = voisins[meilleurs], scores[meilleurs]
+        ordre = np.lexsort((espaces[voisins], -scores))
+        resultat[int(espaces[colonne])] = [(int(espaces[voisins[i]]), float(scores[i])) for i in ordre]
+    return resultat
+
+
+def voisins_python(lignes, cibles=None, k=TOP_K):
+    """Même calcul que voisins_numpy, paire par paire."""
+    par_utilisateur = defaultdict(lambda: defaultdict(float))
+    for user_id, espace_id, poids in lignes:
+        par_utilisateur[user_id][espace_id] += poids
+
+    normes = defaultdict(float)
+    produits = defaultdict(lambda: defaultdict(float))
+    for espaces in par_utilisateur.values():
+        if len(espaces) > MAX_PAR_UTILISATEUR:
+            continue
+        for espace_id, poids in espaces.items():
+            normes[espace_id] += poids * poids
+        for a, poids_a in espaces.items():
+            if cibles is not None and a not in cibles:
+                continue
+            for b, poids_b in espaces.items():
+                if a != b:
+                    produits[a][b] += poids_a * poids_b
+
+    resultat = {}
+    for a, voisins in produits.items():
+        scores = ((b, p / math.sqrt(normes[a] * normes[b])) for b, p in voisins.items())
+        resultat[a] = heapq.nsmallest(k, scores, key=lambda v: (-v[1], v[0]))
+    return resultat
+
+
+def moteur_disponible():
+    return 'numpy' if np is not None else 'python'
+
+
+def calculer_similarites(incremental=False, k=None, moteur=None, taille_lot=2000):
+    """
+    Recalcule les voisins de tous les espaces, ou seulement de ceux touchés
+    depuis le dernier calcul avec incremental. Retourne un résumé.
+    """
+    k = k or top_k()
+    moteur = moteur or moteur_disponible()
+    maintenant = timezone.now()
+    cibles = None
+    if incremental:
+        depuis = EspaceSimilaire.objects.aggregate(dernier=Max('calcule_le'))['dernier']
+        if depuis:
+            users = {user_id for user_id, _, _ in interactions(depuis)}
+            cibles = set(Favori.objects.filter(user_id__in=users).values_list('espace_id', flat=True))
+            cibles.update(
+                Reservation.objects.filter(user_id__in=users).exclude(status__in=STATUTS_EXCLUS)
+                .values_list('espace_id', flat=True)
+            )
+            if not cibles:
+                return {'moteur': moteur, 'espaces': 0, 'voisins': 0}
+
+    calcul = voisins_numpy if moteur == 'numpy' else voisins_python
+    voisins = calcul(interactions(), cibles, k)
+
+    with transaction.atomic():
+        anciennes = EspaceSimilaire.objects.all()
+        if cibles is not None:
+            anciennes = anciennes.filter(espace_id__in=cibles)
+        anciennes.delete()
+        creees = EspaceSimilaire.objects.bulk_create(
+            (
+                EspaceSimilaire(espace_id=espace_id, voisin_id=voisin_id, rang=rang, score=score, calcule_le=maintenant)
+                for espace_id, liste in voisins.items()
+                for rang, (voisin_id, score) in enumerate(liste, start=1)
+            ),
+            batch_size=taille_lot,
+        )
+    return {'moteur': moteur, 'espaces': len(voisins), 'voisins': len(creees)}
+
+
+def espaces_similaires(espace_id, limite=4):
+    """Voisins disponibles d'un espace, du plus similaire au moins similaire."""
+    return [
+        similaire.voisin
+        for similaire in EspaceSimilaire.objects.filter(espace_id=espace_id, voisin__disponible=True)
+        .select_related('voisin').order_by('rang')[:limite]
+    ]
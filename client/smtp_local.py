@@ -0,0 +1,85 @@
+"""
+Serveur SMTP minimal pour les tests et les mesures de la boîte d'envoi.
+
+Il accepte tous les messages sans les relayer et compte les connexions et
+les messages reçus. latence simule le temps d'aller-retour réseau avant
+chaque réponse ; a_refuser fait échouer les N prochains messages avec une
+erreur temporaire (451), comme un serveur surchargé.
+"""
+import socketserver
+import threading
+import time
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def repondre(self, ligne):
+        if self.server.latence:
+            time.sleep(self.server.latence)
+        self.wfile.write(f"{ligne}\r\n".encode())
+
+    def handle(self):
+        serveur = self.server
+        with serveur.verrou:
+            serveur.connexions += 1
+        self.repondre("220 localhost SMTP local")
+        while True:
+            ligne = self.rfile.readline()
+            if not ligne:
+                return
+            commande = ligne.decode('ascii', 'replace').strip().upper()
+            if commande.startswith(('EHLO', 'HELO')):
+                self.repondre("250 localhost")
+            elif commande == 'DATA':
+                self.repondre("354 Terminer par <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with serveur.verrou:
+                    refuse = serveur.a_refuser > 0
+                    if refuse:
+                        serveur.a_refuser -= 1
+                    else:
+                        serveur.messages += 1
+                self.repondre("451 Erreur temporaire" if refuse else "250 OK")
+            elif commande == 'QUIT':
+                self.repondre("221 Au revoir")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.repondre("250 OK")
+
+
+class ServeurSMTPLocal(socketserver.ThreadingTCPServer):
+    """À utiliser comme gestionnaire de contexte ; écoute sur un port libre de 127.0.0.1."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latence=0.0):
+        super().__init__(('127.0.0.1', 0), _Session)
+        self.latence = latence
+        self.verrou = threading.Lock()
+        self.connexions = 0
+        self.messages = 0
+        self.a_refuser = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def reglages(self):
+        """Réglages EMAIL_* pour override_settings."""
+        return {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': self.port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -84,4 +84,44 @@ document.addEventListener("DOMContentLoaded", function () {
       themeButton.textContent = "☀️";
     }
   }
+
+  // ========================================
+  // DÉFILEMENT INFINI DU CATALOGUE
+  // ========================================
+  const voirPlus = document.querySelector(".voir-plus");
+  const liste = document.getElementById("liste-espaces");
+  if (voirPlus && liste) {
+    let enCours = false;
+
+    const chargerSuite = () => {
+      if (enCours || !voirPlus.dataset.api) return;
+      enCours = true;
+      fetch(voirPlus.dataset.api, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+        .then((response) => response.json())
+        .then((data) => {
+          liste.insertAdjacentHTML("beforeend", data.html);
+          if (data.suivant) {
+            voirPlus.href = "?" + data.suivant;
+            voirPlus.dataset.api = data.api_suivant;
+          } else {
+            voirPlus.remove();
+            observateur && observateur.disconnect();
+          }
+        })
+        .catch((error) => console.error("Erreur:", error))
+        .finally(() => { enCours = false; });
+    };
+
+    voirPlus.addEventListener("click", (e) => {
+      e.preventDefault();
+      chargerSuite();
+    });
+
+    const observateur = "IntersectionObserver" in window
+      ? new IntersectionObserver((entrees) => {
+          if (entrees.some((entree) => entree.isIntersecting)) chargerSuite();
+        }, { rootMargin: "400px" })
+      : null;
+    if (observateur) observateur.observe(voirPlus);
+  }
 });
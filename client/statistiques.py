@@ -0,0 +1,147 @@
+"""
+Table de faits quotidiens (espace, jour) des statistiques de l'administration.
+
+Comme DisponibiliteJour, StatistiqueJour est recalculée à partir des
+réservations brutes pour les seuls couples (espace, jour) touchés par une
+modification (signaux de Reservation et opérations groupées, voir
+client.signals.reservations_modifiees) : elle reste exacte quel que soit
+l'ordre des modifications, et reconstruire_statistiques() la refait en bloc.
+
+Les réservations et le chiffre d'affaires sont comptés au jour de début ;
+les minutes occupées sont réparties sur les jours couverts. Le chiffre
+d'affaires ne retient que les réservations payées : un blocage en attente de
+paiement occupe le créneau sans rien rapporter. Seuls le statut et le
+paiement comptent (les blocages échus sont retirés quand le balayage les
+passe en « expiree »), si bien qu'une reconstruction donne la même table que
+les mises à jour successives.
+
+La page de statistiques lit ces lignes pré-agrégées : une période d'un an
+représente au plus 365 lignes par espace, au lieu de toutes les réservations.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .disponibilite import MINUTES_PAR_JOUR, bornes
+from .models import Espace, Reservation, StatistiqueJour
+
+STATUTS_EXCLUS = Reservation.STATUTS_LIBERES
+CHAMPS = ('date', 'heure_debut', 'duree_heures', 'prix_total', 'status', 'paid')
+
+
+def minutes_par_jour(date_obj, heure_debut, duree_heures):
+    """Découpe un créneau en {jour: minutes}, en gérant le passage de minuit."""
+    debut, fin = bornes(date_obj, heure_debut, duree_heures)
+    minutes = {}
+    while debut < fin:
+        jour_ordinal = debut // MINUTES_PAR_JOUR
+        fin_jour = min(fin, (jour_ordinal + 1) * MINUTES_PAR_JOUR)
+        minutes[date_obj.fromordinal(jour_ordinal)] = fin_jour - debut
+        debut = fin_jour
+    return minutes
+
+
+def cumuler(faits, lignes, jours=None):
+    """Ajoute des réservations (valeurs de CHAMPS) aux faits {jour: [réservations, CA, minutes, annulations]}."""
+    for d, h, duree, prix, statut, paye in lignes:
+        if statut == 'annulee':
+            if jours is None or d in jours:
+                faits[d][3] += 1
+        if statut in STATUTS_EXCLUS:
+            continue
+        if jours is None or d in jours:
+            faits[d][0] += 1
+            if paye:
+                faits[d][1] += prix
+        for jour, minutes in minutes_par_jour(d, h, duree).items():
+            if jours is None or jour in jours:
+                faits[jour][2] += minutes
+
+
+def nouveaux_faits():
+    return defaultdict(lambda: [0, Decimal(0), 0, 0])
+
+
+def lignes_statistiques(espace_id, faits):
+    return [
+        StatistiqueJour(
+            espace_id=espace_id, date=jour, reservations=n, chiffre_affaires=ca, minutes=minutes, annulations=annulees,
+        )
+        for jour, (n, ca, minutes, annulees) in faits.items()
+    ]
+
+
+def recalculer_statistiques(paires):
+    """
+    Recalcule les faits pour des couples (espace_id, date) : une lecture et un
+    upsert groupé par espace.
+    """
+    par_espace = defaultdict(set)
+    for espace_id, jour in paires:
+        par_espace[espace_id].add(jour)
+
+    for espace_id, jours in par_espace.items():
+        faits = nouveaux_faits()
+        # Une réservation de moins de 24 h ne peut déborder que depuis la veille (voir reservations_periode)
+        reservations = Reservation.objects.filter(espace_id=espace_id).order_by()
+        proches = reservations.filter(date__range=(min(jours) - timedelta(days=1), max(jours)))
+        longues = reservations.filter(date__lt=min(jours) - timedelta(days=1), duree_heures__gt=24)
+        cumuler(faits, proches.values_list(*CHAMPS).union(longues.values_list(*CHAMPS), all=True), jours)
+        # Les jours devenus vides sont remis à zéro
+        StatistiqueJour.objects.bulk_create(
+            lignes_statistiques(espace_id, {jour: faits[jour] for jour in jours}),
+            update_conflicts=True,
+            unique_fields=['date', 'espace'],
+            update_fields=['reservations', 'chiffre_affaires', 'minutes', 'annulations', 'updated_at'],
+        )
+
+
+def reconstruire_statistiques(espaces=None, taille_lot=5000):
+    """Reconstruit toute la table à partir des réservations. Retourne le nombre de journées."""
+    espaces = espaces if espaces is not None else Espace.objects.values_list('id', flat=True)
+    total = 0
+    for espace_id in espaces:
+        faits = nouveaux_faits()
+        lignes = Reservation.objects.filter(espace_id=espace_id).order_by().values_list(*CHAMPS)
+        cumuler(faits, lignes.iterator(chunk_size=taille_lot))
+
+        with transaction.atomic():
+            StatistiqueJour.objects.filter(espace_id=espace_id).delete()
+            StatistiqueJour.objects.bulk_create(lignes_statistiques(espace_id, faits), batch_size=taille_lot)
+        total += len(faits)
+    return total
+
+
+def statistiques_periode(debut, fin):
+    """
+    Séries de la période [debut, fin] lues dans StatistiqueJour : totaux,
+    activité par jour (jours sans ligne à zéro) et occupation par espace
+    (minutes occupées sur la durée de la période, 24 h sur 24).
+    """
+    lignes = StatistiqueJour.objects.filter(date__range=(debut, fin))
+    sommes = {
+        'reservations': Sum('reservations'), 'chiffre_affaires': Sum('chiffre_affaires'),
+        'minutes': Sum('minutes'), 'annulations': Sum('annulations'),
+    }
+    par_jour = {ligne['date']: ligne for ligne in lignes.values('date').annotate(**sommes).order_by()}
+    jours = [debut + timedelta(days=i) for i in range((fin - debut).days + 1)]
+    vide = dict.fromkeys(sommes, 0)
+    activite = [{**par_jour.get(jour, vide), 'date': jour} for jour in jours]
+
+    # Les totaux se déduisent des séries par jour, sans relire la table
+    totaux = {cle: sum(jour[cle] for jour in activite) for cle in sommes}
+    decidees = totaux['reservations'] + totaux['annulations']
+    totaux['taux_annulation'] = 100 * totaux['annulations'] / decidees if decidees else 0
+
+    disponibles = len(jours) * MINUTES_PAR_JOUR
+    occupation = [
+        {'espace': ligne['espace__nom'], 'heures': ligne['minutes'] / 60, 'taux': 100 * ligne['minutes'] / disponibles}
+        for ligne in lignes.values('espace_id', 'espace__nom').annotate(minutes=Sum('minutes'))
+        .filter(minutes__gt=0).order_by('-minutes')
+    ]
+    espaces = Espace.objects.count()
+    totaux['taux_occupation'] = 100 * totaux['minutes'] / (disponibles * espaces) if espaces else 0
+    return {'totaux': totaux, 'activite': activite, 'occupation': occupation}
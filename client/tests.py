@@ -1,3 +1,1141 @@
-from django.test import TestCase
+import io
+import random
+import threading
+import time as chrono
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import QueryDict
+from unittest import mock, skipUnless
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .agents import classer, statistiques_cache
+from . import boite_envoi
+from .disponibilite import IntervalIndex, est_disponible, trouver_conflits
+from .creneaux import calculer_masques, filtrer_libres, masque_plage, reconstruire_disponibilites
+from .cache_catalogue import antememoire, lire, remettre_a_zero, statistiques
+from .catalogue import filtrer_espaces, normaliser_filtres
+from .equipements import avec_equipements, filtrer_equipements
+from .facettes import facettes
+from .geo import distance_km
+from . import journal_paiements
+from .models import ActiveSession, DisponibiliteJour, EcriturePaiement, EmailSortant, PaymentCard, StatistiqueJour, TentativePaiement, Equipement, Espace, EspaceImage, Favori, ListeAttente, Reservation
+from .moderation import moderer
+from . import paiements
+from .pagination import TRIS, paginer
+from .rappels import envoyer_rappels, envoyer_recapitulatifs
+from .series import SerieInvalide, generer_occurrences, reserver_serie, verifier_occurrences
+from .recherche import rechercher
+from . import reservations
+from .reservations import (
+    CreneauIndisponible, avec_reprise, blocages_expires, changer_statut, enregistrer_reservation,
+    expirer_reservations_passees, liberer_blocages_expires, reserver,
+)
+from . import similarites
+from .similarites import calculer_similarites, espaces_similaires
+from .statistiques import reconstruire_statistiques, statistiques_periode
+from .smtp_local import ServeurSMTPLocal
+from . import sessions_actives
+
+
+def creer_client(username="client", **champs):
+    return User.objects.create_user(username, f"{username}@exemple.fr", "x", **champs)
+
+
+def creer_espace(nom="Salle A", **champs):
+    champs = {'type_espace': 'reunion', 'capacite': 8, 'ville': "Lille", 'prix_par_heure': 20, **champs}
+    return Espace.objects.create(nom=nom, **champs)
+
+
+class ReservationTestCase(TestCase):
+    """Un client, une salle et un jour à venir, communs aux tests de réservation."""
+
+    def setUp(self):
+        self.user = creer_client()
+        self.espace = creer_espace()
+        self.jour = date.today() + timedelta(days=10)
+
+    def reserver(self, heure, duree=1, espace=None, jour=None, **champs):
+        return Reservation.objects.create(
+            user=self.user, espace=espace or self.espace, date=jour or self.jour,
+            heure_debut=heure, duree_heures=duree, **champs
+        )
+
+
+class DisponibiliteTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.jour = date(2030, 3, 5)
+
+    def libre(self, heure, duree, jour=None, exclure=None):
+        return est_disponible(self.espace, jour or self.jour, heure, duree, exclure=exclure)
+
+    def test_index_chevauchements_et_bornes(self):
+        index = IntervalIndex([(9 * 60, 12 * 60, 'long'), (14 * 60, 15 * 60, 'court')])
+        self.assertEqual(index.conflits(10 * 60, 11 * 60), ['long'])
+        self.assertEqual(index.conflits(8 * 60, 16 * 60), ['long', 'court'])
+        # Bornes qui se touchent : pas de chevauchement
+        self.assertFalse(index.chevauche(12 * 60, 14 * 60))
+        self.assertFalse(index.chevauche(10 * 60, 11 * 60, exclure='long'))
+        index.ajouter(12 * 60, 14 * 60, 'midi')
+        self.assertEqual(index.conflits(13 * 60, 13 * 60 + 30), ['midi'])
+        self.assertTrue(index.retirer(12 * 60, 'midi'))
+        self.assertFalse(index.retirer(12 * 60, 'midi'))
+        self.assertEqual(len(index), 2)
+
+    def test_creneau_contenu_et_creneaux_contigus(self):
+        longue = self.reserver(time(9, 0), 3)
+        self.assertFalse(self.libre(time(10, 0), 1))
+        self.assertEqual(list(trouver_conflits(self.espace, self.jour, time(10, 0), 1)), [longue])
+        self.assertTrue(self.libre(time(12, 0), 1))
+        self.assertTrue(self.libre(time(8, 0), 1))
+
+        self.reserver(time(14, 0), 1)
+        self.assertTrue(self.libre(time(15, 0), 1))
+        self.assertTrue(self.libre(time(13, 0), 1))
+        self.assertFalse(self.libre(time(13, 30), 1))
+
+    def test_passage_de_minuit_et_reservations_longues(self):
+        self.reserver(time(23, 0), 2)
+        lendemain = self.jour + timedelta(days=1)
+        self.assertFalse(self.libre(time(0, 30), 1, jour=lendemain))
+        self.assertTrue(self.libre(time(1, 0), 1, jour=lendemain))
+        self.assertFalse(self.libre(time(22, 0), 2))
+
+        # Trois jours jusqu'à 8 h : retrouvée par la partie « longues » de l'union
+        longue = self.reserver(time(8, 0), 72, jour=self.jour - timedelta(days=3))
+        self.assertFalse(self.libre(time(7, 0), 1))
+        self.assertEqual(list(trouver_conflits(self.espace, self.jour, time(7, 0), 1)), [longue])
+        self.assertTrue(self.libre(time(8, 0), 1))
+
+    def test_modification_exclut_la_reservation_elle_meme(self):
+        reservation = self.reserver(time(9, 0), 2)
+        self.reserver(time(12, 0), 1)
+        self.assertFalse(self.libre(time(10, 0), 2))
+        self.assertTrue(self.libre(time(10, 0), 2, exclure=reservation.id))
+        self.assertFalse(self.libre(time(10, 0), 3, exclure=reservation.id))
+
+    def test_statuts_liberes_et_blocages_echus_ignores(self):
+        self.reserver(time(9, 0), 1, status='annulee')
+        self.reserver(time(10, 0), 1, expire_le=timezone.now() - timedelta(minutes=1))
+        self.reserver(time(11, 0), 1, expire_le=timezone.now() + timedelta(minutes=10))
+        self.reserver(time(12, 0), 1, status='confirmee', paid=True, expire_le=timezone.now() - timedelta(minutes=1))
+        self.assertTrue(self.libre(time(9, 0), 2))
+        self.assertFalse(self.libre(time(11, 0), 1))
+        self.assertFalse(self.libre(time(12, 0), 1))
+
+
+class DisponibiliteJourTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.autre = creer_espace("Salle B")
+
+    def masque(self, espace=None, jour=None):
+        ligne = DisponibiliteJour.objects.filter(espace=espace or self.espace, date=jour or self.jour).first()
+        return ligne.creneaux if ligne else 0
+
+    def assertTableConforme(self):
+        for ligne in DisponibiliteJour.objects.all():
+            attendu = calculer_masques(ligne.espace_id, [ligne.date])[ligne.date]
+            self.assertEqual(ligne.creneaux, attendu, f"{ligne.espace_id} {ligne.date}")
+
+    def test_creation_met_a_jour_le_masque(self):
+        self.reserver(time(9, 0), 3)
+        self.assertEqual(self.masque(), masque_plage(time(9, 0), time(12, 0)))
+
+    def test_annulation_et_suppression_liberent_le_creneau(self):
+        r = self.reserver(time(9, 0), 2)
+        self.reserver(time(14, 0), 1)
+        r.status = 'annulee'
+        r.save()
+        self.assertEqual(self.masque(), masque_plage(time(14, 0), time(15, 0)))
+        Reservation.objects.get(heure_debut=time(14, 0)).delete()
+        self.assertEqual(self.masque(), 0)
+
+    def test_deplacement_recalcule_les_deux_jours(self):
+        r = self.reserver(time(10, 0), 1)
+        r.date = self.jour + timedelta(days=1)
+        r.save()
+        self.assertEqual(self.masque(), 0)
+        self.assertEqual(self.masque(jour=r.date), masque_plage(time(10, 0), time(11, 0)))
+
+    def test_passage_de_minuit(self):
+        self.reserver(time(22, 30), 3)
+        self.assertEqual(self.masque(), masque_plage(time(22, 30), time(0, 0)))
+        self.assertEqual(self.masque(jour=self.jour + timedelta(days=1)), masque_plage(time(0, 0), time(1, 30)))
+
+    def test_recherche_par_plage_horaire(self):
+        self.reserver(time(15, 0), 1)
+        espaces = Espace.objects.all()
+        libres = filtrer_libres(espaces, self.jour, time(14, 0), time(17, 0))
+        self.assertEqual(list(libres), [self.autre])
+        libres = filtrer_libres(espaces, self.jour, time(9, 0), time(12, 0))
+        self.assertEqual(set(libres), {self.espace, self.autre})
+
+    def test_reconstruction_conforme_aux_reservations(self):
+        rng = random.Random(42)
+        for i in range(60):
+            espace = rng.choice([self.espace, self.autre])
+            jour = self.jour + timedelta(days=rng.randrange(5))
+            heure = time(rng.randrange(24), rng.choice((0, 15, 30)))
+            if Reservation.objects.filter(espace=espace, date=jour, heure_debut=heure).exists():
+                continue
+            self.reserver(heure, rng.randint(1, 4), espace=espace, jour=jour,
+                          status=rng.choice(['en_attente', 'validee', 'annulee']))
+        self.assertTableConforme()
+
+        DisponibiliteJour.objects.update(creneaux=0)
+        reconstruire_disponibilites()
+        self.assertTableConforme()
+
+
+class DisponibilitesMoisTests(ReservationTestCase):
+    def test_masques_du_mois_et_etag(self):
+        self.reserver(time(9, 0), 2, jour=date(2030, 3, 5))
+        url = f"/espace/{self.espace.id}/disponibilites/2030/3/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['occupes'], {'5': format(masque_plage(time(9, 0), time(11, 0)), 'x')})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.reserver(time(9, 0), jour=date(2030, 3, 6))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_mois_hors_calendrier(self):
+        for annee, mois in [(0, 1), (10000, 1), (2030, 0), (2030, 13)]:
+            url = f"/espace/{self.espace.id}/disponibilites/{annee}/{mois}/"
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        self.assertEqual(self.client.get(f"/espace/{self.espace.id}/disponibilites/9999/12/").status_code, 200)
+
+
+class ReservationsConcurrentesTests(ReservationTestCase):
+    def test_contrainte_unique_devient_creneau_indisponible(self):
+        reserver(self.user, self.espace, self.jour, time(9, 0), 2)
+        # Vérification passée par une requête concurrente avant l'insertion de l'autre
+        doublon = Reservation(user=self.user, espace=self.espace, date=self.jour, heure_debut=time(9, 0), duree_heures=1)
+        with mock.patch.object(reservations, 'est_disponible', return_value=True):
+            with self.assertRaises(CreneauIndisponible):
+                enregistrer_reservation(doublon)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    @mock.patch.object(reservations.time, 'sleep')
+    def test_reprise_si_la_base_est_verrouillee(self, sleep):
+        appels = []
+
+        def occupee(echecs):
+            appels.append(1)
+            if len(appels) <= echecs:
+                raise OperationalError("database is locked")
+            return 'fait'
+
+        self.assertEqual(avec_reprise(occupee, 2), 'fait')
+        self.assertEqual((len(appels), sleep.call_count), (3, 2))
+
+        appels.clear()
+        with self.assertRaises(OperationalError):
+            avec_reprise(occupee, reservations.TENTATIVES_MAX)
+        self.assertEqual(len(appels), reservations.TENTATIVES_MAX)
+
+        # Les autres erreurs ne sont pas rejouées
+        appels.clear()
+        with self.assertRaises(OperationalError):
+            avec_reprise(lambda: appels.append(1) or connection.cursor().execute("SELECT * FROM table_absente"))
+        self.assertEqual(len(appels), 1)
+
+
+class ReservationsSimultaneesTests(TransactionTestCase):
+    def test_une_seule_de_deux_reservations_simultanees_aboutit(self):
+        user = creer_client()
+        espace = creer_espace()
+        jour = date.today() + timedelta(days=10)
+        depart = threading.Barrier(2)
+        resultats = []
+
+        def tenter(heure):
+            depart.wait()
+            try:
+                reserver(user, espace, jour, heure, 2)
+                resultats.append('acceptee')
+            except CreneauIndisponible:
+                resultats.append('refusee')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tenter, args=(heure,)) for heure in (time(9, 0), time(10, 0))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(resultats), ['acceptee', 'refusee'])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class SeriesTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        # Un lundi
+        self.lundi = date(2030, 1, 7)
+
+    def test_generation_des_occurrences(self):
+        self.assertEqual(
+            generer_occurrences(self.lundi, self.lundi + timedelta(days=6), 'quotidienne', intervalle=3),
+            [self.lundi, self.lundi + timedelta(days=3), self.lundi + timedelta(days=6)],
+        )
+        # Mercredi et lundi, une semaine sur deux, à partir d'un mercredi
+        self.assertEqual(
+            generer_occurrences(date(2030, 1, 9), date(2030, 1, 28), 'hebdomadaire', 2, [2, 0]),
+            [date(2030, 1, 9), date(2030, 1, 21), date(2030, 1, 23)],
+        )
+        # Le 31 est ramené au dernier jour des mois plus courts
+        self.assertEqual(
+            generer_occurrences(date(2030, 1, 31), date(2030, 4, 30), 'mensuelle'),
+            [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)],
+        )
+        for arguments in [
+            (self.lundi, self.lundi - timedelta(days=1), 'quotidienne'),
+            (self.lundi, self.lundi + timedelta(days=400), 'quotidienne'),
+            (self.lundi, self.lundi, 'annuelle'),
+        ]:
+            with self.assertRaises(SerieInvalide):
+                generer_occurrences(*arguments)
+
+    def test_conflits_avec_l_existant_et_la_serie_elle_meme(self):
+        self.reserver(time(12, 0), jour=self.lundi + timedelta(days=2))
+        # 25 h : l'occurrence du mardi chevauche celle du lundi, celle du mercredi la réservation existante
+        dates = [self.lundi + timedelta(days=i) for i in range(3)]
+        libres, conflits = verifier_occurrences(self.espace, dates, time(9, 0), 25)
+        self.assertEqual(libres, [self.lundi])
+        self.assertEqual(conflits, dates[1:])
+        self.assertEqual(verifier_occurrences(self.espace, [], time(9, 0), 1), ([], []))
+
+    def test_tout_ou_rien_et_creation_partielle(self):
+        pris = self.lundi + timedelta(days=7)
+        self.reserver(time(9, 30), jour=pris)
+        regle = (self.espace, 'hebdomadaire', self.lundi, self.lundi + timedelta(days=21), time(9, 0), 2)
+
+        serie, creees, conflits = reserver_serie(self.user, *regle, tout_ou_rien=True)
+        self.assertEqual((serie.pk, creees, conflits), (None, [], [pris]))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+        serie, creees, conflits = reserver_serie(self.user, *regle)
+        self.assertEqual(conflits, [pris])
+        self.assertEqual(sorted(r.date for r in serie.reservations.all()),
+                         [self.lundi, self.lundi + timedelta(days=14), self.lundi + timedelta(days=21)])
+        self.assertEqual({r.prix_total for r in creees}, {40})
+        self.assertEqual(DisponibiliteJour.objects.get(espace=self.espace, date=self.lundi).creneaux,
+                         masque_plage(time(9, 0), time(11, 0)))
+
+    def test_occurrences_du_client_bloquees_le_temps_du_paiement(self):
+        self.client.force_login(self.user)
+        debut = date.today() + timedelta(days=3)
+        reponse = self.client.post(
+            reverse('reservation_recurrente', args=[self.espace.id]),
+            {'serie-frequence': 'quotidienne', 'serie-intervalle': 1, 'serie-date_debut': debut,
+             'serie-date_fin': debut + timedelta(days=2), 'serie-heure_debut': '09:00', 'serie-duree_heures': 1},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(reponse.json()['creees'], 3)
+        for reservation in Reservation.objects.all():
+            self.assertEqual(reservation.status, 'en_attente')
+            self.assertIsNotNone(reservation.expire_le)
+            self.assertGreater(reservation.expire_le, timezone.now())
+
+
+@override_settings(LISTE_ATTENTE_ASYNCHRONE=False)
+class ListeAttenteTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.attente = creer_client("attente")
+        self.reservation = self.reserver(time(9, 0), 3)
+
+    def mettre_en_attente(self, user, heure, duree):
+        return ListeAttente.objects.create(
+            user=user, espace=self.espace, date=self.jour, heure_debut=heure, duree_heures=duree
+        )
+
+    def test_annulation_promeut_les_demandes_qui_tiennent(self):
+        premiere = self.mettre_en_attente(self.attente, time(9, 0), 2)
+        concurrente = self.mettre_en_attente(self.user, time(10, 0), 2)
+        trop_longue = self.mettre_en_attente(self.user, time(11, 0), 3)
+        self.reserver(time(13, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.status = 'annulee'
+            self.reservation.save()
+
+        premiere.refresh_from_db()
+        concurrente.refresh_from_db()
+        trop_longue.refresh_from_db()
+        self.assertEqual(premiere.statut, 'promue')
+        self.assertEqual(premiere.reservation.user, self.attente)
+        self.assertEqual(premiere.reservation.status, 'en_attente')
+        self.assertEqual(concurrente.statut, 'en_attente')
+        self.assertEqual(trop_longue.statut, 'en_attente')
+
+
+class ModerationTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reservations = [self.reserver(time(8 + i, 0)) for i in range(5)]
+        self.reservations[0].status = 'annulee'
+        self.reservations[0].save()
+
+    def test_validation_groupee_ne_touche_que_les_reservations_en_attente(self):
+        compteurs = moderer(Reservation.objects.filter(espace=self.espace), 'valider', taille_lot=2)
+
+        self.assertEqual(compteurs, {'modifiees': 4, 'notifiees': 4})
+        # Mis en file, rien n'est envoyé pendant la requête
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailSortant.objects.filter(sujet__startswith="✓ Réservation validée").count(), 4)
+        statuts = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual(statuts[self.reservations[0].id], 'annulee')
+        self.assertEqual(sorted(statuts.values()).count('validee'), 4)
+
+
+class ExpirationTests(ReservationTestCase):
+    def test_les_reservations_passees_en_attente_sont_expirees(self):
+        hier = date.today() - timedelta(days=1)
+        passee = self.reserver(time(9, 0), 2, jour=hier)
+        validee = self.reserver(time(14, 0), jour=hier, status='validee')
+        future = self.reserver(time(9, 0), jour=date.today() + timedelta(days=1))
+
+        self.assertEqual(expirer_reservations_passees(taille_lot=1), 1)
+        statuts = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual(statuts[passee.id], 'expiree')
+        self.assertEqual(statuts[validee.id], 'validee')
+        self.assertEqual(statuts[future.id], 'en_attente')
+        self.assertEqual(DisponibiliteJour.objects.get(espace=self.espace, date=hier).creneaux, masque_plage(time(14, 0), time(15, 0)))
+
+
+class BlocagesTests(ReservationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.echu = timezone.now() - timedelta(minutes=1)
+
+    def masque(self):
+        return DisponibiliteJour.objects.get(espace=self.espace, date=self.jour).creneaux
+
+    def test_blocage_echu_ne_bloque_plus_le_creneau(self):
+        bloquee = reserver(self.user, self.espace, self.jour, time(9, 0), 1)
+        self.assertFalse(est_disponible(self.espace, self.jour, time(9, 0), 1))
+        Reservation.objects.filter(id=bloquee.id).update(expire_le=self.echu)
+        self.assertTrue(est_disponible(self.espace, self.jour, time(9, 0), 1))
+
+        # Repris par un autre client avant le balayage : l'ancien blocage est expiré au passage
+        reprise = reserver(self.user, self.espace, self.jour, time(9, 0), 1)
+        bloquee.refresh_from_db()
+        self.assertEqual(bloquee.status, 'expiree')
+        self.assertEqual(reprise.status, 'en_attente')
+
+    def test_balayage_ne_libere_que_les_blocages_echus(self):
+        en_cours = self.reserver(time(10, 0), expire_le=timezone.now() + timedelta(minutes=10))
+        # Paiement capturé ou réservation validée : expire_le ne compte plus
+        payee = self.reserver(time(11, 0), status='confirmee', paid=True, expire_le=self.echu)
+        validee = self.reserver(time(12, 0), status='validee', expire_le=self.echu)
+        echue = self.reserver(time(9, 0), expire_le=timezone.now() + timedelta(minutes=10))
+        # Échéance dépassée sans écriture : le masque de la journée la compte encore
+        Reservation.objects.filter(id=echue.id).update(expire_le=self.echu)
+        self.assertEqual(list(blocages_expires()), [echue])
+        self.assertEqual(self.masque(), masque_plage(time(9, 0), time(13, 0)))
+
+        self.assertEqual(liberer_blocages_expires(taille_lot=1), 1)
+        statuts = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual(statuts, {echue.id: 'expiree', en_cours.id: 'en_attente',
+                                   payee.id: 'confirmee', validee.id: 'validee'})
+        self.assertEqual(self.masque(), masque_plage(time(10, 0), time(13, 0)))
+
+    def test_commande_expirer_reservations(self):
+        self.reserver(time(10, 0), status='confirmee', paid=True, expire_le=self.echu)
+        self.reserver(time(9, 0), expire_le=timezone.now() + timedelta(minutes=10))
+        Reservation.objects.filter(heure_debut=time(9, 0)).update(expire_le=self.echu)
+        sortie = io.StringIO()
+        call_command('expirer_reservations', stdout=sortie)
+        self.assertIn("1 blocage(s) expiré(s) libéré(s)", sortie.getvalue())
+        self.assertEqual(self.masque(), masque_plage(time(10, 0), time(11, 0)))
+        self.assertEqual(liberer_blocages_expires(), 0)
+
+
+class RechercheTests(TestCase):
+    def setUp(self):
+        self.salle = creer_espace("Salle Réunion Besançon", ville="Besançon", equipements="Projecteur, Wi-Fi")
+        self.studio = creer_espace(
+            "Studio", type_espace='studio', capacite=4, ville="Lyon", prix_par_heure=30,
+            description="Idéal pour une réunion en petit comité.",
+        )
+
+    def resultats(self, texte):
+        return list(rechercher(Espace.objects.all(), texte).order_by('pertinence').values_list('id', flat=True))
+
+    def test_accents_prefixes_et_classement(self):
+        self.assertEqual(self.resultats("besancon"), [self.salle.id])
+        self.assertEqual(self.resultats("proj"), [self.salle.id])
+        self.assertEqual(self.resultats("réunion"), [self.salle.id, self.studio.id])
+
+    def test_index_suit_les_modifications(self):
+        self.studio.ville = "Orléans"
+        self.studio.save()
+        self.assertEqual(self.resultats("orleans"), [self.studio.id])
+        self.studio.delete()
+        self.assertEqual(self.resultats("orleans"), [])
+
+
+class EquipementsTests(TestCase):
+    def setUp(self):
+        self.complet = creer_espace(equipements="Projecteur, Tableau blanc, Wi-Fi")
+        self.partiel = creer_espace("Salle B", equipements="projecteur ,Wi-fi")
+
+    def test_etiquettes_normalisees_et_filtre_et(self):
+        self.assertEqual(Equipement.objects.count(), 3)
+        self.assertEqual(
+            set(filtrer_equipements(Espace.objects.all(), ['projecteur', 'wi-fi'])),
+            {self.complet, self.partiel},
+        )
+        self.assertEqual(list(filtrer_equipements(Espace.objects.all(), ['projecteur', 'tableau-blanc'])), [self.complet])
+        self.assertEqual(list(filtrer_equipements(Espace.objects.all(), ['inconnu'])), [])
+
+    def test_liste_prechargee_suit_le_texte(self):
+        self.partiel.equipements = "Café"
+        self.partiel.save()
+        with self.assertNumQueries(2):
+            espaces = {e.nom: [eq.nom for eq in e.equipements_list] for e in avec_equipements(Espace.objects.all())}
+        self.assertEqual(espaces, {"Salle A": ["Projecteur", "Tableau blanc", "Wi-Fi"], "Salle B": ["Café"]})
+
+
+class FacettesTests(TestCase):
+    def setUp(self):
+        antememoire().clear()
+        for ville, type_espace, prix, capacite in [
+            ("Lille", 'reunion', 15, 4), ("Lille", 'studio', 60, 10), ("Lyon", 'reunion', 30, 10),
+        ]:
+            creer_espace(f"{ville} {type_espace}", type_espace=type_espace, capacite=capacite, ville=ville, prix_par_heure=prix)
+
+    def test_comptes_en_une_requete_et_invalidation(self):
+        filtres = normaliser_filtres(QueryDict('type_espace=reunion'))
+        with self.assertNumQueries(1):
+            resultat = facettes(filtres)
+        self.assertEqual(resultat['ville'], [("Lille", "Lille", 1), ("Lyon", "Lyon", 1)])
+        self.assertEqual([(code, nb) for code, _, nb in resultat['prix']], [('moins-20', 1), ('20-50', 1)])
+        self.assertEqual([(code, nb) for code, _, nb in resultat['capacite']], [('1-5', 1), ('6-15', 1)])
+
+        with self.assertNumQueries(0):
+            facettes(normaliser_filtres(QueryDict('type_espace=reunion&q=')))
+
+        creer_espace("Lyon 2", capacite=80, ville="Lyon", prix_par_heure=150)
+        self.assertEqual(facettes(filtres)['ville'], [("Lyon", "Lyon", 2), ("Lille", "Lille", 1)])
+
+
+class GeoTests(TestCase):
+    def test_rayon_et_tri_par_distance(self):
+        paris = creer_espace("A", ville="Paris")
+        versailles = creer_espace("B", ville="versailles")
+        creer_espace("C")
+        inconnue = creer_espace("D", ville="Atlantide")
+        self.assertIsNotNone(paris.cellule)
+        self.assertIsNone(inconnue.latitude)
+
+        filtres = normaliser_filtres(QueryDict('pres_de=Boulogne-Billancourt&rayon=25'))
+        proches = list(filtrer_espaces(filtres).order_by('distance'))
+        self.assertEqual(proches, [paris, versailles])
+        self.assertAlmostEqual(proches[0].distance, distance_km(48.8397, 2.2399, 48.8566, 2.3522), places=3)
+
+        versailles.ville = "Lille"
+        versailles.save()
+        self.assertEqual(list(filtrer_espaces(filtres)), [paris])
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        # Prix et capacités répétés : l'id doit départager les ex aequo
+        for i in range(23):
+            creer_espace(
+                f"Salle {i}", capacite=4 + i % 3, ville="Paris", prix_par_heure=10 + i % 4,
+                description="réunion" + " calme" * (i % 5),
+            )
+
+    def parcourir(self, espaces, tri, taille=5):
+        vus, curseur = [], None
+        while True:
+            page, curseur = paginer(espaces, tri, curseur, taille)
+            vus += [e.id for e in page]
+            if not curseur:
+                return vus
+
+    def test_parcours_complet_sans_doublon_pour_chaque_tri(self):
+        espaces = Espace.objects.all()
+        attendus = {
+            'prix_asc': list(espaces.order_by('prix_par_heure', 'id').values_list('id', flat=True)),
+            'prix_desc': list(espaces.order_by('-prix_par_heure', '-id').values_list('id', flat=True)),
+            'capacite': list(espaces.order_by('-capacite', '-id').values_list('id', flat=True)),
+        }
+        for tri, ids in attendus.items():
+            self.assertEqual(self.parcourir(espaces, tri), ids, tri)
+        recherche = rechercher(Espace.objects.all(), "reunion calme")
+        self.assertEqual(
+            self.parcourir(recherche, 'pertinence', taille=3),
+            list(recherche.order_by('pertinence', 'id').values_list('id', flat=True)),
+        )
+        self.assertEqual(set(TRIS) - set(attendus), {'defaut', 'distance', 'pertinence'})
+
+    def test_api_et_curseur_invalide(self):
+        client = self.client
+        data = client.get('/api/espaces/', {'tri': 'prix_desc', 'taille': 20}).json()
+        self.assertEqual(len(data['espaces']), 20)
+        suite = client.get(data['api_suivant']).json()
+        self.assertEqual(len(suite['espaces']), 3)
+        self.assertIsNone(suite['curseur'])
+        self.assertFalse({e['id'] for e in data['espaces']} & {e['id'] for e in suite['espaces']})
+        # Un curseur d'un autre tri est refusé
+        self.assertEqual(client.get('/api/espaces/', {'tri': 'capacite', 'curseur': data['curseur']}).status_code, 400)
+
+
+class CacheCatalogueTests(TestCase):
+    def setUp(self):
+        antememoire().clear()
+        remettre_a_zero()
+        self.espace = creer_espace("Salle", ville="Paris", image='espaces/salle.jpg')
+
+    def test_detail_en_cache_et_invalide_par_les_signaux(self):
+        url = f'/espace/{self.espace.id}/'
+        self.assertContains(self.client.get(url), "Salle")
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        EspaceImage.objects.create(espace=self.espace, image='espaces/salle-2.jpg')
+        self.assertContains(self.client.get(url), "espaces/salle-2.jpg")
+        self.espace.nom = "Salle rénovée"
+        self.espace.save()
+        self.assertContains(self.client.get(url), "Salle rénovée")
+        # Deux lectures par page : l'espace et ses espaces similaires
+        stats = statistiques()
+        self.assertEqual((stats['hit'], stats['miss']), (2, 6))
+
+    def test_une_seule_reconstruction_pour_des_lectures_concurrentes(self):
+        appels = []
+
+        def construire():
+            appels.append(1)
+            chrono.sleep(0.05)
+            return 42
+
+        resultats = []
+        threads = [threading.Thread(target=lambda: resultats.append(lire('lent', construire))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(resultats, [42] * 8)
+        self.assertEqual(len(appels), 1)
+
+
+class SimilaritesTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = (creer_espace(nom, ville="Paris") for nom in "ABCD")
+        self.users = [creer_client(f"u{i}") for i in range(3)]
+        for user, espaces in zip(self.users, [(self.a, self.b), (self.a, self.b, self.c), (self.c, self.d)]):
+            for espace in espaces:
+                Favori.objects.create(user=user, espace=espace)
+
+    def test_voisins_classes_et_rafraichissement_incremental(self):
+        calculer_similarites(moteur='python')
+        self.assertEqual(espaces_similaires(self.a.id), [self.b, self.c])
+        self.assertEqual(espaces_similaires(self.d.id), [self.c])
+
+        Favori.objects.create(user=self.users[2], espace=self.a)
+        resume = calculer_similarites(incremental=True, moteur='python')
+        self.assertEqual(resume['espaces'], 3)
+        self.assertIn(self.d, espaces_similaires(self.a.id))
+
+    def test_reservations_payees_retenues(self):
+        jour = date.today() + timedelta(days=5)
+        client = creer_client("payeur")
+        for i, (espace, statut) in enumerate([(self.b, 'confirmee'), (self.d, 'confirmee'), (self.c, 'annulee')]):
+            Reservation.objects.create(user=client, espace=espace, date=jour, heure_debut=time(9 + i, 0),
+                                       duree_heures=1, status=statut, paid=statut == 'confirmee')
+        calculer_similarites(moteur='python')
+        self.assertIn(self.d, espaces_similaires(self.b.id))
+        retenus = {espace_id for user_id, espace_id, _ in similarites.interactions() if user_id == client.id}
+        self.assertEqual(retenus, {self.b.id, self.d.id})
+
+    @skipUnless(similarites.np is not None, "NumPy/SciPy non installés")
+    def test_numpy_et_python_concordent(self):
+        lignes = list(similarites.interactions())
+        par_numpy = similarites.voisins_numpy(lignes)
+        par_python = similarites.voisins_python(lignes)
+        self.assertEqual({e: [v for v, _ in l] for e, l in par_numpy.items()},
+                         {e: [v for v, _ in l] for e, l in par_python.items()})
+
+
+class SessionsActivesTests(TestCase):
+    def setUp(self):
+        self.user = creer_client()
+        sessions_actives.oublier(['cle-1'])
+        # Heures laissées en attente par les requêtes des autres tests
+        sessions_actives.vider()
+
+    def test_ecriture_differee_puis_vidage_groupe(self):
+        debut = chrono.time()
+        self.assertTrue(sessions_actives.enregistrer('cle-1', self.user, '💻 Linux', '10.0.0.1', debut))
+        ecrite = ActiveSession.objects.get(session_key='cle-1').last_activity
+
+        with self.assertNumQueries(0):
+            self.assertFalse(sessions_actives.enregistrer('cle-1', self.user, '💻 Linux', '10.0.0.1', debut + 60))
+        with self.assertNumQueries(1):
+            self.assertEqual(sessions_actives.vider(), 1)
+        self.assertGreater(ActiveSession.objects.get(session_key='cle-1').last_activity, ecrite)
+
+        # Changement d'adresse IP : écriture immédiate
+        self.assertTrue(sessions_actives.enregistrer('cle-1', self.user, '💻 Linux', '10.0.0.2', debut + 61))
+        self.assertEqual(ActiveSession.objects.get(session_key='cle-1').ip_address, '10.0.0.2')
+
+    def session(self, expire_dans=timedelta(days=1)):
+        store = SessionStore()
+        store.set_expiry(expire_dans)
+        store.create()
+        return ActiveSession.objects.create(user=self.user, session_key=store.session_key)
+
+    def test_revocation_en_deux_suppressions(self):
+        gardee = self.session()
+        revoquees = [self.session() for _ in range(3)]
+        ActiveSession.objects.create(user=creer_client("autre"), session_key='cle-autre')
+        # Une heure d'activité en attente pour une session révoquée
+        debut = chrono.time()
+        cle = revoquees[0].session_key
+        sessions_actives.enregistrer(cle, self.user, '💻 Linux', '10.0.0.1', debut)
+        sessions_actives.enregistrer(cle, self.user, '💻 Linux', '10.0.0.1', debut + 60)
+
+        sessions = ActiveSession.objects.filter(user=self.user).exclude(pk=gardee.pk)
+        with self.assertNumQueries(4):  # deux DELETE dans leur point de sauvegarde
+            self.assertEqual(sessions_actives.revoquer(sessions), 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [gardee.session_key])
+        self.assertEqual(ActiveSession.objects.count(), 2)
+        self.assertIsNone(sessions_actives.antememoire().get(sessions_actives.cle(cle)))
+        self.assertEqual(sessions_actives.vider(), 0)
+
+    def test_purge_par_lots(self):
+        vivante = self.session()
+        expirees = [self.session(expire_dans=-60) for _ in range(5)]
+        ActiveSession.objects.create(user=self.user, session_key='sans-session')
+
+        self.assertEqual(sessions_actives.purger_sessions_expirees(taille_lot=2), 5)
+        self.assertEqual(sessions_actives.purger_sessions_orphelines(taille_lot=2), 6)
+        self.assertEqual(list(ActiveSession.objects.all()), [vivante])
+        self.assertFalse(Session.objects.filter(session_key__in=[s.session_key for s in expirees]).exists())
+
+
+class AgentsTests(TestCase):
+    def test_classification(self):
+        chrome = classer(
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        )
+        self.assertEqual((chrome.navigateur, chrome.version_navigateur), ('Chrome', '120'))
+        self.assertEqual((chrome.systeme, chrome.version_systeme), ('Windows', '10/11'))
+        self.assertFalse(chrome.mobile)
+
+        iphone = classer(
+            "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 "
+            "(KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1"
+        )
+        self.assertEqual(iphone.libelle, '📱 Safari 17 · iOS 17.2')
+        self.assertTrue(iphone.mobile)
+        self.assertTrue(classer("Googlebot/2.1 (+http://www.google.com/bot.html)").robot)
+        self.assertEqual(classer('').libelle, '💻 Navigateur')
+
+    def test_chaine_connue_lue_dans_le_cache(self):
+        user_agent = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+        classer(user_agent)
+        succes = statistiques_cache().hits
+        self.assertIs(classer(user_agent), classer(user_agent))
+        self.assertEqual(statistiques_cache().hits, succes + 2)
+
+
+class BoiteEnvoiTests(TestCase):
+    def test_annulation_met_en_file_sans_envoyer(self):
+        user = creer_client()
+        reservation = Reservation.objects.create(
+            user=user, espace=creer_espace(), date=date.today() + timedelta(days=5), heure_debut=time(9, 0), duree_heures=1
+        )
+        self.client.force_login(user)
+        self.client.post(reverse('cancel_reservation', args=[reservation.id]))
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailSortant.objects.get().destinataires, "client@exemple.fr")
+        self.assertEqual(boite_envoi.envoyer_en_attente(), {'envoyes': 1, 'echecs': 0})
+        self.assertEqual(mail.outbox[0].to, ["client@exemple.fr"])
+        self.assertEqual(EmailSortant.objects.get().statut, 'envoye')
+
+    def test_connexion_reutilisee_et_reprise_apres_echec(self):
+        for i in range(5):
+            boite_envoi.mettre_en_file(f"Message {i}", "Bonjour", [f"client{i}@exemple.fr"])
+
+        with ServeurSMTPLocal() as serveur, self.settings(**serveur.reglages()):
+            serveur.a_refuser = 1
+            self.assertEqual(boite_envoi.envoyer_en_attente(taille_lot=2), {'envoyes': 4, 'echecs': 1})
+            self.assertEqual((serveur.connexions, serveur.messages), (1, 4))
+
+            refuse = EmailSortant.objects.get(statut='en_attente')
+            self.assertEqual(refuse.tentatives, 1)
+            self.assertGreater(refuse.prochain_essai, timezone.now())
+            self.assertEqual(boite_envoi.envoyer_en_attente(), {'envoyes': 0, 'echecs': 0})
+
+            EmailSortant.objects.filter(pk=refuse.pk).update(prochain_essai=timezone.now())
+            self.assertEqual(boite_envoi.envoyer_en_attente(), {'envoyes': 1, 'echecs': 0})
+            self.assertEqual(serveur.messages, 5)
+
+
+class RappelsTests(ReservationTestCase):
+    def reserver_dans(self, dans, status='validee'):
+        debut = timezone.localtime() + dans
+        return self.reserver(debut.time().replace(second=0, microsecond=0), jour=debut.date(), status=status)
+
+    def test_rappels_une_seule_fois(self):
+        proche = self.reserver_dans(timedelta(hours=3))
+        self.reserver_dans(timedelta(hours=30))
+        self.reserver_dans(timedelta(hours=5), status='annulee')
+        self.reserver_dans(-timedelta(hours=2))
+
+        self.assertEqual(envoyer_rappels(heures=24), 1)
+        self.assertEqual(envoyer_rappels(heures=24), 0)
+        email = EmailSortant.objects.get()
+        self.assertIn("Salle A", email.sujet)
+        self.assertEqual(email.destinataires, "client@exemple.fr")
+        proche.refresh_from_db()
+        self.assertIsNotNone(proche.rappel_envoye_le)
+
+    def test_recapitulatif_par_administrateur(self):
+        creer_client("admin", is_staff=True)
+        self.reserver_dans(timedelta(days=2), status='en_attente')
+        hier = timezone.localdate() - timedelta(days=1)
+        Reservation.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(envoyer_recapitulatifs(hier), 1)
+        self.assertEqual(envoyer_recapitulatifs(hier), 0)
+        email = EmailSortant.objects.get()
+        self.assertEqual(email.destinataires, "admin@exemple.fr")
+        self.assertIn("1 nouvelle(s), 1 en attente", email.sujet)
+
+
+class PaiementTestCase(ReservationTestCase):
+    """Une réservation de 40 € en attente de paiement, son client connecté."""
+
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reserver(
+            time(9, 0), 2, prix_total=40, expire_le=timezone.now() + timedelta(minutes=30),
+        )
+        self.client.force_login(self.user)
+        # Passerelle factice neuve : ses compteurs d'appels sont propres au test
+        paiements.passerelle.cache_clear()
+
+
+@override_settings(PAIEMENT_PASSERELLE_OPTIONS={'latence': 0, 'taux_echec': 0})
+class PaiementsTests(PaiementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.carte = PaymentCard.objects.create(user=self.user, name="Client", last_four="4242", type='Visa', expiry="12/30")
+
+    def payer(self, **donnees):
+        return self.client.post(reverse('process_payment', args=[self.reservation.id]), donnees)
+
+    @override_settings(PAIEMENT_ASYNCHRONE=False)
+    def test_paiement_synchrone_avec_nouvelle_carte(self):
+        self.payer(payment_method='new_card', card_name="Client", card_number="5555 5555 5555 4444",
+                   expiry="01/31", cvv="123", save_card='on', cle_idempotence="cle-1")
+
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmee')
+        self.assertTrue(self.reservation.paid)
+        self.assertEqual(self.reservation.tentatives_paiement.get().statut, 'capturee')
+        self.assertTrue(PaymentCard.objects.filter(user=self.user, last_four="4444").exists())
+        self.assertEqual(EmailSortant.objects.get().sujet, "✓ Réservation confirmée - Salle A")
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_paiement_differe_puis_capture(self):
+        reponse = self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-1")
+        self.assertRedirects(reponse, reverse('reservation_detail', args=[self.reservation.id]))
+        tentative = TentativePaiement.objects.get()
+        self.assertEqual(tentative.statut, 'initiee')
+        self.assertTrue(self.client.get(reponse.url).context['paiement_en_cours'])
+        # Un envoi avec une autre clé se replie sur le paiement en cours
+        self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-2")
+        self.assertEqual(TentativePaiement.objects.count(), 1)
+
+        # Ce que fait le pool de threads après le commit
+        carte = paiements.Carte("Client", 'Visa', "4242", "12/30")
+        self.assertEqual(paiements.executer(tentative.id, carte), 'capturee')
+        self.assertEqual(paiements.executer(tentative.id, carte), 'capturee')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmee')
+        self.assertEqual(self.reservation.payment_method, "Visa •••• 4242")
+        self.assertEqual(paiements.passerelle().appels, {'autoriser': 1, 'capturer': 1})
+        self.assertEqual(EmailSortant.objects.count(), 1)
+
+    @override_settings(PAIEMENT_ASYNCHRONE=False)
+    def test_formulaire_renvoye_apres_paiement(self):
+        self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-1")
+        reponse = self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-1")
+
+        self.assertRedirects(reponse, reverse('reservation_detail', args=[self.reservation.id]))
+        self.assertEqual(TentativePaiement.objects.get().statut, 'capturee')
+        self.assertEqual(paiements.passerelle().appels['autoriser'], 1)
+        self.assertEqual(EmailSortant.objects.count(), 1)
+
+    def test_meme_cle_un_seul_debit(self):
+        for _ in range(2):
+            self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-1")
+        tentative = TentativePaiement.objects.get()
+        # Les deux tâches lancées par le pool pour la même tentative
+        carte = paiements.Carte("Client", 'Visa', "4242", "12/30")
+        for _ in range(2):
+            paiements.executer(tentative.id, carte)
+
+        self.assertEqual(TentativePaiement.objects.get().statut, 'capturee')
+        self.assertEqual(paiements.passerelle().appels, {'autoriser': 1, 'capturer': 1})
+        self.assertEqual(list(EcriturePaiement.objects.values_list('nature', 'montant')), [('paiement', 40)])
+        self.assertEqual(EmailSortant.objects.count(), 1)
+
+    def test_reservation_expiree_avant_autorisation(self):
+        tentative = TentativePaiement.objects.create(
+            reservation=self.reservation, cle_idempotence="cle-1", montant=40, moyen="Visa •••• 4242",
+        )
+        Reservation.objects.filter(id=self.reservation.id).update(status='expiree')
+
+        statut = paiements.executer(tentative.id, paiements.Carte("Client", 'Visa', "4242", "12/30"))
+        self.assertEqual(statut, 'echouee')
+        self.assertEqual(paiements.passerelle().appels, {'autoriser': 1, 'annuler': 1})
+        self.reservation.refresh_from_db()
+        self.assertFalse(self.reservation.paid)
+
+    @override_settings(PAIEMENT_ASYNCHRONE=False)
+    def test_annulation_entre_autorisation_et_capture(self):
+        capturer = paiements.PasserelleFactice.capturer
+
+        def annuler_puis_capturer(passerelle, reference):
+            self.client.post(reverse('cancel_reservation', args=[self.reservation.id]))
+            return capturer(passerelle, reference)
+
+        with mock.patch.object(paiements.PasserelleFactice, 'capturer', annuler_puis_capturer):
+            self.payer(payment_method='existing_card', card_id=self.carte.id, cle_idempotence="cle-1")
+
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'annulee')
+        self.assertFalse(self.reservation.paid)
+        self.assertEqual(
+            sorted(EcriturePaiement.objects.values_list('nature', 'montant')),
+            [('paiement', 40), ('remboursement', -40)],
+        )
+        self.assertEqual(paiements.passerelle().appels, {'autoriser': 1, 'capturer': 1, 'rembourser': 1})
+        # Seul l'email d'annulation part
+        self.assertEqual(EmailSortant.objects.count(), 1)
+
+    def test_transition_invalide(self):
+        tentative = TentativePaiement.objects.create(
+            reservation=self.reservation, cle_idempotence="cle-1", montant=40, moyen="Visa •••• 4242",
+        )
+        with self.assertRaises(paiements.TransitionInvalide):
+            paiements.transition(tentative, 'capturee')
+
+
+@override_settings(PAIEMENT_ASYNCHRONE=False, PAIEMENT_PASSERELLE_OPTIONS={'latence': 0.01, 'taux_echec': 0})
+class PaiementsSimultanesTests(TransactionTestCase):
+    def setUp(self):
+        self.reservation = Reservation.objects.create(
+            user=creer_client(), espace=creer_espace(), date=date.today() + timedelta(days=10), heure_debut=time(9, 0),
+            duree_heures=2, prix_total=40, expire_le=timezone.now() + timedelta(minutes=30),
+        )
+        paiements.passerelle.cache_clear()
+
+    def payer_ensemble(self, cles):
+        carte = paiements.Carte("Client", 'Visa', "4242", "12/30")
+        depart = threading.Barrier(len(cles))
+
+        def payer(cle):
+            depart.wait()
+            try:
+                paiements.lancer_paiement(self.reservation, carte, cle)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=payer, args=(cle,)) for cle in cles]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def verifier_un_seul_debit(self):
+        self.assertEqual(paiements.passerelle().appels, {'autoriser': 1, 'capturer': 1})
+        self.assertEqual(TentativePaiement.objects.filter(statut='capturee').count(), 1)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmee')
+        self.assertTrue(self.reservation.paid)
+        self.assertEqual(EmailSortant.objects.count(), 1)
+
+    def test_envois_simultanes_meme_cle(self):
+        self.payer_ensemble(["cle-1"] * 6)
+        self.assertEqual(TentativePaiement.objects.count(), 1)
+        self.verifier_un_seul_debit()
+
+    def test_envois_simultanes_cles_differentes(self):
+        self.payer_ensemble([f"cle-{i}" for i in range(6)])
+        self.verifier_un_seul_debit()
+
+
+@override_settings(PAIEMENT_ASYNCHRONE=False, PAIEMENT_PASSERELLE_OPTIONS={'latence': 0, 'taux_echec': 0})
+class JournalPaiementsTests(PaiementTestCase):
+    def releve(self, lignes):
+        return io.StringIO("reference;date;montant\n" + "".join(f"{l}\n" for l in lignes))
+
+    def test_paiement_puis_annulation_rapproches(self):
+        paiements.lancer_paiement(self.reservation, paiements.Carte("Client", 'Visa', "4242", "12/30"), "cle-1")
+        self.client.post(reverse('cancel_reservation', args=[self.reservation.id]))
+        self.client.post(reverse('cancel_reservation', args=[self.reservation.id]))
+
+        self.assertEqual(
+            sorted(EcriturePaiement.objects.values_list('nature', 'montant')),
+            [('paiement', 40), ('remboursement', -40)],
+        )
+        self.assertEqual(paiements.passerelle().appels['rembourser'], 1)
+        fichier = io.StringIO()
+        journal_paiements.ecrire_releve(fichier, paiements.passerelle().releve())
+        fichier.seek(0)
+        ecarts = journal_paiements.rapprocher(
+            journal_paiements.soldes_journal(), journal_paiements.soldes_releve(fichier),
+        )
+        self.assertEqual(list(ecarts), [])
+
+        ecriture = EcriturePaiement.objects.first()
+        with self.assertRaises(ValueError):
+            ecriture.save()
+        with self.assertRaises(ValueError):
+            EcriturePaiement.objects.update(montant=0)
+
+    def test_ecarts(self):
+        for reference, montant in (("A", 40), ("B", 20), ("C", 30)):
+            journal_paiements.inscrire('paiement', self.reservation, montant, reference)
+        journal_paiements.inscrire('remboursement', self.reservation, -30, "C")
+        releve = self.releve(["B;2026-01-02;20", "C;2026-01-02;30", "C;2026-01-03;-25", "D;2026-01-02;10"])
+
+        ecarts = list(journal_paiements.rapprocher(
+            journal_paiements.soldes_journal(taille_paquet=2), journal_paiements.soldes_releve(releve),
+        ))
+        self.assertEqual(ecarts, [
+            journal_paiements.Ecart("A", 'absente_du_releve', montant_journal=40),
+            journal_paiements.Ecart("C", 'montant', 0, 5),
+            journal_paiements.Ecart("D", 'absente_du_journal', montant_releve=10),
+        ])
+        with self.assertRaises(journal_paiements.ReleveInvalide):
+            list(journal_paiements.soldes_releve(self.releve(["B;2026-01-02;20", "A;2026-01-02;40"])))
+
+    def test_references_en_ordre_binaire(self):
+        # Une collation insensible à la casse ou aux accents intercalerait « b » entre « B » et « C »
+        for reference in ("b", "C", "B", "é", "a-2", "Z"):
+            journal_paiements.inscrire('paiement', self.reservation, 10, reference)
+        self.assertEqual([r for r, _ in journal_paiements.soldes_journal(taille_paquet=2)], ["B", "C", "Z", "a-2", "b", "é"])
+
+        releve = self.releve(["A;2026-01-02;10", "B;2026-01-02;10", "C;2026-01-02;10", "a-1;2026-01-02;10",
+                              "b;2026-01-02;10", "e;2026-01-02;10", "é;2026-01-02;12"])
+        ecarts = list(journal_paiements.rapprocher(
+            journal_paiements.soldes_journal(taille_paquet=2), journal_paiements.soldes_releve(releve),
+        ))
+        self.assertEqual(ecarts, [
+            journal_paiements.Ecart("A", 'absente_du_journal', montant_releve=10),
+            journal_paiements.Ecart("Z", 'absente_du_releve', montant_journal=10),
+            journal_paiements.Ecart("a-1", 'absente_du_journal', montant_releve=10),
+            journal_paiements.Ecart("a-2", 'absente_du_releve', montant_journal=10),
+            journal_paiements.Ecart("e", 'absente_du_journal', montant_releve=10),
+            journal_paiements.Ecart("é", 'montant', 10, 12),
+        ])
+
+        # Base triant sans tenir compte de la casse : l'ordre est refusé au lieu de fausser la fusion
+        with mock.patch.dict(journal_paiements.COLLATIONS_BINAIRES, {'sqlite': 'NOCASE'}):
+            with self.assertRaises(journal_paiements.JournalMalTrie):
+                list(journal_paiements.soldes_journal())
+
+
+class StatistiquesTests(ReservationTestCase):
+    def reserver_payee(self, heure, duree, prix, **champs):
+        return self.reserver(heure, duree, prix_total=prix, **{'status': 'confirmee', 'paid': True, **champs})
+
+    def faits(self):
+        return sorted(StatistiqueJour.objects.filter(espace=self.espace).exclude(
+            reservations=0, minutes=0, annulations=0,
+        ).values_list('date', 'reservations', 'chiffre_affaires', 'minutes', 'annulations'))
+
+    def test_mise_a_jour_incrementale_egale_reconstruction(self):
+        self.reserver_payee(time(9, 0), 2, 40)
+        # Passe minuit : 2 h comptées sur chacun des deux jours
+        self.reserver_payee(time(22, 0), 4, 80)
+        annulee = self.reserver_payee(time(13, 0), 1, 20)
+        annulee.status = 'annulee'
+        annulee.save()
+        changer_statut(Reservation.objects.filter(id=self.reserver_payee(time(15, 0), 1, 20).id), 'expiree')
+        self.reserver_payee(time(17, 0), 1, 20).delete()
+        # Non payées : le créneau est occupé, le chiffre d'affaires inchangé
+        self.reserver(time(19, 0), prix_total=20, status='validee')
+        en_attente = self.reserver(time(20, 0), prix_total=20)
+
+        attendus = [
+            (self.jour, 4, 120, 360, 1),
+            (self.jour + timedelta(days=1), 0, 0, 120, 0),
+        ]
+        self.assertEqual(self.faits(), attendus)
+        reconstruire_statistiques()
+        self.assertEqual(self.faits(), attendus)
+
+        # La capture du paiement ajoute la réservation au chiffre d'affaires du jour
+        tentative = TentativePaiement.objects.create(
+            reservation=en_attente, cle_idempotence="cle-1", montant=20, moyen="Visa •••• 4242",
+        )
+        with self.settings(PAIEMENT_PASSERELLE_OPTIONS={'latence': 0, 'taux_echec': 0}):
+            paiements.executer(tentative.id, paiements.Carte("Client", 'Visa', "4242", "12/30"))
+        self.assertEqual(self.faits()[0], (self.jour, 4, 140, 360, 1))
+
+    def test_page_statistiques(self):
+        self.reserver_payee(time(9, 0), 6, 120)
+        self.reserver_payee(time(14, 0), 1, 20).delete()
+        admin = creer_client("admin", is_staff=True)
+        self.client.force_login(admin)
+
+        reponse = self.client.get(reverse('admin_interface:statistiques'), {
+            'debut': self.jour.isoformat(), 'fin': (self.jour + timedelta(days=1)).isoformat(),
+        })
+        totaux = reponse.context['totaux']
+        self.assertEqual(totaux['chiffre_affaires'], 120)
+        self.assertEqual(totaux['taux_occupation'], 12.5)
+        self.assertEqual(reponse.context['graphiques']['chiffre_affaires'], [120.0, 0.0])
+        # Lu dans la table de faits, quelle que soit la longueur de la période
+        with self.assertNumQueries(3):
+            periode = statistiques_periode(self.jour - timedelta(days=365), self.jour)
+        self.assertEqual(periode['occupation'][0]['taux'], 100 * 360 / (366 * 1440))
+
+    def test_periode_bornee(self):
+        self.client.force_login(creer_client("admin", is_staff=True))
+        aujourd_hui = timezone.localdate()
+
+        def periode(**bornes):
+            reponse = self.client.get(reverse('admin_interface:statistiques'), bornes)
+            self.assertEqual(reponse.status_code, 200)
+            return reponse.context['debut'], reponse.context['fin']
+
+        # Dates hors limites, invalides ou inversées : les 30 derniers jours
+        defaut = (aujourd_hui - timedelta(days=29), aujourd_hui)
+        self.assertEqual(periode(fin='0001-01-10'), defaut)
+        self.assertEqual(periode(debut='2030-02-30'), defaut)
+        self.assertEqual(periode(debut='2030-03-01', fin='2030-02-01'), defaut)
+        # Une période trop longue est ramenée à ses 366 derniers jours
+        self.assertEqual(periode(debut='0001-01-01', fin='9999-12-31'), (date(9998, 12, 31), date(9999, 12, 31)))
+        self.assertEqual(
+            len(self.client.get(reverse('admin_interface:statistiques'), {'debut': '0001-01-01'}).context['graphiques']['jours']),
+            366,
+        )
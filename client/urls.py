@@ -6,7 +6,9 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('', views.accueil, name='accueil'),
     path('espace/<int:espace_id>/', views.detail_espace, name='detail_espace'),
+    path('espace/<int:espace_id>/disponibilites/<int:annee>/<int:mois>/', views.disponibilites_mois, name='disponibilites_mois'),
     path('espaces/categorie/<str:categorie>/', views.espaces_par_categorie, name='espaces_par_categorie'),
+    path('api/espaces/', views.api_espaces, name='api_espaces'),
 
 
     path("mon-compte/", views.mon_compte, name="mon_compte"),
@@ -27,6 +29,8 @@ urlpatterns = [
     path("mon-compte/payment-methods/default/<int:card_id>/", views.set_default_card, name="set_default_card"),
 
     path('reserver/<int:espace_id>/', views.reserver_espace, name='reserver_espace'),
+    path('reserver/<int:espace_id>/recurrente/', views.reservation_recurrente, name='reservation_recurrente'),
+    path('espace/<int:espace_id>/liste-attente/', views.rejoindre_liste_attente, name='rejoindre_liste_attente'),
 
     path('mes-reservations/', views.mes_reservations, name='mes_reservations'),
     path('reservation/<int:reservation_id>/', views.reservation_detail, name='reservation_detail'),
@@ -4,112 +4,184 @@ from django.contrib.auth import authenticate, login, logout, update_session_auth
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import User
-from django.contrib.sessions.models import Session
 from datetime import datetime, time, date
-from .models import Espace, Reservation, ActiveSession, PaymentCard, Favori
-from .forms import ReservationForm
+from .models import Espace, Reservation, ActiveSession, PaymentCard, Favori, DisponibiliteJour, ListeAttente, Equipement, TentativePaiement
+from .forms import ReservationForm, SerieReservationForm
+from .series import reserver_serie, SerieInvalide
+from .reservations import reserver, CreneauIndisponible, changer_statut, fin_blocage
+from .creneaux import MINUTES_PAR_CRENEAU, NB_CRENEAUX
+from .equipements import avec_equipements, equipements_frequents
+from .catalogue import normaliser_filtres, filtrer_espaces, cle_filtres, types_categorie, NOMS_CATEGORIES, RAYONS_PROPOSES
+from .pagination import paginer, choisir_tri, taille_demandee, CurseurInvalide, TAILLE_PAGE
+from .facettes import facettes, avec_liens, DUREE_CACHE as DUREE_CACHE_FACETTES
+from .cache_catalogue import lire
+from .similarites import espaces_similaires
+from .sessions_actives import vider as vider_sessions_actives, revoquer as revoquer_sessions
+from .agents import classer
+from .boite_envoi import mettre_en_file
+from .paiements import Carte, CleInvalide, lancer_paiement, nouvelle_cle, rembourser
 from django.db import transaction
-import random
+from django.db.models import Prefetch
 from django.utils import timezone
-from django.http import JsonResponse
-from client.utils import envoyer_email_confirmation_paiement
+from django.http import JsonResponse, Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+import calendar
+import hashlib
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from django.core.mail import send_mail
 from django.conf import settings
 
 
 # ---------------- Accueil ----------------
-def accueil(request):
+def page_espaces(request, filtres, taille, categorie=None, curseur_strict=False):
+    """
+    Page du catalogue désignée par les paramètres tri et curseur, lue dans le
+    cache du catalogue. Un curseur invalide ramène à la première page, sauf
+    avec curseur_strict où CurseurInvalide est propagée.
+    """
+    tri = choisir_tri(request.GET.get('tri'), filtres)
+    curseur = request.GET.get('curseur') or ''
+
+    def construire(curseur):
+        return paginer(avec_equipements(espaces_catalogue(filtres, categorie)), tri, curseur, taille)
+
+    cle = f"page:{categorie or ''}:{cle_filtres(filtres)}:{tri}:{taille}:"
+    timeout = DUREE_CACHE_FACETTES if 'date' in filtres else None
+    try:
+        return lire(cle + curseur, lambda: construire(curseur), timeout)
+    except CurseurInvalide:
+        if curseur_strict:
+            raise
+        return lire(cle, lambda: construire(None), timeout)
+
+
+def espaces_catalogue(filtres, categorie=None):
     espaces = Espace.objects.filter(disponible=True)
+    if categorie:
+        espaces = espaces.filter(type_espace__in=types_categorie(categorie))
+    return filtrer_espaces(filtres, espaces)
 
-    ville = request.GET.get('ville')
-    type_espace = request.GET.get('type_espace')
-    date_str = request.GET.get('date')
 
-    is_search = bool(ville or type_espace or date_str)
+def liens_suivants(request, suivant, **extra):
+    """Paramètres de la page suivante, pour la page HTML et pour l'API."""
+    if not suivant:
+        return {'suivant': None, 'suivant_api': None}
+    params = request.GET.copy()
+    params['curseur'] = suivant
+    api = params.copy()
+    for cle, valeur in extra.items():
+        api[cle] = valeur
+    return {'suivant': params.urlencode(), 'suivant_api': api.urlencode()}
 
-    if ville:
-        espaces = espaces.filter(ville__icontains=ville)
-    if type_espace:
-        espaces = espaces.filter(type_espace=type_espace)
-    if date_str:
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-            espaces = espaces.exclude(reservations__date=date_obj)
-        except ValueError:
-            pass
-
-    tri = request.GET.get('tri')
-    if tri == "prix_asc":
-        espaces = espaces.order_by('prix_par_heure')
-    elif tri == "prix_desc":
-        espaces = espaces.order_by('-prix_par_heure')
-    elif tri == "capacite":
-        espaces = espaces.order_by('-capacite')
-
-    if not is_search:
-        espaces = espaces[:6]
-    
-    for espace in espaces:
-        if espace.equipements:
-            espace.equipements_list = [eq.strip() for eq in espace.equipements.split(',') if eq.strip()]
-        else:
-            espace.equipements_list = []
+
+def accueil(request):
+    filtres = normaliser_filtres(request.GET)
+    equipements = filtres.get('equipements', [])
+
+    is_search = bool(filtres)
+    # Sans recherche, l'accueil ne montre qu'une vitrine de six espaces
+    espaces, suivant = page_espaces(request, filtres, TAILLE_PAGE if is_search else 6)
 
     favoris_ids = []
     if request.user.is_authenticated:
         favoris_ids = list(Favori.objects.filter(user=request.user).values_list('espace_id', flat=True))
 
+    resultat = facettes(filtres) if is_search else None
+    params = request.GET.copy()
+    params.pop('curseur', None)
+
     return render(request, "client/accueil.html", {
         "espaces": espaces,
+        **(liens_suivants(request, suivant) if is_search else {}),
+        # Total lu dans les facettes (en cache) plutôt que par un COUNT
+        "total": sum(nb for *_, nb in resultat['type_espace']) if resultat else len(espaces),
+        "facettes": avec_liens(resultat, params) if is_search else None,
+        "rayons": RAYONS_PROPOSES,
+        "equipements_filtres": equipements_frequents(),
+        "equipements_choisis": equipements,
         "favoris_ids": favoris_ids  
     })
 
 
 # ---------------- Espaces par catégorie ----------------
 def espaces_par_categorie(request, categorie):
-    categories_mapping = {
-        'reunion': ['reunion'],
-        'coworking': ['petite_salle', 'moyenne_salle','brainstorming','espace_detente'],  
-        'evenements': ['grande_salle','espace_formation','studio'],
-    }
-    
-    types_espaces = categories_mapping.get(categorie, [categorie])
-    espaces = Espace.objects.filter(disponible=True, type_espace__in=types_espaces)
-    
-    noms_categories = {
-        'reunion': 'Salles de réunion',
-        'coworking': 'Espaces coworking',
-        'evenements': 'Salles d\'événements',
-    }
-    
-    categorie_nom = noms_categories.get(categorie, categorie)
+    filtres = normaliser_filtres(request.GET)
+    # Le total n'est compté que pour la première page
+    total = None
+    if not request.GET.get('curseur'):
+        total = lire(
+            f"total:{categorie}:{cle_filtres(filtres)}",
+            lambda: espaces_catalogue(filtres, categorie).count(),
+            DUREE_CACHE_FACETTES if 'date' in filtres else None,
+        )
+    page, suivant = page_espaces(request, filtres, TAILLE_PAGE, categorie)
     
-    for espace in espaces:
-        if espace.equipements:
-            espace.equipements_list = [eq.strip() for eq in espace.equipements.split(',') if eq.strip()]
-        else:
-            espace.equipements_list = []
+    categorie_nom = NOMS_CATEGORIES.get(categorie, categorie)
 
     favoris_ids = []
     if request.user.is_authenticated:
         favoris_ids = list(Favori.objects.filter(user=request.user).values_list('espace_id', flat=True))
     
     context = {
-        'espaces': espaces,
+        'espaces': page,
         'categorie': categorie,
         'categorie_nom': categorie_nom,
-        'total': espaces.count(),
-        'favoris_ids': favoris_ids  
+        'total': total,
+        'favoris_ids': favoris_ids,
+        **liens_suivants(request, suivant, categorie=categorie),
     }
     
     return render(request, "client/espaces_categorie.html", context)
 
 
+# ---------------- API catalogue (défilement infini) ----------------
+def api_espaces(request):
+    filtres = normaliser_filtres(request.GET)
+    categorie = request.GET.get('categorie')
+    try:
+        page, suivant = page_espaces(
+            request, filtres, taille_demandee(request.GET.get('taille')), categorie, curseur_strict=True
+        )
+    except CurseurInvalide as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    favoris_ids = []
+    if request.user.is_authenticated:
+        favoris_ids = list(Favori.objects.filter(user=request.user).values_list('espace_id', flat=True))
+
+    liens = liens_suivants(request, suivant)
+    return JsonResponse({
+        'success': True,
+        'espaces': [{
+            'id': espace.id,
+            'nom': espace.nom,
+            'ville': espace.ville,
+            'type_espace': espace.type_espace,
+            'capacite': espace.capacite,
+            'prix_par_heure': str(espace.prix_par_heure),
+            'equipements': [e.nom for e in espace.equipements_list],
+            'distance': round(espace.distance, 2) if getattr(espace, 'distance', None) is not None else None,
+            'image': espace.image.url if espace.image else None,
+            'url': reverse('detail_espace', args=[espace.id]),
+        } for espace in page],
+        'html': render_to_string('client/partials/cartes_espaces.html', {
+            'espaces': page, 'favoris_ids': favoris_ids, 'populaires': not categorie,
+        }, request=request),
+        'curseur': suivant,
+        'suivant': liens['suivant'],
+        'api_suivant': liens['suivant_api'] and reverse('api_espaces') + '?' + liens['suivant_api'],
+    })
+
+
 # ---------------- Détail Espace ----------------
 def detail_espace(request, espace_id):
-    espace = get_object_or_404(Espace, id=espace_id)
+    espace = lire(
+        f"espace:{espace_id}",
+        lambda: avec_equipements(Espace.objects.prefetch_related('images')).filter(id=espace_id).first(),
+    )
+    if espace is None:
+        raise Http404("Espace introuvable")
 
     if request.method == "POST":
         if not request.user.is_authenticated:
@@ -131,16 +203,17 @@ def detail_espace(request, espace_id):
                 return render(request, 'client/detail_espace.html', {
                     "espace": espace,
                     "form": form,
+                    "serie_form": SerieReservationForm(prefix='serie'),
                     "favoris_ids": favoris_ids
                 })
             
-            reservation = form.save(commit=False)
-            reservation.user = request.user
-            reservation.espace = espace
-            reservation.prix_total = espace.prix_par_heure * reservation.duree_heures
-            reservation.save()
-
-            return redirect('mes_reservations')
+            try:
+                reserver(request.user, espace, selected_date, selected_time, form.cleaned_data['duree_heures'])
+            except CreneauIndisponible as e:
+                messages.error(request, str(e))
+                form.creneau_complet = True
+            else:
+                return redirect('mes_reservations')
         else:
             messages.error(request, "Impossible de réserver : vérifiez les informations saisies.")
     else:
@@ -153,10 +226,84 @@ def detail_espace(request, espace_id):
     return render(request, 'client/detail_espace.html', {
         "espace": espace,
         "form": form,
-        "favoris_ids": favoris_ids 
+        "serie_form": SerieReservationForm(prefix='serie'),
+        "favoris_ids": favoris_ids,
+        "creneau_complet": form.is_bound and form.creneau_complet,
+        # Recalculés par tâche planifiée : la durée du cache suffit à les suivre
+        "similaires": lire(f"similaires:{espace.id}", lambda: espaces_similaires(espace.id)),
     })
 
 
+# ---------------- Liste d'attente ----------------
+@login_required
+def rejoindre_liste_attente(request, espace_id):
+    espace = get_object_or_404(Espace, id=espace_id)
+    if request.method != 'POST':
+        return redirect('detail_espace', espace_id=espace.id)
+
+    try:
+        date_obj = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+        heure_obj = datetime.strptime(request.POST.get('heure_debut', '')[:5], '%H:%M').time()
+        duree = int(request.POST.get('duree_heures', ''))
+    except ValueError:
+        messages.error(request, "Créneau invalide.")
+        return redirect('detail_espace', espace_id=espace.id)
+
+    if duree < 1 or datetime.combine(date_obj, heure_obj) < datetime.now():
+        messages.error(request, "Vous ne pouvez pas attendre un créneau passé.")
+        return redirect('detail_espace', espace_id=espace.id)
+
+    _, creee = ListeAttente.objects.get_or_create(
+        user=request.user, espace=espace, date=date_obj, heure_debut=heure_obj,
+        duree_heures=duree, statut='en_attente',
+    )
+    if creee:
+        messages.success(request, "Vous êtes sur liste d'attente : le créneau vous sera réservé s'il se libère.")
+    else:
+        messages.info(request, "Vous êtes déjà sur liste d'attente pour ce créneau.")
+    return redirect('detail_espace', espace_id=espace.id)
+
+
+# ---------------- Calendrier de disponibilité ----------------
+def disponibilites_mois(request, espace_id, annee, mois):
+    """
+    Occupation d'un espace sur un mois, lue dans les masques précalculés.
+
+    Seuls les jours ayant au moins un créneau occupé sont renvoyés, sous la
+    forme d'un masque hexadécimal (bit i = créneau de 30 min n° i occupé).
+    """
+    if not (date.min.year <= annee <= date.max.year and 1 <= mois <= 12):
+        raise Http404("Mois invalide")
+
+    premier = date(annee, mois, 1)
+    dernier = date(annee, mois, calendar.monthrange(annee, mois)[1])
+    lignes = list(
+        DisponibiliteJour.objects
+        .filter(espace_id=espace_id, date__range=(premier, dernier))
+        .exclude(creneaux=0)
+        .order_by('date')
+        .values_list('date', 'creneaux')
+    )
+    if not lignes and not Espace.objects.filter(id=espace_id).exists():
+        raise Http404("Espace introuvable")
+
+    jours = {str(d.day): format(c, 'x') for d, c in lignes}
+    etag = '"%s"' % hashlib.md5(repr(sorted(jours.items())).encode()).hexdigest()
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'espace': espace_id,
+            'mois': f"{annee:04d}-{mois:02d}",
+            'creneau_minutes': MINUTES_PAR_CRENEAU,
+            'nb_creneaux': NB_CRENEAUX,
+            'occupes': jours,
+        })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 # ---------------- Authentification ----------------
 def signup_view(request):
     if request.method == "POST":
@@ -234,7 +381,11 @@ def mon_compte(request):
 # ---------------- Sécurité ----------------
 @login_required
 def security_settings(request):
-    active_sessions = ActiveSession.objects.filter(user=request.user)
+    # Les heures d'activité en attente de ce processus sont écrites avant lecture
+    vider_sessions_actives()
+    active_sessions = list(ActiveSession.objects.filter(user=request.user).order_by('-last_activity'))
+    for session in active_sessions:
+        session.appareil = classer(session.user_agent) if session.user_agent else None
     context = {'active_sessions': active_sessions, 'current_session_key': request.session.session_key}
     return render(request, 'client/security_settings.html', context)
 
@@ -265,12 +416,8 @@ def logout_session(request, session_key):
         messages.error(request, "Vous ne pouvez pas déconnecter votre session actuelle.")
         return redirect('security_settings')
 
-    try:
-        Session.objects.get(session_key=session_key).delete()
-    except Session.DoesNotExist:
-        pass
-
-    ActiveSession.objects.filter(user=request.user, session_key=session_key).delete()
+    # Limité aux sessions de l'utilisateur : une clé quelconque ne suffit pas
+    revoquer_sessions(ActiveSession.objects.filter(user=request.user, session_key=session_key))
     return redirect('security_settings')
 
 
@@ -278,13 +425,7 @@ def logout_session(request, session_key):
 def logout_all_sessions(request):
     current_session = request.session.session_key
     sessions = ActiveSession.objects.filter(user=request.user).exclude(session_key=current_session)
-    count = sessions.count()
-    for s in sessions:
-        try:
-            Session.objects.get(session_key=s.session_key).delete()
-        except Session.DoesNotExist:
-            pass
-    sessions.delete()
+    count = revoquer_sessions(sessions)
 
     if count:
         messages.success(request, f"{count} session(s) déconnectée(s).")
@@ -300,6 +441,8 @@ def delete_account(request):
             return redirect("security_settings")
 
         user = request.user
+        # Les autres appareils sont déconnectés avant que la cascade n'efface leur trace
+        revoquer_sessions(ActiveSession.objects.filter(user=user))
         logout(request)
         user.delete()
         return redirect("accueil")
@@ -412,25 +555,11 @@ def reserver_espace(request, espace_id):
                 messages.error(request, "Vous ne pouvez pas réserver dans le passé.")
                 return redirect('detail_espace', espace_id=espace.id)
             
-            prix_total = espace.prix_par_heure * duree
-
-            conflict = Reservation.objects.filter(
-                espace=espace,
-                date=date_obj,
-                heure_debut=heure_obj
-            ).exists()
-
-            if conflict:
-                messages.error(request, "Ce créneau est déjà réservé.")
+            try:
+                reserver(request.user, espace, date_obj, heure_obj, duree)
+            except CreneauIndisponible as e:
+                messages.error(request, str(e))
             else:
-                Reservation.objects.create(
-                    user=request.user,
-                    espace=espace,
-                    date=date_obj,
-                    heure_debut=heure_obj,
-                    duree_heures=duree,
-                    prix_total=prix_total
-                )
                 return redirect('mes_reservations')
                 
         except ValueError:
@@ -439,6 +568,56 @@ def reserver_espace(request, espace_id):
     return redirect('detail_espace', espace_id=espace.id)
 
 
+@login_required
+def reservation_recurrente(request, espace_id):
+    """Crée toutes les occurrences libres d'une série et signale les conflits en une réponse."""
+    espace = get_object_or_404(Espace, id=espace_id)
+    if request.method != 'POST':
+        return redirect('detail_espace', espace_id=espace.id)
+
+    ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    form = SerieReservationForm(request.POST, prefix='serie')
+    if not form.is_valid():
+        if ajax:
+            return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+        messages.error(request, "Impossible de créer la série : vérifiez les informations saisies.")
+        return redirect('detail_espace', espace_id=espace.id)
+
+    data = form.cleaned_data
+    try:
+        serie, creees, conflits = reserver_serie(
+            request.user, espace, data['frequence'], data['date_debut'], data['date_fin'],
+            data['heure_debut'], data['duree_heures'],
+            intervalle=data['intervalle'], jours_semaine=data['jours_semaine'],
+            # Comme une réservation simple, chaque occurrence n'est bloquée que le temps du paiement
+            expire_le=fin_blocage(),
+        )
+    except SerieInvalide as e:
+        if ajax:
+            return JsonResponse({'success': False, 'errors': {'__all__': [str(e)]}}, status=400)
+        messages.error(request, str(e))
+        return redirect('detail_espace', espace_id=espace.id)
+
+    if ajax:
+        return JsonResponse({
+            'success': bool(creees),
+            'serie': serie.pk,
+            'creees': len(creees),
+            'conflits': [jour.isoformat() for jour in conflits],
+        })
+
+    if creees:
+        messages.success(request, f"{len(creees)} réservation(s) créée(s).")
+    if conflits:
+        messages.warning(
+            request,
+            "Créneaux déjà pris : " + ", ".join(jour.strftime('%d/%m/%Y') for jour in conflits)
+        )
+    if creees:
+        return redirect('mes_reservations')
+    return redirect('detail_espace', espace_id=espace.id)
+
+
 @login_required
 def mes_reservations(request):
     reservations = (
@@ -467,7 +646,11 @@ def mes_reservations(request):
 @login_required
 def reservation_detail(request, reservation_id):
     reservation = get_object_or_404(Reservation, id=reservation_id, user=request.user)
-    return render(request, "client/reservation_detail.html", {'reservation': reservation})
+    tentative = reservation.tentatives_paiement.first()
+    return render(request, "client/reservation_detail.html", {
+        'reservation': reservation,
+        'paiement_en_cours': tentative is not None and tentative.statut in TentativePaiement.STATUTS_ACTIFS,
+    })
 
 
 @login_required
@@ -476,7 +659,13 @@ def cancel_reservation(request, reservation_id):
 
     if request.method == "POST":
         reservation.status = "annulee"
-        reservation.save()
+        # Seul le statut est écrit : une capture enregistrée entre-temps n'est pas effacée
+        reservation.save(update_fields=['status', 'updated_at'])
+        reservation.refresh_from_db(fields=['paid'])
+        if reservation.paid:
+            # Inscrit au journal des paiements, une seule fois par paiement ; un paiement
+            # capturé après l'annulation est remboursé par client.paiements.executer
+            rembourser(reservation)
 
         subject = "Confirmation d'annulation de votre réservation"
         html_message = render_to_string('client/emails/reservation_cancelled.html', {
@@ -484,10 +673,10 @@ def cancel_reservation(request, reservation_id):
             'reservation': reservation,
         })
         plain_message = strip_tags(html_message)
-        from_email = settings.DEFAULT_FROM_EMAIL
         to = reservation.user.email
 
-        send_mail(subject, plain_message, from_email, [to], html_message=html_message)
+        # Expédié par la commande envoyer_emails (voir client.boite_envoi)
+        mettre_en_file(subject, plain_message, [to], html_message=html_message)
 
         return redirect('mes_reservations')
 
@@ -499,6 +688,11 @@ def cancel_reservation(request, reservation_id):
 def payment_page(request, reservation_id):
     reservation = get_object_or_404(Reservation, id=reservation_id, user=request.user)
     
+    if reservation.blocage_expire:
+        changer_statut(Reservation.objects.filter(id=reservation.id, status='en_attente'), 'expiree')
+        messages.error(request, "Le délai de paiement est dépassé, le créneau a été libéré.")
+        return redirect('reservation_detail', reservation_id=reservation.id)
+
     if reservation.status != 'en_attente':
         messages.error(request, "Cette réservation ne peut pas être payée.")
         return redirect('reservation_detail', reservation_id=reservation.id)
@@ -510,6 +704,8 @@ def payment_page(request, reservation_id):
         'reservation': reservation,
         'payment_cards': payment_cards,
         'default_card': default_card,
+        # Renvoyée avec le formulaire : un second envoi retrouve le même paiement
+        'cle_idempotence': nouvelle_cle(),
     }
     
     return render(request, 'client/payment_page.html', context)
@@ -521,11 +717,22 @@ def process_payment(request, reservation_id):
         return redirect('payment_page', reservation_id=reservation_id)
     
     reservation = get_object_or_404(Reservation, id=reservation_id, user=request.user)
-    
+    cle = request.POST.get('cle_idempotence', '').strip()[:64] or nouvelle_cle()
+
+    # Formulaire renvoyé (double clic, rechargement) : on montre le paiement déjà lancé
+    tentative = reservation.tentatives_paiement.filter(cle_idempotence=cle).first()
+    if tentative:
+        return suite_paiement(request, tentative)
+
+    if reservation.blocage_expire:
+        changer_statut(Reservation.objects.filter(id=reservation.id, status='en_attente'), 'expiree')
+        messages.error(request, "Le délai de paiement est dépassé, le créneau a été libéré.")
+        return redirect('reservation_detail', reservation_id=reservation.id)
+
     if reservation.status != 'en_attente':
         messages.error(request, "Cette réservation a déjà été traitée.")
         return redirect('mes_reservations')
-    
+
     payment_method = request.POST.get('payment_method')
     
     if payment_method == 'existing_card':
@@ -536,21 +743,7 @@ def process_payment(request, reservation_id):
             return redirect('payment_page', reservation_id=reservation.id)
         
         card = get_object_or_404(PaymentCard, id=card_id, user=request.user)
-        success = simulate_payment(reservation, card)
-        
-        if success:
-            with transaction.atomic():
-                reservation.status = 'confirmee'  
-                reservation.paid = True
-                reservation.payment_method = f"{card.type} •••• {card.last_four}"
-                reservation.payment_date = timezone.now()
-                reservation.save()
-            
-            envoyer_email_confirmation_paiement(reservation)
-            return redirect('reservation_detail', reservation_id=reservation.id)
-        else:
-            messages.error(request, "Le paiement a échoué. Veuillez réessayer.")
-            return redirect('payment_page', reservation_id=reservation.id)
+        return payer(request, reservation, Carte(card.name, card.type, card.last_four, card.expiry), cle)
     
     elif payment_method == 'new_card':
         card_name = request.POST.get('card_name', '').strip()
@@ -572,68 +765,38 @@ def process_payment(request, reservation_id):
             messages.error(request, "CVV invalide.")
             return redirect('payment_page', reservation_id=reservation.id)
         
-        last_four = card_number_clean[-4:]
-        card_type = detect_card_type(card_number)
-        
-        temp_card = type('obj', (object,), {
-            'type': card_type,
-            'last_four': last_four
-        })()
-        
-        success = simulate_payment(reservation, temp_card)
-        
-        if success:
-            with transaction.atomic():
-                if save_card:
-                    new_card = PaymentCard.objects.create(
-                        user=request.user,
-                        name=card_name,
-                        last_four=last_four,
-                        expiry=expiry,
-                        type=card_type
-                    )
-                    
-                    if not request.user.profile.default_card:
-                        request.user.profile.default_card = new_card
-                        request.user.profile.save()
-                
-                reservation.paid = True
-                reservation.status = 'confirmee'  
-                reservation.payment_date = timezone.now()
-                reservation.payment_method = f"{card_type} •••• {last_four}" 
-                reservation.save()
-            
-            envoyer_email_confirmation_paiement(reservation)
-            return redirect('reservation_detail', reservation_id=reservation.id)
-        else:
-            messages.error(request, "Le paiement a échoué. Veuillez réessayer.")
-            return redirect('payment_page', reservation_id=reservation.id)
+        carte = Carte(card_name, detect_card_type(card_number), card_number_clean[-4:], expiry)
+        # La carte n'est enregistrée qu'une fois le paiement capturé (voir client.paiements)
+        return payer(request, reservation, carte, cle, enregistrer_carte=save_card)
     
     messages.error(request, "Méthode de paiement invalide.")
     return redirect('payment_page', reservation_id=reservation.id)
 
 
-def simulate_payment(reservation, card):
-    import time
-    
-    time.sleep(0.3)
-    
-    if not card or not card.last_four:
-        return False
-    
-    success = random.random() < 0.95
-    
-    if success:
-        reservation.payment_date = timezone.now()
-        return True
-    
-    return False
+def payer(request, reservation, carte, cle, enregistrer_carte=False):
+    try:
+        tentative = lancer_paiement(reservation, carte, cle, enregistrer_carte=enregistrer_carte)
+    except CleInvalide:
+        messages.error(request, "Formulaire de paiement invalide. Veuillez réessayer.")
+        return redirect('payment_page', reservation_id=reservation.id)
+    return suite_paiement(request, tentative)
+
+
+def suite_paiement(request, tentative):
+    if tentative.statut in TentativePaiement.STATUTS_ACTIFS:
+        messages.info(request, "Paiement en cours de traitement…")
+    elif tentative.statut != 'capturee':
+        messages.error(request, tentative.message or "Le paiement a échoué. Veuillez réessayer.")
+        return redirect('payment_page', reservation_id=tentative.reservation_id)
+    return redirect('reservation_detail', reservation_id=tentative.reservation_id)
 
 
 # ---------------- Favoris ----------------
 @login_required
 def mes_favoris(request):
-    favoris = Favori.objects.filter(user=request.user).select_related('espace')
+    favoris = Favori.objects.filter(user=request.user).select_related('espace').prefetch_related(
+        Prefetch('espace__equipements_tags', queryset=Equipement.objects.order_by('nom'), to_attr='equipements_list')
+    )
     
     espaces_favoris = [fav.espace for fav in favoris]
     favoris_ids = [fav.espace.id for fav in favoris]
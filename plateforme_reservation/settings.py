@@ -142,6 +142,44 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Durée pendant laquelle une réservation non payée bloque son créneau
+RESERVATION_DUREE_BLOCAGE_MINUTES = 15
+
+# Cache du catalogue public (client.cache_catalogue). En mémoire locale, chaque
+# processus a le sien ; pour le partager entre processus, déclarer un cache
+# fichiers (FileBasedCache) ou base de données (DatabaseCache, après
+# « python manage.py createcachetable ») et y faire pointer CATALOGUE_CACHE.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogue': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogue',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+CATALOGUE_CACHE = 'catalogue'
+CATALOGUE_CACHE_DUREE = 300
+
+# Suivi des sessions actives (client.sessions_actives) : la ligne n'est réécrite
+# qu'au changement d'appareil/IP ou après INTERVALLE secondes ; l'heure de
+# dernière activité est sinon écrite par lots toutes les DELAI_VIDAGE secondes.
+SESSIONS_ACTIVES_ECRITURE_DIFFEREE = True
+SESSIONS_ACTIVES_INTERVALLE = 300
+SESSIONS_ACTIVES_DELAI_VIDAGE = 30
+
+# Liste d'attente : promotion en arrière-plan et délai laissé au client promu pour payer
+LISTE_ATTENTE_ASYNCHRONE = True
+LISTE_ATTENTE_DUREE_BLOCAGE_MINUTES = 60
+
+# Paiement (client.paiements) : passerelle utilisée et appel hors de la requête,
+# dans un pool de PAIEMENT_WORKERS threads
+PAIEMENT_PASSERELLE = 'client.paiements.PasserelleFactice'
+PAIEMENT_PASSERELLE_OPTIONS = {'latence': 0.3, 'taux_echec': 0.05}
+PAIEMENT_ASYNCHRONE = True
+PAIEMENT_WORKERS = 8
+
 # URL vers la page de login pour @login_required
 LOGIN_URL = '/users/login/'
 